@@ -0,0 +1,51 @@
+"""Replace the free-text and duplicate primary key indexes with (owner_id, is_done, id)
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 10:05:00.000000
+
+No query filters on title or description, and the id indexes duplicate the primary
+keys, so these only slowed down inserts. The composite index serves every per-user
+listing, is_done filters and the include_todos load as an index range scan. On
+Postgres the indexes are built and dropped CONCURRENTLY so writes keep flowing.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_todos_owner_id_is_done_id",
+            "todos",
+            ["owner_id", "is_done", "id"],
+            postgresql_concurrently=True,
+        )
+        for index, table in (
+            ("ix_todos_description", "todos"),
+            ("ix_todos_title", "todos"),
+            ("ix_todos_id", "todos"),
+            ("ix_users_id", "users"),
+        ):
+            op.drop_index(index, table_name=table, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        op.create_index("ix_users_id", "users", ["id"], postgresql_concurrently=True)
+        op.create_index("ix_todos_id", "todos", ["id"], postgresql_concurrently=True)
+        op.create_index("ix_todos_title", "todos", ["title"], postgresql_concurrently=True)
+        op.create_index(
+            "ix_todos_description", "todos", ["description"], postgresql_concurrently=True
+        )
+        op.drop_index(
+            "ix_todos_owner_id_is_done_id", table_name="todos", postgresql_concurrently=True
+        )
@@ -0,0 +1,51 @@
+"""Add full-text search over todo titles and descriptions
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 11:20:00.000000
+
+On Postgres this adds a stored generated tsvector column with a GIN index. Adding a
+stored generated column rewrites the todos table under an ACCESS EXCLUSIVE lock, so
+run it in a maintenance window on large tables; the index itself is built
+CONCURRENTLY. On SQLite an external-content FTS5 table is kept in sync by triggers
+and backfilled with a rebuild.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SQLITE_TRIGGERS = ("todos_fts_insert", "todos_fts_delete", "todos_fts_update")
+
+
+def upgrade() -> None:
+    from app.models import TODO_SEARCH_DDL
+
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        add_column, create_index = TODO_SEARCH_DDL["postgresql"]
+        op.execute(add_column)
+        with op.get_context().autocommit_block():
+            op.execute(create_index.replace("CREATE INDEX", "CREATE INDEX CONCURRENTLY", 1))
+    elif dialect == "sqlite":
+        for statement in TODO_SEARCH_DDL["sqlite"]:
+            op.execute(statement)
+        op.execute("INSERT INTO todos_fts(todos_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    dialect = op.get_bind().dialect.name
+    if dialect == "postgresql":
+        with op.get_context().autocommit_block():
+            op.execute("DROP INDEX CONCURRENTLY IF EXISTS ix_todos_search_vector")
+        op.execute("ALTER TABLE todos DROP COLUMN IF EXISTS search_vector")
+    elif dialect == "sqlite":
+        for trigger in SQLITE_TRIGGERS:
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS todos_fts")
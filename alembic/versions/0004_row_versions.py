@@ -0,0 +1,45 @@
+"""Add row versions to users and todos
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 14:40:00.000000
+
+Every write bumps the version, which backs ETags and If-Match. Existing rows start at 1;
+with a constant default Postgres adds the column without rewriting the table. The
+(id, version) indexes let conditional GETs read a version without touching the row,
+and are built CONCURRENTLY on Postgres.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0004"
+down_revision: Union[str, None] = "0003"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    for table in ("users", "todos"):
+        op.add_column(
+            table, sa.Column("version", sa.Integer(), nullable=False, server_default="1")
+        )
+    with op.get_context().autocommit_block():
+        for table in ("users", "todos"):
+            op.create_index(
+                f"ix_{table}_id_version", table, ["id", "version"], postgresql_concurrently=True
+            )
+
+
+def downgrade() -> None:
+    with op.get_context().autocommit_block():
+        for table in ("users", "todos"):
+            op.drop_index(
+                f"ix_{table}_id_version", table_name=table, postgresql_concurrently=True
+            )
+    for table in ("users", "todos"):
+        # Not a batch (copy-and-swap) on SQLite, which would drop the FTS triggers.
+        op.drop_column(table, "version")
@@ -0,0 +1,42 @@
+"""Add the shard directory tables
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 16:10:00.000000
+
+id_blocks hands out ids that are unique across shards and user_emails keeps emails
+unique across them. Only the database at DATABASE_URL uses them once DATABASE_SHARD_URLS
+is set, but every database gets them so that any of them can act as the directory.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "id_blocks",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("next_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+    op.create_table(
+        "user_emails",
+        sa.Column("email", sa.String(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("email"),
+        sa.UniqueConstraint("user_id"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("user_emails")
+    op.drop_table("id_blocks")
@@ -0,0 +1,36 @@
+"""Add users.todo_count
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-18 17:30:00.000000
+
+The count is kept with every todo insert and delete so TODO_MAX_PER_USER is enforced
+without counting rows. Existing users are backfilled from their todos; on a large table
+run this while writes are paused, or run the backfill UPDATE again afterwards.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users", sa.Column("todo_count", sa.Integer(), nullable=False, server_default="0")
+    )
+    op.execute(
+        "UPDATE users SET todo_count = "
+        "(SELECT count(*) FROM todos WHERE todos.owner_id = users.id)"
+    )
+
+
+def downgrade() -> None:
+    # Not a batch (copy-and-swap) on SQLite, which would drop the FTS triggers.
+    op.drop_column("users", "todo_count")
@@ -0,0 +1,35 @@
+"""Add users.done_count
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-18 18:20:00.000000
+
+Together with todo_count it serves GET /users/{id}/stats without reading todos. Existing
+users are backfilled here; python -m app.counters recomputes both counts at any time.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users", sa.Column("done_count", sa.Integer(), nullable=False, server_default="0")
+    )
+    op.execute(
+        "UPDATE users SET done_count = "
+        "(SELECT count(*) FROM todos WHERE todos.owner_id = users.id AND todos.is_done)"
+    )
+
+
+def downgrade() -> None:
+    # Not a batch (copy-and-swap) on SQLite, which would drop the FTS triggers.
+    op.drop_column("users", "done_count")
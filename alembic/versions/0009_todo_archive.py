@@ -0,0 +1,75 @@
+"""Add todos.completed_at and the todos_archive table
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-18 21:00:00.000000
+
+python -m app.archive moves todos done for longer than ARCHIVE_AFTER_DAYS into
+todos_archive. Todos already done get this migration's time as completed_at, so they
+become due ARCHIVE_AFTER_DAYS after the upgrade. Archived ids must never be handed out
+again, which SQLite only guarantees for AUTOINCREMENT tables: there the todos table is
+rebuilt, and the search triggers that go with it are created again.
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0009"
+down_revision: Union[str, None] = "0008"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _rebuild_todos_on_sqlite(change) -> None:
+    from app.models import TODO_SEARCH_DDL
+
+    with op.batch_alter_table(
+        "todos", recreate="always", table_kwargs={"sqlite_autoincrement": True}
+    ) as batch_op:
+        change(batch_op)
+    for statement in TODO_SEARCH_DDL["sqlite"]:
+        if statement.startswith("CREATE TRIGGER"):
+            op.execute(statement)
+
+
+def upgrade() -> None:
+    completed_at = sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True)
+    if op.get_bind().dialect.name == "sqlite":
+        _rebuild_todos_on_sqlite(lambda batch_op: batch_op.add_column(completed_at))
+    else:
+        op.add_column("todos", completed_at)
+    op.execute("UPDATE todos SET completed_at = CURRENT_TIMESTAMP WHERE is_done")
+    op.create_index("ix_todos_completed_at", "todos", ["completed_at"])
+    op.create_table(
+        "todos_archive",
+        sa.Column("id", sa.Integer(), autoincrement=False, nullable=False),
+        sa.Column("title", sa.String(), nullable=True),
+        sa.Column("description", sa.String(), nullable=True),
+        sa.Column("is_done", sa.Boolean(), nullable=True),
+        sa.Column("owner_id", sa.Integer(), nullable=True),
+        sa.Column("version", sa.Integer(), nullable=False),
+        sa.Column("completed_at", sa.DateTime(timezone=True), nullable=True),
+        sa.Column("archived_at", sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(["owner_id"], ["users.id"]),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index("ix_todos_archive_owner_id_id", "todos_archive", ["owner_id", "id"])
+
+
+def downgrade() -> None:
+    # Archived todos go back to the hot table rather than being lost; they were never
+    # taken out of the counts.
+    op.execute(
+        "INSERT INTO todos (id, title, description, is_done, owner_id, version) "
+        "SELECT id, title, description, is_done, owner_id, version FROM todos_archive"
+    )
+    op.drop_index("ix_todos_archive_owner_id_id", table_name="todos_archive")
+    op.drop_table("todos_archive")
+    op.drop_index("ix_todos_completed_at", table_name="todos")
+    if op.get_bind().dialect.name == "sqlite":
+        _rebuild_todos_on_sqlite(lambda batch_op: batch_op.drop_column("completed_at"))
+    else:
+        op.drop_column("todos", "completed_at")
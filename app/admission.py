@@ -0,0 +1,130 @@
+import asyncio
+import heapq
+import itertools
+import os
+from typing import List, Tuple
+
+from fastapi import HTTPException
+
+from .database import DB_MAX_OVERFLOW, DB_POOL_SIZE
+
+# Lower values are admitted first.
+READ = 0  # single-row lookups
+WRITE = 1  # single-row writes and logins
+BULK = 2  # listings, search, exports and bulk writes
+
+# Capacity matches what one pool can open. A request may hold connections from several
+# pools at once (a scatter-gather read or login takes one from every shard, and a read
+# can hold a replica's next to the primary's), but at most one from each, and every
+# pool is sized alike.
+ADMISSION_CAPACITY = int(os.getenv("ADMISSION_CAPACITY", str(DB_POOL_SIZE + DB_MAX_OVERFLOW)))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", str(ADMISSION_CAPACITY * 2)))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", "1"))
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    def __init__(self, capacity: int, max_queue: int, queue_timeout: float):
+        self.capacity = capacity
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.in_flight = 0
+        self.rejected = 0
+        self._waiters: List[Tuple[int, int, asyncio.Future]] = []
+        self._queued = 0
+        self._counter = itertools.count()
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": self._queued,
+            "rejected": self.rejected,
+        }
+
+    def _reject(self):
+        self.rejected += 1
+        raise AdmissionRejected()
+
+    def _make_room(self, priority: int) -> bool:
+        # A full queue sheds its least important waiter in favour of a more important one.
+        candidates = [entry for entry in self._waiters if not entry[2].done()]
+        if not candidates:
+            return False
+        worst = max(candidates, key=lambda entry: (entry[0], -entry[1]))
+        if worst[0] <= priority:
+            return False
+        worst[2].set_exception(AdmissionRejected())
+        self._queued -= 1
+        return True
+
+    async def acquire(self, priority: int = READ):
+        if self.in_flight < self.capacity and not self._queued:
+            self.in_flight += 1
+            return
+        if self._queued >= self.max_queue and not self._make_room(priority):
+            self._reject()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._counter), future))
+        self._queued += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(future), self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.exception():
+                # The slot was handed over as the wait ran out; give it straight back.
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self._queued -= 1
+            self._reject()
+        except AdmissionRejected:
+            self.rejected += 1
+            raise
+        except asyncio.CancelledError:
+            if future.done() and not future.exception():
+                self.release()
+            elif not future.done():
+                future.cancel()
+                self._queued -= 1
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                # Hand the slot straight to the next waiter so newcomers cannot jump the queue.
+                self._queued -= 1
+                future.set_result(None)
+                return
+        self.in_flight -= 1
+
+
+controller = AdmissionController(
+    ADMISSION_CAPACITY, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT
+)
+
+
+def admit(priority: int):
+    async def dependency():
+        try:
+            await controller.acquire(priority)
+        except AdmissionRejected:
+            raise HTTPException(
+                status_code=503,
+                detail="Server busy, retry later",
+                headers={"Retry-After": str(max(int(controller.queue_timeout), 1))},
+            )
+        try:
+            yield
+        finally:
+            controller.release()
+
+    return dependency
+
+
+admit_read = admit(READ)
+admit_write = admit(WRITE)
+admit_bulk = admit(BULK)
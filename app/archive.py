@@ -0,0 +1,63 @@
+"""Move todos that have been done for a while out of todos into todos_archive.
+
+Most todos end up done and are hardly read again, yet they bloat the hot table, its
+indexes and every include_todos load. Archived todos are still found by id
+(GET /todos/{id}, multi-gets, /batch), listed with include_archived=true and can be
+deleted, but not changed; they still count in a user's todo counts and quota. Each
+batch is a short transaction of its own, so this is safe to run while the app is
+serving; with sharding on, every shard is archived.
+
+    python -m app.archive --older-than-days 30 --batch-size 1000
+"""
+import argparse
+import asyncio
+import os
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from . import crud, database
+
+# Days a todo stays in the hot table after it was completed.
+ARCHIVE_AFTER_DAYS = float(os.getenv("ARCHIVE_AFTER_DAYS", "30"))
+
+
+async def archive(
+    sessionmaker: async_sessionmaker,
+    cutoff: Optional[datetime] = None,
+    batch_size: int = 1000,
+) -> dict:
+    cutoff = cutoff or crud._now() - timedelta(days=ARCHIVE_AFTER_DAYS)
+    stats = {"archived": 0, "batches": 0}
+    while True:
+        async with sessionmaker() as db:
+            moved = await crud.archive_todos(db, cutoff, limit=batch_size)
+        if not moved:
+            return stats
+        stats["archived"] += moved
+        stats["batches"] += 1
+
+
+async def main(args):
+    router = database.shard_router
+    if router.enabled:
+        sessionmakers = [shard.sessionmaker for shard in router.shards.values()]
+    else:
+        sessionmakers = [database.session_factory()]
+    cutoff = crud._now() - timedelta(days=args.older_than_days)
+    total = 0
+    try:
+        for sessionmaker in sessionmakers:
+            total += (await archive(sessionmaker, cutoff, batch_size=args.batch_size))["archived"]
+    finally:
+        await router.dispose()
+        await database.get_engine().dispose()
+    print(f"archived {total} todos completed before {cutoff:%Y-%m-%d %H:%M:%S} UTC")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--older-than-days", type=float, default=ARCHIVE_AFTER_DAYS)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+import asyncio
+import os
+from typing import Any, Awaitable, Callable, Dict, List, Set, Tuple
+
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from . import crud, database, schemas
+
+# Opt-in: coalesce concurrent POST /users/{id}/todos/ into group commits.
+TODO_BATCHING = os.getenv("TODO_BATCHING", "0") == "1"
+# The most a create waits for company before its batch is written.
+TODO_BATCH_WINDOW_MS = float(os.getenv("TODO_BATCH_WINDOW_MS", "2"))
+TODO_BATCH_MAX_ITEMS = int(os.getenv("TODO_BATCH_MAX_ITEMS", "500"))
+
+
+class GroupCommitter:
+    # ``flush`` takes the items of one batch and returns one result per item, in order;
+    # a result that is an exception is raised to that item's caller only.
+    def __init__(
+        self,
+        flush: Callable[[List[Any]], Awaitable[List[Any]]],
+        window: float,
+        max_items: int,
+    ):
+        self.flush = flush
+        self.window = window
+        self.max_items = max_items
+        self._pending: List[Tuple[Any, asyncio.Future]] = []
+        self._timer = None
+        self._flushing: Set[asyncio.Task] = set()
+
+    async def submit(self, item):
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((item, future))
+        if len(self._pending) >= self.max_items:
+            self._dispatch()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._dispatch)
+        return await future
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._run(batch))
+            self._flushing.add(task)
+            task.add_done_callback(self._flushing.discard)
+
+    async def _run(self, batch: List[Tuple[Any, asyncio.Future]]):
+        try:
+            results = await self.flush([item for item, _ in batch])
+        except Exception as exc:
+            results = [exc] * len(batch)
+        for (_, future), result in zip(batch, results):
+            # A caller that went away still had its item written; nobody is left to tell.
+            if future.done():
+                continue
+            if isinstance(result, Exception):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    async def drain(self):
+        self._dispatch()
+        if self._flushing:
+            await asyncio.gather(*self._flushing, return_exceptions=True)
+
+
+async def create_todos(items: List[Tuple[int, schemas.TodoCreate]]) -> List[Any]:
+    if not database.shard_router.enabled:
+        return await _create_todos(database.session_factory(), items)
+    # One group commit per shard, all at once, with results put back in item order.
+    groups: Dict[database.Shard, List[int]] = {}
+    for index, (user_id, _) in enumerate(items):
+        shard = await database.shard_router.locate(user_id)
+        groups.setdefault(shard, []).append(index)
+    results: List[Any] = [None] * len(items)
+    shard_results = await asyncio.gather(
+        *(
+            _create_todos(shard.sessionmaker, [items[index] for index in indexes])
+            for shard, indexes in groups.items()
+        )
+    )
+    for indexes, created in zip(groups.values(), shard_results):
+        for index, result in zip(indexes, created):
+            results[index] = result
+    return results
+
+
+async def _create_todos(
+    sessionmaker: async_sessionmaker, items: List[Tuple[int, schemas.TodoCreate]]
+) -> List[Any]:
+    async with sessionmaker() as db:
+        try:
+            return await crud.create_todos(db, items)
+        except (SQLAlchemyError, crud.TodoLimitReached):
+            pass
+        # One bad item (a missing user, or one at its todo limit) fails the whole INSERT;
+        # retry each on its own so only that item's caller sees the error.
+        results = []
+        for user_id, todo in items:
+            try:
+                results.append(await crud.create_user_todo(db, todo=todo, user_id=user_id))
+            except (SQLAlchemyError, crud.TodoLimitReached) as exc:
+                results.append(exc)
+        return results
+
+
+todo_writer = GroupCommitter(create_todos, TODO_BATCH_WINDOW_MS / 1000, TODO_BATCH_MAX_ITEMS)
@@ -0,0 +1,204 @@
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class CacheBackend:
+    """Interface for cache stores; a shared backend (e.g. Redis) implements the same methods."""
+
+    async def get(self, key: str) -> Optional[Any]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    async def delete(self, *keys: str) -> None:
+        raise NotImplementedError
+
+    async def clear(self) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class NullCache(CacheBackend):
+    async def get(self, key: str) -> Optional[Any]:
+        return None
+
+    async def set(self, key: str, value: Any) -> None:
+        pass
+
+    async def delete(self, *keys: str) -> None:
+        pass
+
+    async def clear(self) -> None:
+        pass
+
+    def stats(self) -> dict:
+        return {"backend": "none"}
+
+
+class LRUCache(CacheBackend):
+    """Bounded in-process cache.
+
+    Least recently used entries go first, and every entry expires after ``ttl``.
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    async def get(self, key: str) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    async def set(self, key: str, value: Any) -> None:
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, *keys: str) -> None:
+        for key in keys:
+            self._entries.pop(key, None)
+
+    async def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
+
+
+def _default_backend() -> CacheBackend:
+    if os.getenv("CACHE_BACKEND", "memory") == "none":
+        return NullCache()
+    return LRUCache(
+        maxsize=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+        ttl=float(os.getenv("CACHE_TTL_SECONDS", "30")),
+    )
+
+
+backend: CacheBackend = _default_backend()
+
+# Per key with a load in flight: how many loads, and how many invalidations they have
+# seen. A load only stores its payload if its own key was not invalidated meanwhile, so
+# a read that raced a write never stores a stale payload; other keys' writes don't matter.
+_loads: Dict[str, int] = {}
+_generations: Dict[str, int] = {}
+
+
+def configure(new_backend: CacheBackend) -> None:
+    global backend
+    backend = new_backend
+
+
+def _begin_load(keys: List[str]) -> Dict[str, int]:
+    for key in keys:
+        _loads[key] = _loads.get(key, 0) + 1
+    return {key: _generations.get(key, 0) for key in keys}
+
+
+def _end_load(keys: List[str]) -> None:
+    for key in keys:
+        _loads[key] -= 1
+        if not _loads[key]:
+            del _loads[key]
+            _generations.pop(key, None)
+
+
+def user_key(user_id: int, include_todos: bool = False) -> str:
+    return f"user:{user_id}:todos" if include_todos else f"user:{user_id}"
+
+
+def todo_key(todo_id: int) -> str:
+    return f"todo:{todo_id}"
+
+
+async def read_through(
+    key: str, loader: Callable[[], Awaitable[Optional[Any]]], fill: bool = True
+) -> Optional[Any]:
+    # ``fill=False`` for loaders that may return stale rows, e.g. from a lagging replica.
+    value = await backend.get(key)
+    if value is not None:
+        return value
+    generations = _begin_load([key])
+    try:
+        value = await loader()
+        if fill and value is not None and generations[key] == _generations.get(key, 0):
+            await backend.set(key, value)
+    finally:
+        _end_load([key])
+    return value
+
+
+async def read_many(
+    keys: Dict[Any, str],
+    loader: Callable[[List[Any]], Awaitable[Dict[Any, Any]]],
+    fill: bool = True,
+) -> Dict[Any, Any]:
+    # read_through for many ids at once: ``keys`` maps id to cache key, and ``loader``
+    # fetches every missed id in one call, returning the ones it found by id.
+    found = {}
+    for id, key in keys.items():
+        value = await backend.get(key)
+        if value is not None:
+            found[id] = value
+    missing = [id for id in keys if id not in found]
+    if missing:
+        missing_keys = [keys[id] for id in missing]
+        generations = _begin_load(missing_keys)
+        try:
+            loaded = await loader(missing)
+            for id, value in loaded.items():
+                key = keys[id]
+                if fill and generations[key] == _generations.get(key, 0):
+                    await backend.set(key, value)
+        finally:
+            _end_load(missing_keys)
+        found.update(loaded)
+    return found
+
+
+async def invalidate(*keys: str) -> None:
+    for key in keys:
+        if key in _loads:
+            _generations[key] = _generations.get(key, 0) + 1
+    await backend.delete(*keys)
+
+
+async def invalidate_user(user_id: int) -> None:
+    await invalidate(user_key(user_id), user_key(user_id, include_todos=True))
+
+
+async def invalidate_todo(todo_id: int, owner_id: Optional[int] = None) -> None:
+    keys = [todo_key(todo_id)]
+    if owner_id is not None:
+        keys.append(user_key(owner_id, include_todos=True))
+    await invalidate(*keys)
@@ -0,0 +1,89 @@
+"""Recompute users.todo_count and done_count from the todos themselves.
+
+crud keeps both counts in step with every todo write, so drift only comes from writes
+that went around it (manual SQL, a restored table) or a bug. Safe to run while the app
+is serving; with sharding on, every shard is repaired.
+
+    python -m app.counters --batch-size 1000
+"""
+import argparse
+import asyncio
+from typing import List
+
+from sqlalchemy import func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import database, models
+
+USERS = models.User.__table__
+TODOS = models.Todo.__table__
+ARCHIVE = models.ArchivedTodo.__table__
+
+
+def _count(table, *where):
+    return select(func.count()).where(table.c.owner_id == USERS.c.id, *where).scalar_subquery()
+
+
+# Archived todos still count towards their owner.
+_TOTAL = _count(TODOS) + _count(ARCHIVE)
+_DONE = _count(TODOS, TODOS.c.is_done.is_(True)) + _count(ARCHIVE, ARCHIVE.c.is_done.is_(True))
+
+
+async def _repair_batch(db: AsyncSession, ids: List[int]) -> int:
+    # Every todo write updates its owner's counts last. With the users locked first, a
+    # write either committed before the lock and is in the recount, or waits and adds
+    # its change on top of it.
+    await db.execute(select(USERS.c.id).where(USERS.c.id.in_(ids)).with_for_update())
+    result = await db.execute(
+        update(USERS)
+        .where(
+            USERS.c.id.in_(ids),
+            or_(USERS.c.todo_count != _TOTAL, USERS.c.done_count != _DONE),
+        )
+        .values(todo_count=_TOTAL, done_count=_DONE)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+async def repair(sessionmaker: async_sessionmaker, batch_size: int = 1000) -> dict:
+    stats = {"scanned": 0, "fixed": 0}
+    after_id = 0
+    while True:
+        async with sessionmaker() as db:
+            result = await db.execute(
+                select(USERS.c.id)
+                .where(USERS.c.id > after_id)
+                .order_by(USERS.c.id)
+                .limit(batch_size)
+            )
+            ids = result.scalars().all()
+            if not ids:
+                return stats
+            after_id = ids[-1]
+            stats["scanned"] += len(ids)
+            stats["fixed"] += await _repair_batch(db, ids)
+
+
+async def main(args):
+    router = database.shard_router
+    if router.enabled:
+        sessionmakers = [shard.sessionmaker for shard in router.shards.values()]
+    else:
+        sessionmakers = [database.session_factory()]
+    totals = {"scanned": 0, "fixed": 0}
+    try:
+        for sessionmaker in sessionmakers:
+            stats = await repair(sessionmaker, batch_size=args.batch_size)
+            for name, value in stats.items():
+                totals[name] += value
+    finally:
+        await router.dispose()
+        await database.get_engine().dispose()
+    print(f"scanned {totals['scanned']} users; fixed the counts of {totals['fixed']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=1000)
+    asyncio.run(main(parser.parse_args()))
@@ -1,85 +1,987 @@
-from sqlalchemy.exc import SQLAlchemyError
+import json
+import os
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import anyio
+from sqlalchemy import Float, bindparam, case, delete, func, insert, literal, text, union_all
+from sqlalchemy import update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm import selectinload
 
-from . import models, schemas
+from . import cache, events, models, schemas, sequences
+
+# Rows per multi-row statement in the bulk endpoints.
+BULK_BATCH_SIZE = 500
+
+# Rows fetched per round trip when streaming an export.
+EXPORT_CHUNK_SIZE = 1000
+
+# Todos a user may own at once; 0 means no limit.
+TODO_MAX_PER_USER = int(os.getenv("TODO_MAX_PER_USER", "0"))
+
+# Read paths select these columns and return plain dicts in the field order of the
+# response schemas, so endpoints can encode rows without building pydantic models.
+USER_COLUMNS = tuple(getattr(models.User, field) for field in schemas.User.model_fields)
+
+TODO_COLUMNS = tuple(getattr(models.Todo, field) for field in schemas.Todo.model_fields)
+
+
+def _insert(db: AsyncSession, model):
+    # ON CONFLICT is dialect-specific; both supported backends spell it the same way.
+    if db.bind.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
+async def _with_ids(name: str, rows: List[dict]) -> List[dict]:
+    # Sharded tables take their ids from the directory so they are unique across shards.
+    ids = await sequences.allocate(name, len(rows))
+    if ids is not None:
+        for row, id in zip(rows, ids):
+            row["id"] = id
+    return rows
+
+
+def _batches(items, size: int = BULK_BATCH_SIZE):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def _new_todo(todo: schemas.TodoCreate, owner_id: int) -> dict:
+    return dict(
+        todo.model_dump(), owner_id=owner_id, completed_at=_now() if todo.is_done else None
+    )
+
+
+def _completed_at(is_done: Optional[bool]):
+    # Kept from the first time a todo is marked done until it is reopened.
+    return func.coalesce(models.Todo.completed_at, _now()) if is_done else None
+
+
+class TodoLimitReached(Exception):
+    pass
+
+
+async def _count_todos(
+    db: AsyncSession, todos: Dict[int, int], done: Optional[Dict[int, int]] = None
+):
+    # users.todo_count and done_count move with every todo write in the same transaction,
+    # so the cap is one conditional UPDATE rather than a COUNT(*). Its row lock
+    # serializes concurrent creates for the same user.
+    done = done or {}
+    capped = {user_id for user_id, count in todos.items() if count > 0 and TODO_MAX_PER_USER}
+    for user_id in capped:
+        result = await db.execute(
+            update(models.User)
+            .where(
+                models.User.id == user_id,
+                models.User.todo_count + todos[user_id] <= TODO_MAX_PER_USER,
+            )
+            .values(
+                todo_count=models.User.todo_count + todos[user_id],
+                done_count=models.User.done_count + done.get(user_id, 0),
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            raise TodoLimitReached()
+    owners = [user_id for user_id in {**todos, **done} if user_id not in capped]
+    for batch in _batches(owners):
+        values = {}
+        for column, deltas in (("todo_count", todos), ("done_count", done)):
+            whens = {user_id: deltas[user_id] for user_id in batch if deltas.get(user_id)}
+            if whens:
+                values[column] = getattr(models.User, column) + case(
+                    whens, value=models.User.id, else_=0
+                )
+        if values:
+            await db.execute(
+                update(models.User)
+                .where(models.User.id.in_(batch))
+                .values(**values)
+                .execution_options(synchronize_session=False)
+            )
+
+
+async def _update_todos(
+    db: AsyncSession, query, ids: List[int], track_done: bool
+) -> Tuple[List[dict], Dict[int, bool]]:
+    # Runs an UPDATE of ``ids`` and returns the updated rows and, with ``track_done``,
+    # each one's is_done from before it, so the flips counted are exactly this write's.
+    if not track_done:
+        return _rows(await db.execute(query.returning(*TODO_COLUMNS))), {}
+    if db.bind.dialect.name == "postgresql":
+        # In the write itself: the old rows are joined in under a row lock and returned
+        # next to the new ones.
+        old = (
+            select(models.Todo.id, models.Todo.is_done)
+            .filter(models.Todo.id.in_(ids))
+            .with_for_update()
+            .subquery("old")
+        )
+        query = query.where(models.Todo.id == old.c.id).returning(
+            *TODO_COLUMNS, old.c.is_done.label("was_done")
+        )
+        rows = _rows(await db.execute(query))
+        return rows, {row["id"]: bool(row.pop("was_done")) for row in rows}
+    # SQLite's RETURNING cannot see joined tables. It is in-process with a single
+    # writer, so reading the old values just before costs no round trip.
+    result = await db.execute(
+        select(models.Todo.id, models.Todo.is_done).filter(models.Todo.id.in_(ids))
+    )
+    was_done = {id: bool(is_done) for id, is_done in result.all()}
+    return _rows(await db.execute(query.returning(*TODO_COLUMNS))), was_done
+
+
+def _done_flips(todos, was_done: Dict[int, bool]) -> Dict[int, int]:
+    flips = Counter()
+    for todo in todos:
+        if todo["id"] in was_done and bool(todo["is_done"]) != was_done[todo["id"]]:
+            flips[todo["owner_id"]] += 1 if todo["is_done"] else -1
+    return flips
+
+
+def project(columns, fields: Optional[List[str]] = None):
+    # Sparse fieldsets select only the requested columns; id is always included.
+    if fields is None:
+        return columns
+    return tuple(column for column in columns if column.key == "id" or column.key in fields)
+
+
+def _rows(result):
+    return [dict(row) for row in result.mappings()]
+
+
+async def _publish_bulk(type: str, key: str, items: List[Tuple[int, Any]]):
+    # One event per owner for a whole bulk write: an event per row would overflow every
+    # subscriber's EVENTS_BUFFER_SIZE on a large batch and evict it.
+    by_owner: Dict[int, list] = {}
+    for owner_id, item in items:
+        by_owner.setdefault(owner_id, []).append(item)
+    for owner_id, owned in by_owner.items():
+        await events.publish(owner_id, type, {key: owned})
+
+
+STATS_COLUMNS = (models.User.todo_count, models.User.done_count)
+
+
+def _user_columns(fields: Optional[List[str]], include_stats: bool):
+    columns = project(USER_COLUMNS, fields)
+    return columns + STATS_COLUMNS if include_stats else columns
+
+
+def _stats(total: int, done: int) -> dict:
+    return {"total": total, "done": done, "open": total - done}
+
 
+def _user_rows(result, include_stats: bool = False) -> List[dict]:
+    users = _rows(result)
+    if include_stats:
+        for user in users:
+            user["stats"] = _stats(user.pop("todo_count"), user.pop("done_count"))
+    return users
 
-async def get_user(db: AsyncSession, user_id: int, include_todos: bool = False):
-    query = select(models.User)
+
+USERS = models.User.__table__
+TODOS = models.Todo.__table__
+ARCHIVE = models.ArchivedTodo.__table__
+ARCHIVE_COLUMNS = tuple(ARCHIVE.c[field] for field in schemas.Todo.model_fields)
+
+
+def _core(columns):
+    return [column.property.columns[0] for column in columns]
+
+
+# The hottest reads are built once, with bound parameters, on the tables themselves. A
+# call then skips building the statement, computing its cache key and the ORM's
+# per-execution setup; the SQL is the same, so it still hits the compiled cache and
+# asyncpg's prepared statements. See benchmarks/bench_statements.py.
+_USER_BY_ID = select(*_core(USER_COLUMNS)).where(USERS.c.id == bindparam("id"))
+_USERS_PAGE = select(*_core(USER_COLUMNS)).offset(bindparam("skip")).limit(bindparam("limit"))
+_USER_EXISTS = select(USERS.c.id).where(USERS.c.id == bindparam("id"))
+_USER_VERSION = select(USERS.c.version).where(USERS.c.id == bindparam("id"))
+_USER_STATS = select(USERS.c.todo_count, USERS.c.done_count).where(USERS.c.id == bindparam("id"))
+_USER_CREDENTIALS = select(USERS.c.id, USERS.c.hashed_password, USERS.c.is_active).where(
+    USERS.c.email == bindparam("email")
+)
+_TODO_BY_ID = select(*_core(TODO_COLUMNS)).where(TODOS.c.id == bindparam("id"))
+_TODOS_PAGE = select(*_core(TODO_COLUMNS)).offset(bindparam("skip")).limit(bindparam("limit"))
+_TODO_VERSION = select(TODOS.c.version).where(TODOS.c.id == bindparam("id"))
+_ARCHIVED_TODO_BY_ID = select(*ARCHIVE_COLUMNS).where(ARCHIVE.c.id == bindparam("id"))
+_ARCHIVED_TODO_VERSION = select(ARCHIVE.c.version).where(ARCHIVE.c.id == bindparam("id"))
+
+
+def _with_archived(fields: Optional[List[str]], where, order=None, limit: Optional[int] = None):
+    # Archived todos keep their ids and columns, so the two tables read as one. With a
+    # limit, each side is ordered and cut on its own index before they are merged.
+    names = [column.key for column in project(TODO_COLUMNS, fields)]
+    parts = []
+    for table in (TODOS, ARCHIVE):
+        part = select(*(table.c[name] for name in names)).where(*where(table))
+        if limit is not None:
+            part = select(part.order_by(order(table)).limit(limit).subquery())
+        parts.append(part)
+    return union_all(*parts).subquery()
+
+
+async def attach_todos(db: AsyncSession, users: List[dict], include_archived: bool = False):
+    # Same single IN query a selectin load would issue, without building ORM objects.
+    todos_by_owner = {}
+    for user in users:
+        user["todos"] = todos_by_owner[user["id"]] = []
+    if todos_by_owner and include_archived:
+        merged = _with_archived(None, lambda table: [table.c.owner_id.in_(todos_by_owner)])
+        result = await db.execute(select(*merged.c).order_by(merged.c.id))
+        for todo in _rows(result):
+            todos_by_owner[todo["owner_id"]].append(todo)
+    elif todos_by_owner:
+        result = await db.execute(
+            select(*TODO_COLUMNS)
+            .filter(models.Todo.owner_id.in_(todos_by_owner))
+            .order_by(models.Todo.id)
+        )
+        for todo in _rows(result):
+            todos_by_owner[todo["owner_id"]].append(todo)
+    return users
+
+
+async def get_user(
+    db: AsyncSession,
+    user_id: int,
+    include_todos: bool = False,
+    fields: Optional[List[str]] = None,
+    include_archived: bool = False,
+):
+    if fields is None:
+        result = await db.execute(_USER_BY_ID, {"id": user_id})
+    else:
+        query = select(*project(USER_COLUMNS, fields)).filter(models.User.id == user_id)
+        result = await db.execute(query)
+    users = _rows(result)
     if include_todos:
-        query = query.options(selectinload(models.User.todos))
-    query = query.filter(models.User.id == user_id)
-    result = await db.execute(query)
-    return result.scalars().first()
+        await attach_todos(db, users, include_archived)
+    return users[0] if users else None
 
 
-async def get_user_by_email(db: AsyncSession, email: str, include_todos: bool = False):
-    query = select(models.User)
+async def get_users_by_ids(
+    db: AsyncSession,
+    ids: List[int],
+    include_todos: bool = False,
+    fields: Optional[List[str]] = None,
+    include_stats: bool = False,
+) -> Dict[int, dict]:
+    users = []
+    for batch in _batches(ids):
+        query = select(*_user_columns(fields, include_stats)).filter(models.User.id.in_(batch))
+        users.extend(_user_rows(await db.execute(query), include_stats))
     if include_todos:
-        query = query.options(selectinload(models.User.todos))
-    query = query.filter(models.User.email == email)
-    result = await db.execute(query)
-    return result.scalars().first()
+        await attach_todos(db, users)
+    return {user["id"]: user for user in users}
 
 
-async def get_users(db: AsyncSession, skip: int = 0, limit: int = 100, include_todos: bool = False):
-    query = select(models.User)
+async def get_users(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    include_todos: bool = False,
+    fields: Optional[List[str]] = None,
+    include_stats: bool = False,
+):
+    if fields is None and not include_stats:
+        result = await db.execute(_USERS_PAGE, {"skip": skip, "limit": limit})
+    else:
+        result = await db.execute(
+            select(*_user_columns(fields, include_stats)).offset(skip).limit(limit)
+        )
+    users = _user_rows(result, include_stats)
     if include_todos:
-        query = query.options(selectinload(models.User.todos))
-    query = query.offset(skip).limit(limit)
-    result = await db.execute(query)
-    return result.scalars().all()
+        await attach_todos(db, users)
+    return users
+
+
+async def get_users_after(
+    db: AsyncSession,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    include_todos: bool = False,
+    fields: Optional[List[str]] = None,
+    include_stats: bool = False,
+):
+    query = select(*_user_columns(fields, include_stats))
+    if after_id is not None:
+        query = query.filter(models.User.id > after_id)
+    result = await db.execute(query.order_by(models.User.id).limit(limit))
+    users = _user_rows(result, include_stats)
+    if include_todos:
+        await attach_todos(db, users)
+    return users
+
+
+async def get_user_credentials(db: AsyncSession, email: str):
+    result = await db.execute(_USER_CREDENTIALS, {"email": email})
+    return result.first()
+
+
+async def get_user_stats(db: AsyncSession, user_id: int) -> Optional[dict]:
+    row = (await db.execute(_USER_STATS, {"id": user_id})).first()
+    return _stats(*row) if row is not None else None
+
+
+async def claim_email(db: AsyncSession, email: str) -> Optional[int]:
+    # Sharded only: reserves the email in the directory and returns the new user's id,
+    # or None when the email is already registered on some shard.
+    user_id = (await sequences.allocate("users", 1))[0]
+    result = await db.execute(
+        _insert(db, models.UserEmail)
+        .values(email=email, user_id=user_id)
+        .on_conflict_do_nothing(index_elements=[models.UserEmail.email])
+        .returning(models.UserEmail.user_id)
+    )
+    claimed = result.scalar()
+    await db.commit()
+    return claimed
+
+
+async def release_email(db: AsyncSession, email: str):
+    await db.execute(delete(models.UserEmail).where(models.UserEmail.email == email))
+    await db.commit()
 
 
-async def create_user(db: AsyncSession, user: schemas.UserCreate):
-    fake_hashed_password = user.password + "notreallyhashed"
-    db_user = models.User(email=user.email, hashed_password=fake_hashed_password)
-    db.add(db_user)
+async def create_user(
+    db: AsyncSession,
+    user: schemas.UserCreate,
+    hashed_password: str,
+    user_id: Optional[int] = None,
+):
+    # Returns no row when the email is already registered.
+    values = {"email": user.email, "hashed_password": hashed_password}
+    if user_id is not None:
+        values["id"] = user_id
+    result = await db.execute(
+        _insert(db, models.User)
+        .values(**values)
+        .on_conflict_do_nothing(index_elements=[models.User.email])
+        .returning(*USER_COLUMNS)
+    )
+    db_user = result.mappings().first()
     await db.commit()
-    await db.refresh(db_user)
-    # After creation, the 'todos' relationship will be empty, so no need to reload.
-    return db_user
+    if db_user is None:
+        return None
+    await cache.invalidate_user(db_user["id"])
+    return dict(db_user)
+
+
+async def delete_user(db: AsyncSession, user_id: int) -> Optional[str]:
+    # Returns the deleted user's email. Raises IntegrityError while the user still has
+    # todos; app.jobs deletes those in batches first.
+    try:
+        result = await db.execute(
+            delete(models.User)
+            .where(models.User.id == user_id)
+            .returning(models.User.email)
+            .execution_options(synchronize_session=False)
+        )
+        email = result.scalar()
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise
+    if email is not None:
+        await cache.invalidate_user(user_id)
+    return email
+
+
+async def get_todos(
+    db: AsyncSession,
+    skip: int = 0,
+    limit: int = 100,
+    owner_id: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    include_archived: bool = False,
+):
+    if include_archived:
+        merged = _with_archived(
+            fields,
+            lambda table: [] if owner_id is None else [table.c.owner_id == owner_id],
+            lambda table: table.c.id,
+            skip + limit,
+        )
+        query = select(*merged.c).order_by(merged.c.id).offset(skip).limit(limit)
+        return _rows(await db.execute(query))
+    if fields is None and owner_id is None:
+        return _rows(await db.execute(_TODOS_PAGE, {"skip": skip, "limit": limit}))
+    query = select(*project(TODO_COLUMNS, fields))
+    if owner_id is not None:
+        query = query.filter(models.Todo.owner_id == owner_id)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return _rows(result)
+
+
+async def get_todos_after(
+    db: AsyncSession,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    owner_id: Optional[int] = None,
+    fields: Optional[List[str]] = None,
+    include_archived: bool = False,
+):
+    if include_archived:
+
+        def where(table):
+            criteria = [] if owner_id is None else [table.c.owner_id == owner_id]
+            return criteria + ([] if after_id is None else [table.c.id > after_id])
+
+        merged = _with_archived(fields, where, lambda table: table.c.id, limit)
+        return _rows(await db.execute(select(*merged.c).order_by(merged.c.id).limit(limit)))
+    query = select(*project(TODO_COLUMNS, fields))
+    if owner_id is not None:
+        # Seeking on (owner_id, id) keeps per-user pages on a single index range.
+        query = query.filter(models.Todo.owner_id == owner_id)
+        query = query.order_by(models.Todo.owner_id, models.Todo.id)
+    else:
+        query = query.order_by(models.Todo.id)
+    if after_id is not None:
+        query = query.filter(models.Todo.id > after_id)
+    result = await db.execute(query.limit(limit))
+    return _rows(result)
+
+
+async def get_user_todos(
+    db: AsyncSession,
+    user_id: int,
+    is_done: Optional[bool] = None,
+    descending: bool = False,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    fields: Optional[List[str]] = None,
+    include_archived: bool = False,
+):
+    if include_archived and is_done is not False:
 
+        def where(table):
+            criteria = [table.c.owner_id == user_id]
+            if is_done is not None:
+                criteria.append(table.c.is_done == is_done)
+            if after_id is not None:
+                criteria.append(table.c.id < after_id if descending else table.c.id > after_id)
+            return criteria
 
-async def get_todos(db: AsyncSession, skip: int = 0, limit: int = 100):
-    result = await db.execute(select(models.Todo).offset(skip).limit(limit))
-    return result.scalars().all()
+        def order(table):
+            return table.c.id.desc() if descending else table.c.id
+
+        merged = _with_archived(fields, where, order, limit)
+        query = select(*merged.c).order_by(order(merged)).limit(limit)
+        return _rows(await db.execute(query))
+    # Equality on owner_id (and is_done) plus ordering on id is a single range
+    # scan of ix_todos_owner_id_is_done_id in either direction.
+    query = select(*project(TODO_COLUMNS, fields)).filter(models.Todo.owner_id == user_id)
+    if is_done is not None:
+        query = query.filter(models.Todo.is_done == is_done)
+    if after_id is not None:
+        query = query.filter(models.Todo.id < after_id if descending else models.Todo.id > after_id)
+    query = query.order_by(models.Todo.id.desc() if descending else models.Todo.id)
+    result = await db.execute(query.limit(limit))
+    return _rows(result)
+
+
+_SEARCH_SQL = {
+    # Both queries rank every match and then seek on (rank, id) descending, so the
+    # cost follows the number of matches rather than the size of the table.
+    "postgresql": """
+        SELECT * FROM (
+            SELECT todos.title, todos.description, todos.is_done, todos.id, todos.owner_id,
+                   todos.version, ts_rank(todos.search_vector, query) AS rank
+            FROM todos, websearch_to_tsquery('english', :q) AS query
+            WHERE todos.search_vector @@ query {owner_filter}
+        ) AS matches
+        {after_filter}
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit
+    """,
+    "sqlite": """
+        SELECT * FROM (
+            SELECT todos.title, todos.description, todos.is_done, todos.id, todos.owner_id,
+                   todos.version, -bm25(todos_fts) AS rank
+            FROM todos_fts JOIN todos ON todos.id = todos_fts.rowid
+            WHERE todos_fts MATCH :q {owner_filter}
+        ) AS matches
+        {after_filter}
+        ORDER BY rank DESC, id DESC
+        LIMIT :limit
+    """,
+}
+
+
+def _fts5_query(q: str) -> str:
+    # Quote every term so user input is matched literally instead of as FTS5 syntax.
+    return " ".join('"{}"'.format(term.replace('"', '""')) for term in q.split())
+
+
+async def search_todos(
+    db: AsyncSession,
+    q: str,
+    owner_id: Optional[int] = None,
+    after: Optional[tuple] = None,
+    limit: int = 100,
+):
+    dialect = db.bind.dialect.name
+    params = {"q": q if dialect == "postgresql" else _fts5_query(q), "limit": limit}
+    owner_filter = after_filter = ""
+    if owner_id is not None:
+        owner_filter = "AND todos.owner_id = :owner_id"
+        params["owner_id"] = owner_id
+    if after is not None:
+        after_filter = "WHERE rank < :rank OR (rank = :rank AND id < :after_id)"
+        params["rank"], params["after_id"] = after
+    query = _SEARCH_SQL[dialect].format(owner_filter=owner_filter, after_filter=after_filter)
+    # Typed like the model's columns, or SQLite hands back is_done as 0/1.
+    columns = {column.key: column.type for column in TODO_COLUMNS}
+    result = await db.execute(text(query).columns(**columns, rank=Float()), params)
+    return _rows(result)
+
+
+async def user_exists(db: AsyncSession, user_id: int) -> bool:
+    result = await db.execute(_USER_EXISTS, {"id": user_id})
+    return result.scalar() is not None
+
+
+async def estimate_count(db: AsyncSession, model, *criteria) -> int:
+    if db.bind.dialect.name != "postgresql":
+        result = await db.execute(select(func.count()).select_from(model).filter(*criteria))
+        return result.scalar_one()
+    if not criteria:
+        result = await db.execute(
+            text("SELECT reltuples::bigint FROM pg_class WHERE oid = CAST(:table AS regclass)"),
+            {"table": model.__tablename__},
+        )
+        # reltuples is -1 until the table has been vacuumed or analyzed.
+        return max(result.scalar_one(), 0)
+    query = select(model.id).filter(*criteria).compile(
+        dialect=db.bind.dialect, compile_kwargs={"literal_binds": True}
+    )
+    result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {query}"))
+    plan = result.scalar_one()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+async def stream_todos(
+    db: AsyncSession, owner_ids: Optional[List[int]] = None, chunk_size: int = EXPORT_CHUNK_SIZE
+):
+    query = select(*TODO_COLUMNS).order_by(models.Todo.id)
+    if owner_ids:
+        query = query.filter(models.Todo.owner_id.in_(owner_ids))
+    # stream() keeps a server-side cursor open, so only one chunk is in memory at a time.
+    result = await db.stream(query.execution_options(yield_per=chunk_size))
+    try:
+        async for rows in result.partitions():
+            yield rows
+    finally:
+        with anyio.CancelScope(shield=True):
+            await result.close()
 
 
 async def create_user_todo(db: AsyncSession, todo: schemas.TodoCreate, user_id: int):
     try:
-        db_todo = models.Todo(**todo.model_dump(), owner_id=user_id)
-        db.add(db_todo)
+        values = await _with_ids("todos", [_new_todo(todo, user_id)])
+        result = await db.execute(
+            insert(models.Todo).values(**values[0]).returning(*TODO_COLUMNS)
+        )
+        db_todo = dict(result.mappings().one())
+        await _count_todos(db, {user_id: 1}, {user_id: int(todo.is_done)})
         await db.commit()
-        await db.refresh(db_todo)
-        return db_todo
+    except IntegrityError:
+        # The owner_id foreign key is the existence check for the user.
+        await db.rollback()
+        raise
+    except TodoLimitReached:
+        await db.rollback()
+        raise
     except SQLAlchemyError:
         await db.rollback()
         return None
+    await cache.invalidate_todo(db_todo["id"], owner_id=user_id)
+    await events.publish(user_id, "todo.created", db_todo)
+    return db_todo
 
 
-async def get_todo(db: AsyncSession, todo_id: int):
-    result = await db.execute(select(models.Todo).filter(models.Todo.id == todo_id))
-    return result.scalars().first()
+async def get_todo(
+    db: AsyncSession,
+    todo_id: int,
+    fields: Optional[List[str]] = None,
+    include_archived: bool = True,
+):
+    if fields is None:
+        result = await db.execute(_TODO_BY_ID, {"id": todo_id})
+    else:
+        result = await db.execute(
+            select(*project(TODO_COLUMNS, fields)).filter(models.Todo.id == todo_id)
+        )
+    todos = _rows(result)
+    if not todos and include_archived:
+        # Only a miss in the hot table pays for the archive lookup.
+        if fields is None:
+            result = await db.execute(_ARCHIVED_TODO_BY_ID, {"id": todo_id})
+        else:
+            result = await db.execute(
+                select(*project(ARCHIVE_COLUMNS, fields)).where(ARCHIVE.c.id == todo_id)
+            )
+        todos = _rows(result)
+    return todos[0] if todos else None
 
 
-async def update_todo(db: AsyncSession, todo_id: int, todo: schemas.TodoUpdate):
-    db_todo = await get_todo(db, todo_id)
-    if db_todo:
-        update_data = todo.model_dump(exclude_unset=True)
-        for key, value in update_data.items():
-            setattr(db_todo, key, value)
-        await db.commit()
-        await db.refresh(db_todo)
+async def get_todos_by_ids(
+    db: AsyncSession, ids: List[int], fields: Optional[List[str]] = None
+) -> Dict[int, dict]:
+    todos = {}
+    for columns, table in ((TODO_COLUMNS, TODOS), (ARCHIVE_COLUMNS, ARCHIVE)):
+        # The archive is only asked for the ids the hot table did not have.
+        for batch in _batches([id for id in ids if id not in todos]):
+            query = select(*project(columns, fields)).where(table.c.id.in_(batch))
+            for todo in _rows(await db.execute(query)):
+                todos[todo["id"]] = todo
+    return todos
+
+
+class VersionMismatch(Exception):
+    pass
+
+
+class TodoArchived(Exception):
+    pass
+
+
+async def get_todo_version(
+    db: AsyncSession, todo_id: int, include_archived: bool = False
+) -> Optional[int]:
+    # Covered by ix_todos_id_version, so the row itself is never read.
+    version = (await db.execute(_TODO_VERSION, {"id": todo_id})).scalar()
+    if version is None and include_archived:
+        version = (await db.execute(_ARCHIVED_TODO_VERSION, {"id": todo_id})).scalar()
+    return version
+
+
+async def get_user_version(db: AsyncSession, user_id: int, include_todos: bool = False):
+    version = (await db.execute(_USER_VERSION, {"id": user_id})).scalar()
+    if version is None or not include_todos:
+        return version, None
+    result = await db.execute(
+        select(models.Todo.id, models.Todo.version)
+        .filter(models.Todo.owner_id == user_id)
+        .order_by(models.Todo.id)
+    )
+    return version, [list(row) for row in result.all()]
+
+
+async def _check_version(
+    db: AsyncSession,
+    todo_id: int,
+    versions: Optional[List[int]],
+    include_archived: bool = False,
+):
+    # Only reached when the guarded statement matched nothing: tell a missing todo
+    # from a stale one.
+    if versions is None:
+        return
+    if await get_todo_version(db, todo_id, include_archived) is not None:
+        raise VersionMismatch()
+
+
+async def _check_archived(db: AsyncSession, todo_id: int):
+    # Archived todos can be read and deleted but not changed.
+    if (await db.execute(_ARCHIVED_TODO_VERSION, {"id": todo_id})).scalar() is not None:
+        raise TodoArchived()
+
+
+def _version_filter(query, versions: Optional[List[int]], column=models.Todo.version):
+    # An empty list is If-Match: * and only requires the todo to exist.
+    if versions:
+        query = query.where(column.in_(versions))
+    return query
+
+
+async def update_todo(
+    db: AsyncSession,
+    todo_id: int,
+    todo: schemas.TodoUpdate,
+    versions: Optional[List[int]] = None,
+):
+    update_data = todo.model_dump(exclude_unset=True)
+    if not update_data:
+        db_todo = await get_todo(db, todo_id, include_archived=False)
+        if db_todo is None:
+            await _check_archived(db, todo_id)
+        elif versions and db_todo["version"] not in versions:
+            raise VersionMismatch()
+        return db_todo
+    if "is_done" in update_data:
+        update_data["completed_at"] = _completed_at(update_data["is_done"])
+    # The version check and the bump happen in the UPDATE itself, so two writers that
+    # read the same version cannot both succeed.
+    query = (
+        _version_filter(update(models.Todo).where(models.Todo.id == todo_id), versions)
+        .values(**update_data, version=models.Todo.version + 1)
+        .execution_options(synchronize_session=False)
+    )
+    rows, was_done = await _update_todos(db, query, [todo_id], "is_done" in update_data)
+    db_todo = rows[0] if rows else None
+    if db_todo is not None:
+        await _count_todos(db, {}, _done_flips([db_todo], was_done))
+    await db.commit()
+    if db_todo is None:
+        await _check_version(db, todo_id, versions)
+        await _check_archived(db, todo_id)
+        return None
+    await cache.invalidate_todo(todo_id, owner_id=db_todo["owner_id"])
+    await events.publish(db_todo["owner_id"], "todo.updated", db_todo)
     return db_todo
 
 
-async def delete_todo(db: AsyncSession, todo_id: int):
-    db_todo = await get_todo(db, todo_id)
-    if db_todo:
-        await db.delete(db_todo)
+async def delete_todo(db: AsyncSession, todo_id: int, versions: Optional[List[int]] = None):
+    result = await db.execute(
+        _version_filter(delete(models.Todo).where(models.Todo.id == todo_id), versions)
+        .returning(models.Todo.owner_id, models.Todo.is_done)
+        .execution_options(synchronize_session=False)
+    )
+    owner_id, is_done = result.first() or (None, None)
+    if owner_id is None:
+        # Only a miss in the hot table pays for the archive.
+        query = delete(ARCHIVE).where(ARCHIVE.c.id == todo_id)
+        result = await db.execute(
+            _version_filter(query, versions, ARCHIVE.c.version)
+            .returning(ARCHIVE.c.owner_id, ARCHIVE.c.is_done)
+        )
+        owner_id, is_done = result.first() or (None, None)
+    if owner_id is not None:
+        await _count_todos(db, {owner_id: -1}, {owner_id: -int(bool(is_done))})
+    await db.commit()
+    if owner_id is None:
+        await _check_version(db, todo_id, versions, include_archived=True)
+        return False
+    await cache.invalidate_todo(todo_id, owner_id=owner_id)
+    await events.publish(owner_id, "todo.deleted", {"id": todo_id})
+    return True
+
+
+async def create_user_todos(db: AsyncSession, todos: List[schemas.TodoCreate], user_id: int):
+    try:
+        created = []
+        values = await _with_ids("todos", [_new_todo(todo, user_id) for todo in todos])
+        for batch in _batches(values):
+            result = await db.execute(
+                insert(models.Todo).values(batch).returning(*TODO_COLUMNS)
+            )
+            # RETURNING order is unspecified, but ids are handed out in VALUES order.
+            rows = sorted(result.mappings(), key=lambda row: row["id"])
+            created.extend(dict(row) for row in rows)
+        done = sum(1 for todo in created if todo["is_done"])
+        await _count_todos(db, {user_id: len(created)}, {user_id: done})
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        return None
+    except TodoLimitReached:
+        await db.rollback()
+        raise
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    await cache.invalidate_user(user_id)
+    await _publish_bulk("todos.created", "todos", [(user_id, todo) for todo in created])
+    return created
+
+
+async def create_todos(db: AsyncSession, todos: List[Tuple[int, schemas.TodoCreate]]):
+    # Todos for any mix of users, as one multi-row INSERT and a single commit. Any
+    # failure rolls the whole group back and is raised for the caller to split up.
+    try:
+        values = await _with_ids(
+            "todos", [_new_todo(todo, user_id) for user_id, todo in todos]
+        )
+        result = await db.execute(insert(models.Todo).values(values).returning(*TODO_COLUMNS))
+        # RETURNING order is unspecified, but ids are handed out in VALUES order.
+        created = [dict(row) for row in sorted(result.mappings(), key=lambda row: row["id"])]
+        await _count_todos(
+            db,
+            Counter(todo["owner_id"] for todo in created),
+            Counter(todo["owner_id"] for todo in created if todo["is_done"]),
+        )
+        await db.commit()
+    except (SQLAlchemyError, TodoLimitReached):
+        await db.rollback()
+        raise
+    for db_todo in created:
+        await cache.invalidate_todo(db_todo["id"], owner_id=db_todo["owner_id"])
+    await _publish_bulk("todos.created", "todos", [(todo["owner_id"], todo) for todo in created])
+    return created
+
+
+async def update_todos(db: AsyncSession, todos: List[schemas.TodoBulkUpdateItem]):
+    updated = {}
+    try:
+        for batch in _batches(todos):
+            ids = [todo.id for todo in batch]
+            values = {}
+            for field in schemas.TodoUpdate.model_fields:
+                whens = {
+                    todo.id: getattr(todo, field) for todo in batch if field in todo.model_fields_set
+                }
+                if whens:
+                    column = getattr(models.Todo, field)
+                    values[field] = case(whens, value=models.Todo.id, else_=column)
+            if "is_done" in values:
+                completed_at = {
+                    todo.id: _completed_at(todo.is_done)
+                    for todo in batch
+                    if "is_done" in todo.model_fields_set
+                }
+                values["completed_at"] = case(
+                    completed_at, value=models.Todo.id, else_=models.Todo.completed_at
+                )
+            if values:
+                track_done = "is_done" in values
+                values["version"] = models.Todo.version + 1
+                query = (
+                    update(models.Todo)
+                    .where(models.Todo.id.in_(ids))
+                    .values(**values)
+                    .execution_options(synchronize_session=False)
+                )
+                rows, was_done = await _update_todos(db, query, ids, track_done)
+                await _count_todos(db, {}, _done_flips(rows, was_done))
+            else:
+                query = select(*TODO_COLUMNS).filter(models.Todo.id.in_(ids))
+                rows = _rows(await db.execute(query))
+            updated.update((row["id"], row) for row in rows)
+        # Archived todos are read-only; they are reported as such rather than as missing.
+        archived = set()
+        for batch in _batches([todo.id for todo in todos if todo.id not in updated]):
+            result = await db.execute(select(ARCHIVE.c.id).where(ARCHIVE.c.id.in_(batch)))
+            archived.update(result.scalars())
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    for todo in updated.values():
+        await cache.invalidate_todo(todo["id"], owner_id=todo["owner_id"])
+    await _publish_bulk(
+        "todos.updated", "todos", [(todo["owner_id"], todo) for todo in updated.values()]
+    )
+    statuses = {**dict.fromkeys(archived, "archived"), **dict.fromkeys(updated, "updated")}
+    return [
+        {
+            "id": todo.id,
+            "status": statuses.get(todo.id, "not_found"),
+            "todo": updated.get(todo.id),
+        }
+        for todo in todos
+    ]
+
+
+async def delete_todos(db: AsyncSession, ids: List[int]):
+    deleted = {}
+    removed, removed_done = Counter(), Counter()
+    try:
+        # The archive is only asked for the ids the hot table did not have.
+        for table in (TODOS, ARCHIVE):
+            for batch in _batches([id for id in ids if id not in deleted]):
+                result = await db.execute(
+                    delete(table)
+                    .where(table.c.id.in_(batch))
+                    .returning(table.c.id, table.c.owner_id, table.c.is_done)
+                )
+                for todo_id, owner_id, is_done in result.all():
+                    deleted[todo_id] = owner_id
+                    removed[owner_id] -= 1
+                    removed_done[owner_id] -= int(bool(is_done))
+        await _count_todos(db, removed, removed_done)
         await db.commit()
-        return True
-    return False
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    for todo_id, owner_id in deleted.items():
+        await cache.invalidate_todo(todo_id, owner_id=owner_id)
+    await _publish_bulk(
+        "todos.deleted", "ids", [(owner_id, todo_id) for todo_id, owner_id in deleted.items()]
+    )
+    return [
+        {"id": todo_id, "status": "deleted" if todo_id in deleted else "not_found", "todo": None}
+        for todo_id in ids
+    ]
+
+
+async def archive_todos(db: AsyncSession, cutoff: datetime, limit: int = BULK_BATCH_SIZE) -> int:
+    # Moves up to ``limit`` todos completed before ``cutoff`` to todos_archive in one
+    # transaction. They keep counting in their owners' todo_count and done_count, so
+    # archiving never changes a user's stats.
+    due = (TODOS.c.is_done.is_(True), TODOS.c.completed_at < cutoff)
+    try:
+        result = await db.execute(
+            select(TODOS.c.id)
+            .where(*due)
+            .order_by(TODOS.c.completed_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        ids = result.scalars().all()
+        if not ids:
+            return 0
+        names = [column.key for column in ARCHIVE.c if column.key != "archived_at"]
+        archived_at = literal(_now(), ARCHIVE.c.archived_at.type)
+        rows = select(*(TODOS.c[name] for name in names), archived_at)
+        await db.execute(
+            insert(ARCHIVE).from_select(
+                names + ["archived_at"], rows.where(TODOS.c.id.in_(ids), *due)
+            )
+        )
+        result = await db.execute(
+            delete(TODOS)
+            .where(TODOS.c.id.in_(ids), *due)
+            .returning(TODOS.c.id, TODOS.c.owner_id)
+        )
+        moved = result.all()
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    for todo_id, owner_id in moved:
+        await cache.invalidate_todo(todo_id, owner_id=owner_id)
+    await _publish_bulk(
+        "todos.archived", "ids", [(owner_id, todo_id) for todo_id, owner_id in moved]
+    )
+    return len(moved)
+
+
+async def delete_archived_todos(
+    db: AsyncSession, user_id: int, limit: int = BULK_BATCH_SIZE
+) -> int:
+    # Up to ``limit`` of the user's archived todos, oldest first; returns how many went.
+    try:
+        ids = select(ARCHIVE.c.id).where(ARCHIVE.c.owner_id == user_id).order_by(ARCHIVE.c.id)
+        result = await db.execute(
+            delete(ARCHIVE)
+            .where(ARCHIVE.c.id.in_(ids.limit(limit)))
+            .returning(ARCHIVE.c.id, ARCHIVE.c.is_done)
+        )
+        rows = result.all()
+        deleted = [todo_id for todo_id, _ in rows]
+        if deleted:
+            done = sum(1 for _, is_done in rows if is_done)
+            await _count_todos(db, {user_id: -len(deleted)}, {user_id: -done})
+        await db.commit()
+    except SQLAlchemyError:
+        await db.rollback()
+        raise
+    for todo_id in deleted:
+        await cache.invalidate_todo(todo_id, owner_id=user_id)
+    await _publish_bulk("todos.deleted", "ids", [(user_id, todo_id) for todo_id in deleted])
+    return len(deleted)
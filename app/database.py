@@ -1,19 +1,385 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
-from sqlalchemy.orm import declarative_base
+import asyncio
+import bisect
+import hashlib
+import itertools
 import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from fastapi import Depends, HTTPException, Request, Response
+from starlette.requests import HTTPConnection
+from sqlalchemy import event, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, create_async_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.orm import declarative_base
+
+from . import metrics
 
 DATABASE_URL = os.getenv("DATABASE_URL", "postgresql+asyncpg://user:password@db:5432/appdb")
 
-engine = create_async_engine(
-    DATABASE_URL,
-    pool_size=10,  # Number of connections to keep open in the pool
-    max_overflow=20,  # Number of connections that can be opened beyond the pool_size
-)
+# Comma-separated replica URLs; reads fall back to the primary when empty or all are down.
+DATABASE_READ_URLS = [
+    url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()
+]
+REPLICA_STRATEGY = os.getenv("REPLICA_STRATEGY", "round_robin")
+REPLICA_HEALTH_CHECK_SECONDS = float(os.getenv("REPLICA_HEALTH_CHECK_SECONDS", "5"))
+# After a write, the client's reads stay on the primary for this long.
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", "5"))
+READ_PRIMARY_COOKIE = "read_primary_until"
+
+# Comma-separated shard URLs. When set, each user and all of their todos live on the shard
+# the user id hashes to; DATABASE_URL then only holds id blocks and the email directory.
+DATABASE_SHARD_URLS = [
+    url.strip() for url in os.getenv("DATABASE_SHARD_URLS", "").split(",") if url.strip()
+]
+# The shard list before the last change, kept while app.rebalance moves users across.
+DATABASE_PREVIOUS_SHARD_URLS = [
+    url.strip()
+    for url in os.getenv("DATABASE_PREVIOUS_SHARD_URLS", "").split(",")
+    if url.strip()
+]
+SHARD_VNODES = int(os.getenv("SHARD_VNODES", "64"))
+
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "20"))
+# Backstop only: admission control keeps requests from queueing on the pool.
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Compiled SQL kept per engine; SQLAlchemy's default of 500 is outgrown by the variants
+# of sparse fieldsets, filters and batch sizes. Hit rates are in /metrics.
+DB_QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "1200"))
+# Server-side prepared statements asyncpg keeps per connection; 0 turns them off, as
+# transaction-mode PgBouncer requires.
+DB_PREPARED_STATEMENT_CACHE_SIZE = int(os.getenv("DB_PREPARED_STATEMENT_CACHE_SIZE", "500"))
+
+ENGINE_OPTIONS = {
+    "pool_size": DB_POOL_SIZE,  # Number of connections to keep open in the pool
+    "max_overflow": DB_MAX_OVERFLOW,  # Connections that can be opened beyond the pool_size
+    "pool_timeout": DB_POOL_TIMEOUT,  # Seconds to wait for a connection before giving up
+    "poolclass": metrics.TimedAsyncQueuePool,  # Records how long checkouts wait
+}
+
+
+def engine_options(url: str) -> dict:
+    # aiosqlite file databases use NullPool, which takes no pool sizing.
+    options = {} if url.startswith("sqlite") else dict(ENGINE_OPTIONS)
+    options["query_cache_size"] = DB_QUERY_CACHE_SIZE
+    if "+asyncpg" in url:
+        options["connect_args"] = {
+            "prepared_statement_cache_size": DB_PREPARED_STATEMENT_CACHE_SIZE
+        }
+    return options
 
-AsyncSessionLocal = async_sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+_engine: Optional[AsyncEngine] = None
+_sessionmaker: Optional[async_sessionmaker] = None
+_engine_pid: Optional[int] = None
+
+
+def get_engine() -> AsyncEngine:
+    # Built on first use in each worker: connections inherited across a fork are shared
+    # sockets, so a pre-forked worker must never reuse its parent's engine.
+    global _engine, _sessionmaker, _engine_pid
+    if _engine is None or _engine_pid != os.getpid():
+        _engine = create_async_engine(DATABASE_URL, **engine_options(DATABASE_URL))
+        _sessionmaker = async_sessionmaker(autocommit=False, autoflush=False, bind=_engine)
+        _engine_pid = os.getpid()
+    return _engine
+
+
+# Pools are only reported once something has opened them.
+metrics.register_engine("primary", lambda: _engine)
+
+
+def session_factory() -> async_sessionmaker:
+    get_engine()
+    return _sessionmaker
 
 Base = declarative_base()
 
+
+@event.listens_for(Engine, "connect")
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # SQLite leaves foreign keys unenforced unless asked; the write paths rely on them.
+    if "sqlite" in type(dbapi_connection).__module__:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.close()
+
+
 async def get_db():
-    async with AsyncSessionLocal() as session:
+    async with session_factory()() as session:
         yield session
+
+
+class Replica:
+    def __init__(self, url: str, **engine_options):
+        self.url = url
+        self.engine_options = engine_options
+        self.healthy = True
+        self.in_use = 0
+        self._engine: Optional[AsyncEngine] = None
+        self._sessionmaker: Optional[async_sessionmaker] = None
+        self._pid: Optional[int] = None
+
+    @property
+    def engine(self) -> AsyncEngine:
+        if self._engine is None or self._pid != os.getpid():
+            self._engine = create_async_engine(self.url, **self.engine_options)
+            self._sessionmaker = async_sessionmaker(
+                autocommit=False, autoflush=False, bind=self._engine
+            )
+            self._pid = os.getpid()
+        return self._engine
+
+    @property
+    def sessionmaker(self) -> async_sessionmaker:
+        self.engine
+        return self._sessionmaker
+
+
+class ReplicaRouter:
+    def __init__(self, replicas: List[Replica], strategy: str = "round_robin"):
+        self.replicas = replicas
+        self.strategy = strategy
+        self._counter = itertools.count()
+
+    def choose(self) -> Optional[Replica]:
+        healthy = [replica for replica in self.replicas if replica.healthy]
+        if not healthy:
+            return None
+        if self.strategy == "least_busy":
+            return min(healthy, key=lambda replica: replica.in_use)
+        return healthy[next(self._counter) % len(healthy)]
+
+    async def check_health(self, timeout: float = 2.0):
+        for replica in self.replicas:
+            try:
+                async with replica.engine.connect() as conn:
+                    await asyncio.wait_for(conn.execute(text("SELECT 1")), timeout)
+                replica.healthy = True
+            except Exception:
+                replica.healthy = False
+
+    async def run_health_checks(self, interval: float = REPLICA_HEALTH_CHECK_SECONDS):
+        while True:
+            await self.check_health()
+            await asyncio.sleep(interval)
+
+    async def dispose(self):
+        for replica in self.replicas:
+            if replica._engine is not None:
+                await replica._engine.dispose()
+
+
+read_router = ReplicaRouter(
+    [Replica(url, **engine_options(url)) for url in DATABASE_READ_URLS], strategy=REPLICA_STRATEGY
+)
+for _index, _replica in enumerate(read_router.replicas):
+    metrics.register_engine(f"replica-{_index}", lambda replica=_replica: replica._engine)
+
+
+def pinned_to_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(READ_PRIMARY_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def read_your_writes(connection: HTTPConnection, response: Response):
+    # Runs for websockets too, which have no method and never write.
+    method = connection.scope.get("method", "GET")
+    if read_router.replicas and method not in ("GET", "HEAD", "OPTIONS"):
+        response.set_cookie(
+            READ_PRIMARY_COOKIE,
+            str(time.time() + READ_YOUR_WRITES_SECONDS),
+            max_age=max(int(READ_YOUR_WRITES_SECONDS), 1),
+            httponly=True,
+        )
+
+
+def from_replica(db: AsyncSession) -> bool:
+    # A replica may not have a write yet, so what it returns must not go into the cache.
+    return db.info.get("replica", False)
+
+
+async def get_read_db(request: Request):
+    replica = None if pinned_to_primary(request) else read_router.choose()
+    if replica is None:
+        async with session_factory()() as session:
+            yield session
+        return
+    replica.in_use += 1
+    try:
+        async with replica.sessionmaker() as session:
+            session.info["replica"] = True
+            yield session
+    finally:
+        replica.in_use -= 1
+
+
+# Routing lookups; text() because the models import this module.
+# Archived todos stay on their owner's shard, so they are located the same way.
+_TODO_OWNER = text(
+    "SELECT COALESCE((SELECT owner_id FROM todos WHERE id = :id), "
+    "(SELECT owner_id FROM todos_archive WHERE id = :id))"
+)
+_USER_EXISTS = text("SELECT 1 FROM users WHERE id = :id")
+
+
+async def _scalar(db: AsyncSession, query, **params):
+    return (await db.execute(query, params)).scalar()
+
+
+def _ring_hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    # Consistent hashing: adding or removing one of N shards only moves about 1/N of the
+    # users. Shards are named by URL, so the ring is the same in every process.
+    def __init__(self, names: List[str], vnodes: int = SHARD_VNODES):
+        points = sorted(
+            (_ring_hash(f"{name}#{index}"), name) for name in names for index in range(vnodes)
+        )
+        self._hashes = [point for point, _ in points]
+        self._names = [name for _, name in points]
+
+    def lookup(self, key: int) -> str:
+        index = bisect.bisect(self._hashes, _ring_hash(str(key))) % len(self._hashes)
+        return self._names[index]
+
+
+class Shard(Replica):
+    """A shard's engine is built lazily per process, the same way as a replica's."""
+
+
+class ShardRouter:
+    def __init__(
+        self,
+        urls: List[str],
+        previous_urls: Optional[List[str]] = None,
+        vnodes: int = SHARD_VNODES,
+        owner_cache_size: int = 100000,
+    ):
+        self.vnodes = vnodes
+        self._owner_cache_size = owner_cache_size
+        self.reconfigure(urls, previous_urls)
+
+    def reconfigure(self, urls: List[str], previous_urls: Optional[List[str]] = None):
+        # Swaps the shard lists in place; engines of dropped shards are the caller's to dispose.
+        previous_urls = previous_urls or []
+        self.shards: Dict[str, Shard] = {
+            url: Shard(url, **engine_options(url)) for url in dict.fromkeys(urls + previous_urls)
+        }
+        self.ring = HashRing(urls, self.vnodes) if urls else None
+        self.previous = HashRing(previous_urls, self.vnodes) if previous_urls else None
+        # Todo id -> owner id. Todos never change owner, so entries never go stale.
+        self._owners: "OrderedDict[int, int]" = OrderedDict()
+
+    @property
+    def enabled(self) -> bool:
+        return self.ring is not None
+
+    def shard_for(self, user_id: int) -> Shard:
+        return self.shards[self.ring.lookup(user_id)]
+
+    async def locate(self, user_id: int) -> Shard:
+        shard = self.shard_for(user_id)
+        if self.previous is not None:
+            # Mid-rebalance, a user stays where the old ring put it until it has been moved.
+            old = self.shards[self.previous.lookup(user_id)]
+            if old is not shard and await self._has_user(old, user_id):
+                return old
+        return shard
+
+    async def locate_todo(self, todo_id: int) -> Optional[Shard]:
+        owner_id = self._owners.get(todo_id)
+        if owner_id is None:
+            owners = await self.scatter(lambda db: _scalar(db, _TODO_OWNER, id=todo_id))
+            owner_id = next((owner for owner in owners if owner is not None), None)
+        if owner_id is None:
+            return None
+        self._owners[todo_id] = owner_id
+        self._owners.move_to_end(todo_id)
+        if len(self._owners) > self._owner_cache_size:
+            self._owners.popitem(last=False)
+        return await self.locate(owner_id)
+
+    async def _has_user(self, shard: Shard, user_id: int) -> bool:
+        async with shard.sessionmaker() as db:
+            return await _scalar(db, _USER_EXISTS, id=user_id) is not None
+
+    async def scatter(self, call: Callable[[AsyncSession], Awaitable[Any]]) -> List[Any]:
+        # Every shard at once, each on its own session; results come back in shard order.
+        async def one(shard: Shard):
+            async with shard.sessionmaker() as db:
+                return await call(db)
+
+        return list(await asyncio.gather(*(one(shard) for shard in self.shards.values())))
+
+    async def dispose(self):
+        for shard in self.shards.values():
+            if shard._engine is not None:
+                await shard._engine.dispose()
+
+
+shard_router = ShardRouter(DATABASE_SHARD_URLS, DATABASE_PREVIOUS_SHARD_URLS)
+for _index, _shard in enumerate(shard_router.shards.values()):
+    metrics.register_engine(f"shard-{_index}", lambda shard=_shard: shard._engine)
+
+
+@asynccontextmanager
+async def user_session(user_id: Optional[int], db: AsyncSession):
+    # A session on the shard holding the user's rows, or ``db`` when not sharded.
+    if user_id is None or not shard_router.enabled:
+        yield db
+        return
+    shard = await shard_router.locate(user_id)
+    async with shard.sessionmaker() as session:
+        yield session
+
+
+async def scatter(
+    db: AsyncSession,
+    call: Callable[[AsyncSession], Awaitable[Any]],
+    user_id: Optional[int] = None,
+) -> List[Any]:
+    # ``call`` on every shard, on just the shard of ``user_id`` when the query is scoped to
+    # that user, or on ``db`` when the data is not sharded. One result per shard asked.
+    if shard_router.enabled and user_id is None:
+        return await shard_router.scatter(call)
+    async with user_session(user_id, db) as session:
+        return [await call(session)]
+
+
+def _user_db(fallback):
+    async def dependency(user_id: int, db: AsyncSession = Depends(fallback)):
+        async with user_session(user_id, db) as session:
+            yield session
+
+    return dependency
+
+
+def _todo_db(fallback):
+    async def dependency(todo_id: int, db: AsyncSession = Depends(fallback)):
+        if not shard_router.enabled:
+            yield db
+            return
+        shard = await shard_router.locate_todo(todo_id)
+        if shard is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+        async with shard.sessionmaker() as session:
+            yield session
+
+    return dependency
+
+
+# Per-user and per-todo sessions for path operations with a user_id or todo_id parameter.
+# Shards have no replicas of their own, so the read variants only differ when unsharded.
+get_user_db = _user_db(get_db)
+get_user_read_db = _user_db(get_read_db)
+get_todo_db = _todo_db(get_db)
+get_todo_read_db = _todo_db(get_read_db)
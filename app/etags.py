@@ -0,0 +1,49 @@
+import hashlib
+from typing import List, Optional, Sequence
+
+import orjson
+
+
+def todo_etag(version: int) -> str:
+    return f'"{version}"'
+
+
+def user_etag(version: int, todos: Optional[Sequence] = None) -> str:
+    if todos is None:
+        return f'"{version}"'
+    # The embedded todos change independently of the user row, so fold in each
+    # todo's (id, version).
+    digest = hashlib.blake2b(orjson.dumps(todos), digest_size=8).hexdigest()
+    return f'"{version}-{digest}"'
+
+
+def _tags(header: str) -> List[str]:
+    return [tag.strip() for tag in header.split(",") if tag.strip()]
+
+
+def none_match(header: Optional[str], etag: str) -> bool:
+    # If-None-Match uses the weak comparison, so W/ prefixes are ignored.
+    if header is None:
+        return True
+    tags = _tags(header)
+    if "*" in tags:
+        return False
+    return etag not in [tag[2:] if tag.startswith("W/") else tag for tag in tags]
+
+
+def match_versions(header: Optional[str]) -> Optional[List[int]]:
+    # None: no precondition. []: If-Match: *, anything that exists. Otherwise the
+    # versions the client is willing to overwrite. Weak or unparsable tags never
+    # match, per the strong comparison If-Match requires.
+    if header is None:
+        return None
+    tags = _tags(header)
+    if "*" in tags:
+        return []
+    versions = []
+    for tag in tags:
+        value = tag[1:-1] if len(tag) >= 2 and tag[0] == tag[-1] == '"' else ""
+        if value.isdigit():
+            versions.append(int(value))
+    # A header naming nothing we could have issued matches no version at all.
+    return versions or [-1]
@@ -0,0 +1,157 @@
+import asyncio
+import itertools
+import os
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, Optional, Set
+
+# Events each subscriber may have queued before it is evicted as too slow.
+EVENTS_BUFFER_SIZE = int(os.getenv("EVENTS_BUFFER_SIZE", "100"))
+# Recent events kept per user so a reconnecting client can resume from Last-Event-ID.
+EVENTS_HISTORY_SIZE = int(os.getenv("EVENTS_HISTORY_SIZE", "100"))
+# Users whose history is kept; the least recently active lose theirs first.
+EVENTS_HISTORY_USERS = int(os.getenv("EVENTS_HISTORY_USERS", "10000"))
+EVENTS_KEEPALIVE_SECONDS = float(os.getenv("EVENTS_KEEPALIVE_SECONDS", "15"))
+
+# Control events a subscription ends or starts with instead of a change.
+EVICTED = "evicted"  # the subscriber fell behind; reconnect with Last-Event-ID
+RESET = "reset"  # events since Last-Event-ID are gone; reload and start over
+
+
+class Event:
+    __slots__ = ("id", "user_id", "type", "data")
+
+    def __init__(self, id: int, user_id: int, type: str, data: Any):
+        self.id = id
+        self.user_id = user_id
+        self.type = type
+        self.data = data
+
+
+class Subscription:
+    def __init__(self, user_id: int, maxsize: int):
+        self.user_id = user_id
+        self.evicted = False
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    def put(self, event: Event) -> bool:
+        if self.evicted:
+            return False
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except asyncio.QueueFull:
+            # Dropping events silently would leave the client wrong without knowing it.
+            self.evicted = True
+            while not self._queue.empty():
+                self._queue.get_nowait()
+            self._queue.put_nowait(Event(0, self.user_id, EVICTED, None))
+            return False
+
+    async def get(self, timeout: Optional[float] = None) -> Optional[Event]:
+        if not self._queue.empty():
+            return self._queue.get_nowait()
+        try:
+            return await asyncio.wait_for(self._queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class Broker:
+    """Interface for change feeds; a cross-worker broker (e.g. Redis pub/sub) implements it."""
+
+    async def publish(self, user_id: int, type: str, data: Any) -> None:
+        raise NotImplementedError
+
+    async def subscribe(self, user_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        raise NotImplementedError
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class MemoryBroker(Broker):
+    """Fans events out to the subscribers of this process only."""
+
+    def __init__(self, buffer_size: int = 100, history_size: int = 100, history_users: int = 10000):
+        self.buffer_size = buffer_size
+        self.history_size = history_size
+        self.history_users = history_users
+        self.evictions = 0
+        self._ids = itertools.count(1)
+        self._last_id = 0
+        self._history: "OrderedDict[int, Deque[Event]]" = OrderedDict()
+        # Id of the newest event pushed out of each user's history, and of any history
+        # dropped whole, so resuming across the gap is refused rather than silently lossy.
+        self._forgotten: Dict[int, int] = {}
+        self._dropped = 0
+        self._subscribers: Dict[int, Set[Subscription]] = {}
+
+    async def publish(self, user_id: int, type: str, data: Any) -> None:
+        event = Event(next(self._ids), user_id, type, data)
+        self._last_id = event.id
+        history = self._history.get(user_id)
+        if history is None:
+            history = self._history[user_id] = deque(maxlen=self.history_size)
+            if len(self._history) > self.history_users:
+                dropped_user, dropped = self._history.popitem(last=False)
+                self._forgotten.pop(dropped_user, None)
+                self._dropped = max(self._dropped, dropped[-1].id)
+        else:
+            self._history.move_to_end(user_id)
+            if len(history) == self.history_size:
+                self._forgotten[user_id] = history[0].id
+        history.append(event)
+        for subscription in list(self._subscribers.get(user_id, ())):
+            if not subscription.put(event):
+                self.evictions += 1
+                await self.unsubscribe(subscription)
+
+    async def subscribe(self, user_id: int, last_event_id: Optional[int] = None) -> Subscription:
+        subscription = Subscription(user_id, self.buffer_size)
+        if last_event_id is not None:
+            forgotten = self._forgotten.get(user_id, 0)
+            if user_id not in self._history:
+                forgotten = self._dropped
+            # Ids newer than ours were handed out before a restart (or by another worker).
+            if last_event_id < forgotten or last_event_id > self._last_id:
+                subscription.put(Event(0, user_id, RESET, None))
+            else:
+                for event in self._history.get(user_id, ()):
+                    if event.id > last_event_id:
+                        subscription.put(event)
+        if not subscription.evicted:
+            self._subscribers.setdefault(user_id, set()).add(subscription)
+        return subscription
+
+    async def unsubscribe(self, subscription: Subscription) -> None:
+        subscribers = self._subscribers.get(subscription.user_id)
+        if subscribers is not None:
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.user_id]
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "subscribers": sum(len(subscribers) for subscribers in self._subscribers.values()),
+            "evictions": self.evictions,
+        }
+
+
+backend: Broker = MemoryBroker(
+    buffer_size=EVENTS_BUFFER_SIZE,
+    history_size=EVENTS_HISTORY_SIZE,
+    history_users=EVENTS_HISTORY_USERS,
+)
+
+
+def configure(new_backend: Broker) -> None:
+    global backend
+    backend = new_backend
+
+
+async def publish(user_id: int, type: str, data: Any = None) -> None:
+    await backend.publish(user_id, type, data)
@@ -0,0 +1,32 @@
+import csv
+import io
+import json
+from typing import AsyncIterator, Sequence
+
+from . import crud
+
+FIELDS = [column.key for column in crud.TODO_COLUMNS]
+
+MEDIA_TYPES = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+async def ndjson(chunks: AsyncIterator[Sequence]) -> AsyncIterator[str]:
+    async for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(FIELDS, row)), separators=(",", ":")) + "\n" for row in rows
+        )
+
+
+async def csv_rows(chunks: AsyncIterator[Sequence]) -> AsyncIterator[str]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(FIELDS)
+    yield buffer.getvalue()
+    async for rows in chunks:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(rows)
+        yield buffer.getvalue()
+
+
+SERIALIZERS = {"ndjson": ndjson, "csv": csv_rows}
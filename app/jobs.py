@@ -0,0 +1,301 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Set
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, database, models, schemas
+
+logger = logging.getLogger(__name__)
+
+# Jobs run at once in each process.
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+# Rows per chunk; each chunk is its own short transaction.
+JOB_BATCH_SIZE = int(os.getenv("JOB_BATCH_SIZE", "500"))
+# A running job that has not reported progress for this long is taken over by another
+# worker (or process).
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+JOB_POLL_SECONDS = float(os.getenv("JOB_POLL_SECONDS", "5"))
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+JOBS = models.Job.__table__
+JOB_COLUMNS = tuple(JOBS.c[field] for field in schemas.Job.model_fields)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobFailed(Exception):
+    pass
+
+
+class Job:
+    """What a handler sees of its job."""
+
+    def __init__(self, row: dict):
+        self.id = row["id"]
+        self.user_id = row["user_id"]
+        self.params = row["params"]
+
+    async def advance(self, done: int, total: Optional[int] = None):
+        # One UPDATE records progress, renews the lease and notices a cancellation.
+        values = {"progress": JOBS.c.progress + done, "heartbeat_at": _now()}
+        if total is not None:
+            values["total"] = total
+        async with database.session_factory()() as db:
+            result = await db.execute(
+                update(JOBS)
+                .where(JOBS.c.id == self.id, JOBS.c.status == RUNNING)
+                .values(**values)
+            )
+            await db.commit()
+        if result.rowcount == 0:
+            raise JobCancelled()
+
+
+async def submit(
+    db: AsyncSession, kind: str, user_id: Optional[int] = None, params: Optional[dict] = None
+) -> dict:
+    result = await db.execute(
+        insert(JOBS)
+        .values(
+            kind=kind,
+            user_id=user_id,
+            params=params or {},
+            status=QUEUED,
+            progress=0,
+            created_at=_now(),
+        )
+        .returning(*JOB_COLUMNS)
+    )
+    job = dict(result.mappings().one())
+    await db.commit()
+    queue.notify(job["id"])
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[dict]:
+    result = await db.execute(select(*JOB_COLUMNS).where(JOBS.c.id == job_id))
+    job = result.mappings().first()
+    return dict(job) if job is not None else None
+
+
+async def cancel_job(db: AsyncSession, job_id: int) -> Optional[dict]:
+    # A running job stops at its next chunk; what it already did stays done.
+    await db.execute(
+        update(JOBS)
+        .where(JOBS.c.id == job_id, JOBS.c.status.in_([QUEUED, RUNNING]))
+        .values(status=CANCELLED, finished_at=_now())
+    )
+    await db.commit()
+    return await get_job(db, job_id)
+
+
+class JobQueue:
+    def __init__(self, workers: int, lease: float, poll_interval: float):
+        self.workers = workers
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self._ready: Optional[asyncio.Queue] = None
+        self._waiting: Set[int] = set()
+        self._tasks: List[asyncio.Task] = []
+
+    def notify(self, job_id: int):
+        # Jobs submitted here start straight away; the others are found by polling.
+        if self._ready is not None and job_id not in self._waiting:
+            self._waiting.add(job_id)
+            self._ready.put_nowait(job_id)
+
+    def start(self):
+        self._ready = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._poll()))
+
+    async def stop(self):
+        # Jobs cut short keep their lease until it lapses and another worker resumes them.
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._ready = None
+        self._waiting.clear()
+
+    def _claimable(self):
+        expired = _now() - timedelta(seconds=self.lease)
+        return or_(
+            JOBS.c.status == QUEUED,
+            (JOBS.c.status == RUNNING) & (JOBS.c.heartbeat_at < expired),
+        )
+
+    async def _poll(self):
+        while True:
+            async with database.session_factory()() as db:
+                result = await db.execute(
+                    select(JOBS.c.id).where(self._claimable()).order_by(JOBS.c.id)
+                )
+                for job_id in result.scalars():
+                    self.notify(job_id)
+            await asyncio.sleep(self.poll_interval)
+
+    async def _claim(self, job_id: int) -> Optional[dict]:
+        # Conditional, so of all the workers and processes that see a job only one runs it.
+        async with database.session_factory()() as db:
+            result = await db.execute(
+                select(JOBS.c.kind, JOBS.c.status).where(JOBS.c.id == job_id)
+            )
+            row = result.first()
+            if row is None:
+                return None
+            kind, status = row
+            # Resuming is only safe for jobs whose chunks can be repeated.
+            resume = status == QUEUED or kind in RESUMABLE
+            values = {"heartbeat_at": _now()}
+            if resume:
+                values["status"] = RUNNING
+            else:
+                values.update(
+                    status=FAILED, error="Interrupted; submit it again", finished_at=_now()
+                )
+            result = await db.execute(
+                update(JOBS)
+                .where(JOBS.c.id == job_id, JOBS.c.status == status, self._claimable())
+                .values(**values)
+                .returning(JOBS.c.id, JOBS.c.user_id, JOBS.c.kind, JOBS.c.params)
+            )
+            claimed = result.mappings().first()
+            await db.commit()
+        return dict(claimed) if claimed is not None and resume else None
+
+    async def _finish(self, job_id: int, status: str, error: Optional[str] = None):
+        async with database.session_factory()() as db:
+            await db.execute(
+                update(JOBS)
+                .where(JOBS.c.id == job_id, JOBS.c.status == RUNNING)
+                .values(status=status, error=error, finished_at=_now())
+            )
+            await db.commit()
+
+    async def _work(self):
+        while True:
+            job_id = await self._ready.get()
+            self._waiting.discard(job_id)
+            try:
+                row = await self._claim(job_id)
+                if row is not None:
+                    await self._run(row)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Job %s could not be run", job_id)
+
+    async def _run(self, row: dict):
+        try:
+            await HANDLERS[row["kind"]](Job(row))
+        except JobCancelled:
+            return
+        except JobFailed as exc:
+            await self._finish(row["id"], FAILED, str(exc))
+        except crud.TodoLimitReached:
+            await self._finish(row["id"], FAILED, "Todo limit reached")
+        except Exception as exc:
+            logger.exception("Job %s (%s) failed", row["id"], row["kind"])
+            await self._finish(row["id"], FAILED, f"{type(exc).__name__}: {exc}")
+        else:
+            await self._finish(row["id"], SUCCEEDED)
+
+
+@asynccontextmanager
+async def _user_db(user_id: int):
+    async with database.session_factory()() as db:
+        async with database.user_session(user_id, db) as session:
+            yield session
+
+
+async def _stats(user_id: int) -> dict:
+    # The counts include archived todos, which are cleared and deleted along with the
+    # live ones.
+    async with _user_db(user_id) as db:
+        stats = await crud.get_user_stats(db, user_id)
+    if stats is None:
+        raise JobFailed("User not found")
+    return stats
+
+
+async def _delete_todos(job: Job, is_done: Optional[bool] = None):
+    while True:
+        async with _user_db(job.user_id) as db:
+            todos = await crud.get_user_todos(
+                db, job.user_id, is_done=is_done, limit=JOB_BATCH_SIZE, fields=["id"]
+            )
+            if not todos:
+                break
+            await crud.delete_todos(db, [todo["id"] for todo in todos])
+        await job.advance(len(todos))
+    while True:
+        async with _user_db(job.user_id) as db:
+            deleted = await crud.delete_archived_todos(db, job.user_id, limit=JOB_BATCH_SIZE)
+        if not deleted:
+            return
+        await job.advance(deleted)
+
+
+async def clear_completed(job: Job):
+    await job.advance(0, total=(await _stats(job.user_id))["done"])
+    await _delete_todos(job, is_done=True)
+
+
+async def delete_user(job: Job, attempts: int = 5):
+    await job.advance(0, total=(await _stats(job.user_id))["total"] + 1)
+    for _ in range(attempts):
+        await _delete_todos(job)
+        try:
+            async with _user_db(job.user_id) as db:
+                email = await crud.delete_user(db, job.user_id)
+        except IntegrityError:
+            # A todo was created since the last chunk; delete it and try again.
+            continue
+        if email is not None and database.shard_router.enabled:
+            async with database.session_factory()() as db:
+                await crud.release_email(db, email)
+        await job.advance(1)
+        return
+    raise JobFailed("The user kept getting new todos")
+
+
+async def import_todos(job: Job):
+    todos = [schemas.TodoCreate(**todo) for todo in job.params["todos"]]
+    existing = (await _stats(job.user_id))["total"] if job.params.get("replace") else 0
+    await job.advance(0, total=existing + len(todos))
+    if job.params.get("replace"):
+        await _delete_todos(job)
+    for batch in crud._batches(todos, JOB_BATCH_SIZE):
+        async with _user_db(job.user_id) as db:
+            if await crud.create_user_todos(db, batch, user_id=job.user_id) is None:
+                raise JobFailed("User not found")
+        await job.advance(len(batch))
+
+
+HANDLERS: Dict[str, Callable[[Job], Awaitable[None]]] = {
+    "clear_completed": clear_completed,
+    "delete_user": delete_user,
+    "import_todos": import_todos,
+}
+# Deleting again from where an interrupted run stopped is harmless; importing is not.
+RESUMABLE = {"clear_completed", "delete_user"}
+
+queue = JobQueue(JOB_WORKERS, JOB_LEASE_SECONDS, JOB_POLL_SECONDS)
@@ -0,0 +1,98 @@
+import asyncio
+from functools import partial
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set
+
+from fastapi import Depends, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import cache, crud
+from .database import from_replica, get_read_db, pinned_to_primary, scatter
+
+
+class DataLoader:
+    # Every load() made in one pass of the event loop is answered by a single ``fetch``
+    # of the distinct keys; ``fetch`` returns the rows it found by key. Results are kept
+    # for the loader's lifetime, so asking twice for a key costs nothing.
+    def __init__(
+        self,
+        fetch: Callable[[List[Any]], Awaitable[Dict[Any, Any]]],
+        lock: Optional[asyncio.Lock] = None,
+    ):
+        self.fetch = fetch
+        # Loaders sharing a session share a lock; an AsyncSession runs one query at a time.
+        self.lock = lock or asyncio.Lock()
+        self._futures: Dict[Any, asyncio.Future] = {}
+        self._pending: List[Any] = []
+        self._fetching: Set[asyncio.Task] = set()
+
+    def _future(self, key) -> asyncio.Future:
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            self._pending.append(key)
+            if len(self._pending) == 1:
+                loop.call_soon(self._dispatch)
+        return future
+
+    async def load(self, key) -> Optional[Any]:
+        # Shielded: one caller giving up must not cancel the result others wait for.
+        return await asyncio.shield(self._future(key))
+
+    async def load_many(self, keys: List[Any]) -> List[Optional[Any]]:
+        futures = [self._future(key) for key in keys]
+        return [await asyncio.shield(future) for future in futures]
+
+    def _dispatch(self):
+        keys, self._pending = self._pending, []
+        task = asyncio.create_task(self._run(keys))
+        self._fetching.add(task)
+        task.add_done_callback(self._fetching.discard)
+
+    async def _run(self, keys: List[Any]):
+        try:
+            async with self.lock:
+                found = await self.fetch(keys)
+        except Exception as exc:
+            for key in keys:
+                # Forget the failure so a later load() tries again.
+                self._futures.pop(key).set_exception(exc)
+            return
+        for key in keys:
+            self._futures[key].set_result(found.get(key))
+
+
+class Loaders:
+    """Per-request loaders for the id lookups an endpoint or its sub-requests make."""
+
+    def __init__(self, db: AsyncSession, use_cache: bool = True):
+        self.db = db
+        self.use_cache = use_cache
+        lock = asyncio.Lock()
+        self.todos = DataLoader(self._todos, lock)
+        self.users = DataLoader(self._users, lock)
+
+    async def _todos(self, ids: List[int]) -> Dict[int, dict]:
+        keys = {id: cache.todo_key(id) for id in ids}
+        return await self._read(keys, partial(self._fetch, crud.get_todos_by_ids))
+
+    async def _users(self, ids: List[int]) -> Dict[int, dict]:
+        keys = {id: cache.user_key(id) for id in ids}
+        return await self._read(keys, partial(self._fetch, crud.get_users_by_ids))
+
+    async def _read(self, keys: Dict[int, str], fetch) -> Dict[int, dict]:
+        if not self.use_cache:
+            return await fetch(list(keys))
+        return await cache.read_many(keys, fetch, fill=not from_replica(self.db))
+
+    async def _fetch(self, get_by_ids, ids: List[int]) -> Dict[int, dict]:
+        # Sharded, every shard is asked for the whole batch at once.
+        found = {}
+        for part in await scatter(self.db, lambda session: get_by_ids(session, ids)):
+            found.update(part)
+        return found
+
+
+async def get_loaders(request: Request, db: AsyncSession = Depends(get_read_db)) -> Loaders:
+    # Clients pinned to the primary after a write read past the cache, as in main.
+    return Loaders(db, use_cache=not pinned_to_primary(request))
@@ -1,90 +1,865 @@
+import asyncio
+import re
 from contextlib import asynccontextmanager
-from typing import List, Union
-from fastapi import Depends, FastAPI, HTTPException
+from typing import List, Literal, Optional, Union
+import orjson
+from fastapi import Depends, FastAPI, Form, Header, HTTPException, Query, Request, WebSocket
+from fastapi import WebSocketDisconnect
+from fastapi.security import OAuth2PasswordBearer
+from fastapi.responses import ORJSONResponse, Response, StreamingResponse
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from . import crud, models, schemas
-from .database import engine, get_db
+from . import admission, batching, cache, crud, export, metrics, models, pagination, schemas
+from . import etags, events, jobs, ratelimit, security, startup
+from .loaders import Loaders, get_loaders
+from .database import get_db, get_engine, get_read_db, read_router, read_your_writes
+from .database import get_todo_db, get_todo_read_db, get_user_db, get_user_read_db
+from .database import from_replica, pinned_to_primary, scatter, shard_router, user_session
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    async with engine.begin() as conn:
-        await conn.run_sync(models.Base.metadata.create_all)
+    engine = get_engine()
+    await startup.prepare_schema(engine)
+    # Startup only finishes, and the worker only takes traffic, once the pools are warm.
+    await startup.prewarm(engine)
+    for replica in read_router.replicas:
+        await startup.prewarm(replica.engine)
+    for shard in shard_router.shards.values():
+        await startup.prepare_schema(shard.engine)
+        await startup.prewarm(shard.engine)
+    health_checks = None
+    if read_router.replicas:
+        health_checks = asyncio.create_task(read_router.run_health_checks())
+    jobs.queue.start()
     yield
+    await jobs.queue.stop()
+    await batching.todo_writer.drain()
+    if health_checks is not None:
+        health_checks.cancel()
+    await read_router.dispose()
+    await shard_router.dispose()
+    await engine.dispose()
 
 
-app = FastAPI(lifespan=lifespan)
+app = FastAPI(
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse,
+    dependencies=[Depends(read_your_writes)],
+)
+app.add_middleware(ratelimit.RateLimitMiddleware)
+app.add_middleware(metrics.MetricsMiddleware)
 
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-@app.post("/users/", response_model=schemas.User)
+
+async def _hash_offload(call):
+    try:
+        return await call
+    except security.HasherBusy:
+        raise HTTPException(
+            status_code=503, detail="Server busy, retry later", headers={"Retry-After": "1"}
+        )
+
+
+async def get_current_user(
+    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+):
+    credentials_exception = HTTPException(
+        status_code=401,
+        detail="Could not validate credentials",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
+    claims = await security.decode_access_token(token)
+    if claims is None:
+        raise credentials_exception
+    user_id = int(claims["sub"])
+    # The user read cache doubles as the active-user lookup; writes invalidate it.
+    async with user_session(user_id, db) as session:
+        user = await cache.read_through(
+            cache.user_key(user_id), lambda: crud.get_user(session, user_id=user_id)
+        )
+    if user is None:
+        raise credentials_exception
+    if not user["is_active"]:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return user
+
+
+@app.post("/token", response_model=schemas.Token, dependencies=[Depends(admission.admit_write)])
+async def login(
+    # OAuth2 password flow fields; OAuth2PasswordRequestForm breaks with newer pydantic here.
+    username: str = Form(...),
+    password: str = Form(...),
+    db: AsyncSession = Depends(get_db),
+):
+    # Sharded, the user could be on any shard; logins are rare enough to ask them all.
+    found = await scatter(db, lambda session: crud.get_user_credentials(session, email=username))
+    credentials = next((row for row in found if row is not None), None)
+    hashed_password = None if credentials is None else credentials.hashed_password
+    # Hand the connection back before the slow bcrypt check; nothing below needs it.
+    await db.close()
+    verified = await _hash_offload(security.verify_password(password, hashed_password))
+    if not verified:
+        raise HTTPException(
+            status_code=401,
+            detail="Incorrect email or password",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    if not credentials.is_active:
+        raise HTTPException(status_code=400, detail="Inactive user")
+    return {
+        "access_token": security.create_access_token(str(credentials.id)),
+        "token_type": "bearer",
+    }
+
+
+@app.post("/users/", response_model=schemas.User, dependencies=[Depends(admission.admit_write)])
 async def create_user(user: schemas.UserCreate, db: AsyncSession = Depends(get_db)):
-    db_user = await crud.get_user_by_email(db, email=user.email)
-    if db_user:
+    hashed_password = await _hash_offload(security.hash_password(user.password))
+    user_id = None
+    if shard_router.enabled:
+        # Emails are only unique across shards through the directory on the primary.
+        user_id = await crud.claim_email(db, user.email)
+        if user_id is None:
+            raise HTTPException(status_code=400, detail="Email already registered")
+    try:
+        async with user_session(user_id, db) as session:
+            db_user = await crud.create_user(
+                db=session, user=user, hashed_password=hashed_password, user_id=user_id
+            )
+    except SQLAlchemyError:
+        if user_id is not None:
+            await crud.release_email(db, user.email)
+        raise
+    if db_user is None:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return await crud.create_user(db=db, user=user)
+    return db_user
+
+
+def _fields(fields: Optional[str], schema) -> Optional[List[str]]:
+    if fields is None:
+        return None
+    requested = [field.strip() for field in fields.split(",") if field.strip()]
+    unknown = [field for field in requested if field not in schema.model_fields]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    return requested
+
+
+# Most ids one multi-get may ask for, matching the bulk endpoints' limit.
+MULTI_GET_MAX_IDS = 1000
 
 
-@app.get("/users/")
+def _ids(ids: str) -> List[int]:
+    try:
+        # De-duplicated, first occurrence wins the position.
+        requested = list(dict.fromkeys(int(id) for id in ids.split(",") if id.strip()))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="ids must be comma-separated integers")
+    if not requested or len(requested) > MULTI_GET_MAX_IDS:
+        raise HTTPException(
+            status_code=400, detail=f"ids takes between 1 and {MULTI_GET_MAX_IDS} ids"
+        )
+    return requested
+
+
+def _in_order(ids: List[int], found: dict) -> list:
+    return [found[id] for id in ids if id in found]
+
+
+def _union(found: List[dict]) -> dict:
+    # Rows by id from every shard asked.
+    rows = {}
+    for part in found:
+        rows.update(part)
+    return rows
+
+
+def _by_id(pages: List[list], limit: Optional[int] = None) -> list:
+    return pagination.merge(pages, key=lambda row: row["id"], limit=limit)
+
+
+def _after_id(cursor: str, **scope) -> Optional[int]:
+    try:
+        return pagination.after_id(cursor, scope)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@app.get("/users/", dependencies=[Depends(admission.admit_bulk)])
 async def read_users(
-    skip: int = 0, limit: int = 100, include_todos: bool = False, db: AsyncSession = Depends(get_db)
+    skip: int = 0,
+    limit: int = 100,
+    include_todos: bool = False,
+    include_stats: bool = False,
+    cursor: Optional[str] = None,
+    estimate_total: bool = False,
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    db: AsyncSession = Depends(get_read_db),
+    loaders: Loaders = Depends(get_loaders),
 ):
-    users = await crud.get_users(db, skip=skip, limit=limit, include_todos=include_todos)
-    if include_todos:
-        return [schemas.UserWithTodos.model_validate(user).model_dump() for user in users]
-    return [schemas.User.model_validate(user).model_dump() for user in users]
+    fields = _fields(fields, schemas.User)
+    # The counters come with the user rows themselves, at no extra query.
+    options = {"include_todos": include_todos, "include_stats": include_stats, "fields": fields}
+    if ids is not None:
+        ids = _ids(ids)
+        if fields is None and not include_todos and not include_stats:
+            users = await loaders.users.load_many(ids)
+            return ORJSONResponse([user for user in users if user is not None])
+        found = await scatter(db, lambda session: crud.get_users_by_ids(session, ids, **options))
+        return ORJSONResponse(_in_order(ids, _union(found)))
+    # The read endpoints hand crud's row dicts straight to orjson; crud already
+    # shapes them like the response schemas.
+    if cursor is None:
+        if not shard_router.enabled:
+            users = await crud.get_users(db, skip=skip, limit=limit, **options)
+            return ORJSONResponse(users)
+        # An offset only means something in the merged order: take every shard's first
+        # skip + limit users by id. Deep offsets cost every shard; cursors do not.
+        pages = await shard_router.scatter(
+            lambda session: crud.get_users_after(session, limit=skip + limit, **options)
+        )
+        return ORJSONResponse(_by_id(pages)[skip:skip + limit])
 
+    limit = max(limit, 1)
+    after_id = _after_id(cursor)
+    pages = await scatter(
+        db,
+        lambda session: crud.get_users_after(
+            session, after_id=after_id, limit=limit + 1, **options
+        ),
+    )
+    users, next_cursor = pagination.page(
+        _by_id(pages, limit + 1), limit, lambda user: {"id": user["id"]}
+    )
+    estimated_total = None
+    if estimate_total:
+        counts = await scatter(db, lambda session: crud.estimate_count(session, models.User))
+        estimated_total = sum(counts)
+    return ORJSONResponse(
+        {"items": users, "next_cursor": next_cursor, "estimated_total": estimated_total}
+    )
 
-@app.get("/users/{user_id}")
-async def read_user(user_id: int, include_todos: bool = False, db: AsyncSession = Depends(get_db)):
-    db_user = await crud.get_user(db, user_id=user_id, include_todos=include_todos)
-    if db_user is None:
+
+@app.get("/users/me", dependencies=[Depends(admission.admit_read)])
+async def read_current_user(current_user: dict = Depends(get_current_user)):
+    return ORJSONResponse(current_user)
+
+
+async def _read_cached(request: Request, db: AsyncSession, key: str, loader):
+    # A client pinned to the primary after a write reads past the cache, and only primary
+    # reads fill it: a lagging replica would otherwise put the old payload back.
+    if pinned_to_primary(request):
+        return await loader()
+    return await cache.read_through(key, loader, fill=not from_replica(db))
+
+
+async def _cached(request: Request, key: str) -> Optional[dict]:
+    return None if pinned_to_primary(request) else await cache.backend.get(key)
+
+
+@app.get("/users/{user_id}", dependencies=[Depends(admission.admit_read)])
+async def read_user(
+    request: Request,
+    user_id: int,
+    include_todos: bool = False,
+    include_archived: bool = False,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_user_read_db),
+):
+    fields = _fields(fields, schemas.User)
+    include_archived = include_archived and include_todos
+    if fields is not None or include_archived:
+        # Projections and archived todos skip the cache, which only holds the usual full
+        # payloads, and carry no ETag.
+        payload = await crud.get_user(
+            db,
+            user_id=user_id,
+            include_todos=include_todos,
+            fields=fields,
+            include_archived=include_archived,
+        )
+        if payload is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return ORJSONResponse(payload)
+
+    key = cache.user_key(user_id, include_todos)
+    if if_none_match is not None:
+        # Settle the precondition from the cache or the version index, before any body.
+        cached = await _cached(request, key)
+        if cached is not None:
+            etag = _user_etag(cached, include_todos)
+        else:
+            version, todos = await crud.get_user_version(db, user_id, include_todos)
+            if version is None:
+                raise HTTPException(status_code=404, detail="User not found")
+            etag = etags.user_etag(version, todos)
+        if not etags.none_match(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    payload = await _read_cached(
+        request, db, key, lambda: crud.get_user(db, user_id=user_id, include_todos=include_todos)
+    )
+    if payload is None:
         raise HTTPException(status_code=404, detail="User not found")
+    return ORJSONResponse(payload, headers={"ETag": _user_etag(payload, include_todos)})
+
+
+def _user_etag(payload: dict, include_todos: bool) -> str:
+    todos = None
     if include_todos:
-        return schemas.UserWithTodos.model_validate(db_user).model_dump()
-    return schemas.User.model_validate(db_user).model_dump()
+        todos = [[todo["id"], todo["version"]] for todo in payload["todos"]]
+    return etags.user_etag(payload["version"], todos)
+
+
+@app.get(
+    "/users/{user_id}/todos/",
+    response_model=schemas.TodoPage,
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def read_user_todos(
+    user_id: int,
+    is_done: Optional[bool] = None,
+    order: Literal["asc", "desc"] = "asc",
+    limit: int = 100,
+    cursor: str = "",
+    fields: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_user_read_db),
+):
+    fields = _fields(fields, schemas.Todo)
+    limit = max(limit, 1)
+    scope = {"u": user_id, "d": is_done, "s": order}
+    todos = await crud.get_user_todos(
+        db,
+        user_id=user_id,
+        is_done=is_done,
+        descending=order == "desc",
+        after_id=_after_id(cursor, **scope),
+        limit=limit + 1,
+        fields=fields,
+        include_archived=include_archived,
+    )
+    # Only an empty page needs the extra lookup to tell "no todos" from "no user".
+    if not todos and not await crud.user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    todos, next_cursor = pagination.page(todos, limit, lambda todo: {**scope, "id": todo["id"]})
+    return ORJSONResponse({"items": todos, "next_cursor": next_cursor, "estimated_total": None})
 
 
-@app.post("/users/{user_id}/todos/", response_model=schemas.Todo)
+@app.get(
+    "/users/{user_id}/stats",
+    response_model=schemas.UserStats,
+    dependencies=[Depends(admission.admit_read)],
+)
+async def read_user_stats(user_id: int, db: AsyncSession = Depends(get_user_read_db)):
+    stats = await crud.get_user_stats(db, user_id)
+    if stats is None:
+        raise HTTPException(status_code=404, detail="User not found")
+    return ORJSONResponse(stats)
+
+
+def _last_event_id(value: Optional[str]) -> Optional[int]:
+    if not value:
+        return None
+    try:
+        return int(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+
+async def _sse(subscription: events.Subscription):
+    try:
+        while True:
+            event = await subscription.get(timeout=events.EVENTS_KEEPALIVE_SECONDS)
+            if event is None:
+                # Comments keep proxies from closing an idle stream.
+                yield ": keepalive\n\n"
+            elif event.type in (events.EVICTED, events.RESET):
+                yield f"event: {event.type}\ndata: {{}}\n\n"
+                if event.type == events.EVICTED:
+                    return
+            else:
+                data = orjson.dumps(event.data).decode()
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {data}\n\n"
+    finally:
+        await events.backend.unsubscribe(subscription)
+
+
+@app.get("/users/{user_id}/events")
+async def stream_user_events(
+    user_id: int,
+    last_event_id: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_user_read_db),
+):
+    if not await crud.user_exists(db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    # The stream can stay open for hours; give the connection back now, not at the end.
+    await db.close()
+    subscription = await events.backend.subscribe(user_id, _last_event_id(last_event_id))
+    return StreamingResponse(
+        _sse(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _until_disconnected(websocket: WebSocket):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
+@app.websocket("/users/{user_id}/events/ws")
+async def user_events_socket(
+    websocket: WebSocket,
+    user_id: int,
+    last_event_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_user_db),
+):
+    exists = await crud.user_exists(db, user_id)
+    await db.close()
+    if not exists:
+        await websocket.close(code=4404)
+        return
+    subscription = await events.backend.subscribe(user_id, last_event_id)
+    await websocket.accept()
+    # Clients only ever close the socket; watching for that frees the subscription at once
+    # instead of on the next failed send.
+    disconnected = asyncio.create_task(_until_disconnected(websocket))
+    try:
+        while True:
+            next_event = asyncio.create_task(subscription.get())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not next_event.done():
+                next_event.cancel()
+                return
+            event = next_event.result()
+            message = {"id": event.id or None, "type": event.type, "data": event.data}
+            await websocket.send_text(orjson.dumps(message).decode())
+            if event.type == events.EVICTED:
+                # 1013: try again later.
+                await websocket.close(code=1013)
+                return
+    except WebSocketDisconnect:
+        pass
+    finally:
+        disconnected.cancel()
+        await events.backend.unsubscribe(subscription)
+
+
+@app.post(
+    "/users/{user_id}/todos/",
+    response_model=schemas.Todo,
+    dependencies=[Depends(admission.admit_write)],
+)
 async def create_todo_for_user(
-    user_id: int, todo: schemas.TodoCreate, db: AsyncSession = Depends(get_db)
+    user_id: int, todo: schemas.TodoCreate, db: AsyncSession = Depends(get_user_db)
 ):
-    db_user = await crud.get_user(db, user_id=user_id)
-    if db_user is None:
+    try:
+        if batching.TODO_BATCHING:
+            db_todo = await batching.todo_writer.submit((user_id, todo))
+        else:
+            db_todo = await crud.create_user_todo(db=db, todo=todo, user_id=user_id)
+    except IntegrityError:
         raise HTTPException(status_code=404, detail="User not found")
-    db_todo = await crud.create_user_todo(db=db, todo=todo, user_id=user_id)
+    except crud.TodoLimitReached:
+        raise HTTPException(status_code=403, detail="Todo limit reached")
     if db_todo is None:
         raise HTTPException(status_code=400, detail="Could not create todo.")
     return db_todo
 
 
-@app.get("/todos/", response_model=list[schemas.Todo])
-async def read_todos(skip: int = 0, limit: int = 100, db: AsyncSession = Depends(get_db)):
-    todos = await crud.get_todos(db, skip=skip, limit=limit)
+@app.post(
+    "/users/{user_id}/todos/bulk",
+    response_model=list[schemas.Todo],
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def create_todos_for_user(
+    user_id: int, body: schemas.TodoBulkCreate, db: AsyncSession = Depends(get_user_db)
+):
+    try:
+        todos = await crud.create_user_todos(db, todos=body.todos, user_id=user_id)
+    except SQLAlchemyError:
+        raise HTTPException(status_code=400, detail="Could not create todos.")
+    except crud.TodoLimitReached:
+        raise HTTPException(status_code=403, detail="Todo limit reached")
+    if todos is None:
+        raise HTTPException(status_code=404, detail="User not found")
     return todos
 
 
-@app.get("/todos/{todo_id}", response_model=schemas.Todo)
-async def read_todo(todo_id: int, db: AsyncSession = Depends(get_db)):
-    db_todo = await crud.get_todo(db, todo_id=todo_id)
-    if db_todo is None:
+async def _submit_job(
+    db: AsyncSession, user_db: AsyncSession, kind: str, user_id: int, params: Optional[dict] = None
+) -> dict:
+    if not await crud.user_exists(user_db, user_id):
+        raise HTTPException(status_code=404, detail="User not found")
+    return await jobs.submit(db, kind, user_id=user_id, params=params)
+
+
+@app.post(
+    "/users/{user_id}/todos/import",
+    response_model=schemas.Job,
+    status_code=202,
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def import_todos_for_user(
+    user_id: int,
+    body: schemas.TodoImport,
+    db: AsyncSession = Depends(get_db),
+    user_db: AsyncSession = Depends(get_user_db),
+):
+    params = {"todos": [todo.model_dump() for todo in body.todos], "replace": body.replace}
+    return await _submit_job(db, user_db, "import_todos", user_id, params)
+
+
+@app.post(
+    "/users/{user_id}/todos/clear-completed",
+    response_model=schemas.Job,
+    status_code=202,
+    dependencies=[Depends(admission.admit_write)],
+)
+async def clear_completed_todos(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    user_db: AsyncSession = Depends(get_user_db),
+):
+    return await _submit_job(db, user_db, "clear_completed", user_id)
+
+
+@app.delete(
+    "/users/{user_id}",
+    response_model=schemas.Job,
+    status_code=202,
+    dependencies=[Depends(admission.admit_write)],
+)
+async def delete_user(
+    user_id: int,
+    db: AsyncSession = Depends(get_db),
+    user_db: AsyncSession = Depends(get_user_db),
+):
+    # The user's todos go in batches first, so no single transaction holds them all.
+    return await _submit_job(db, user_db, "delete_user", user_id)
+
+
+def _merge_bulk(results: List[list]) -> list:
+    # One result list per shard, item by item; each todo is found on one shard at most.
+    return [
+        next((item for item in items if item["status"] != "not_found"), items[0])
+        for items in zip(*results)
+    ]
+
+
+@app.patch(
+    "/todos/bulk",
+    response_model=list[schemas.TodoBulkResult],
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def update_todos(body: schemas.TodoBulkUpdate, db: AsyncSession = Depends(get_db)):
+    try:
+        return _merge_bulk(
+            await scatter(db, lambda session: crud.update_todos(session, todos=body.todos))
+        )
+    except SQLAlchemyError:
+        raise HTTPException(status_code=400, detail="Could not update todos.")
+
+
+@app.post(
+    "/todos/bulk/delete",
+    response_model=list[schemas.TodoBulkResult],
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def delete_todos(body: schemas.TodoBulkDelete, db: AsyncSession = Depends(get_db)):
+    try:
+        return _merge_bulk(
+            await scatter(db, lambda session: crud.delete_todos(session, ids=body.ids))
+        )
+    except SQLAlchemyError:
+        raise HTTPException(status_code=400, detail="Could not delete todos.")
+
+
+@app.get(
+    "/todos/",
+    response_model=Union[list[schemas.Todo], schemas.TodoPage],
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def read_todos(
+    skip: int = 0,
+    limit: int = 100,
+    owner_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    estimate_total: bool = False,
+    fields: Optional[str] = None,
+    ids: Optional[str] = None,
+    include_archived: bool = False,
+    db: AsyncSession = Depends(get_read_db),
+    loaders: Loaders = Depends(get_loaders),
+):
+    fields = _fields(fields, schemas.Todo)
+    # Lookups by id find archived todos either way.
+    options = {"fields": fields, "include_archived": include_archived}
+    if ids is not None:
+        ids = _ids(ids)
+        if fields is None:
+            todos = await loaders.todos.load_many(ids)
+            return ORJSONResponse([todo for todo in todos if todo is not None])
+        found = await scatter(
+            db, lambda session: crud.get_todos_by_ids(session, ids, fields=fields)
+        )
+        return ORJSONResponse(_in_order(ids, _union(found)))
+    if cursor is None:
+        if not shard_router.enabled or owner_id is not None:
+            async with user_session(owner_id, db) as session:
+                todos = await crud.get_todos(
+                    session, skip=skip, limit=limit, owner_id=owner_id, **options
+                )
+            return ORJSONResponse(todos)
+        pages = await shard_router.scatter(
+            lambda session: crud.get_todos_after(session, limit=skip + limit, **options)
+        )
+        return ORJSONResponse(_by_id(pages)[skip:skip + limit])
+
+    limit = max(limit, 1)
+    after_id = _after_id(cursor, o=owner_id)
+    pages = await scatter(
+        db,
+        lambda session: crud.get_todos_after(
+            session, after_id=after_id, limit=limit + 1, owner_id=owner_id, **options
+        ),
+        user_id=owner_id,
+    )
+    todos, next_cursor = pagination.page(
+        _by_id(pages, limit + 1), limit, lambda todo: {"o": owner_id, "id": todo["id"]}
+    )
+    estimated_total = None
+    if estimate_total:
+        criteria = [] if owner_id is None else [models.Todo.owner_id == owner_id]
+        counts = await scatter(
+            db,
+            lambda session: crud.estimate_count(session, models.Todo, *criteria),
+            user_id=owner_id,
+        )
+        estimated_total = sum(counts)
+    return ORJSONResponse(
+        {"items": todos, "next_cursor": next_cursor, "estimated_total": estimated_total}
+    )
+
+
+@app.get(
+    "/todos/search",
+    response_model=schemas.TodoPage,
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def search_todos(
+    q: str = Query(..., min_length=1),
+    owner_id: Optional[int] = None,
+    limit: int = 100,
+    cursor: str = "",
+    db: AsyncSession = Depends(get_read_db),
+):
+    q = q.strip()
+    if not q:
+        # FTS5 rejects an empty MATCH outright.
+        raise HTTPException(status_code=400, detail="Search query is blank")
+    limit = max(limit, 1)
+    scope = {"q": q, "o": owner_id}
+    try:
+        payload = pagination.decode_scoped(cursor, scope)
+        after = None
+        if payload:
+            after = (float(payload["r"]), int(payload["id"]))
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    pages = await scatter(
+        db,
+        lambda session: crud.search_todos(
+            session, q, owner_id=owner_id, after=after, limit=limit + 1
+        ),
+        user_id=owner_id,
+    )
+    # Ranks are computed per shard, so a cross-shard order is only as good as their agreement.
+    todos = pagination.merge(
+        pages, key=lambda todo: (todo["rank"], todo["id"]), limit=limit + 1, reverse=True
+    )
+    todos, next_cursor = pagination.page(
+        todos, limit, lambda todo: {**scope, "r": todo["rank"], "id": todo["id"]}
+    )
+    for todo in todos:
+        del todo["rank"]
+    return ORJSONResponse({"items": todos, "next_cursor": next_cursor, "estimated_total": None})
+
+
+async def _export_chunks(db: AsyncSession, owner_ids: Optional[List[int]]):
+    if not shard_router.enabled:
+        async for rows in crud.stream_todos(db, owner_ids=owner_ids):
+            yield rows
+        return
+    # One shard after another, each in id order; only one server-side cursor is open.
+    for shard in shard_router.shards.values():
+        async with shard.sessionmaker() as session:
+            async for rows in crud.stream_todos(session, owner_ids=owner_ids):
+                yield rows
+
+
+@app.get("/todos/export", dependencies=[Depends(admission.admit_bulk)])
+async def export_todos(
+    format: Literal["ndjson", "csv"] = "ndjson",
+    owner_id: Optional[List[int]] = Query(None),
+    db: AsyncSession = Depends(get_read_db),
+):
+    chunks = _export_chunks(db, owner_id)
+    return StreamingResponse(
+        export.SERIALIZERS[format](chunks),
+        media_type=export.MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="todos.{format}"'},
+    )
+
+
+@app.get(
+    "/todos/{todo_id}",
+    response_model=schemas.Todo,
+    dependencies=[Depends(admission.admit_read)],
+)
+async def read_todo(
+    request: Request,
+    todo_id: int,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_todo_read_db),
+):
+    fields = _fields(fields, schemas.Todo)
+    if fields is not None:
+        payload = await crud.get_todo(db, todo_id=todo_id, fields=fields)
+        if payload is None:
+            raise HTTPException(status_code=404, detail="Todo not found")
+        return ORJSONResponse(payload)
+
+    key = cache.todo_key(todo_id)
+    if if_none_match is not None:
+        cached = await _cached(request, key)
+        if cached is not None:
+            version = cached["version"]
+        else:
+            version = await crud.get_todo_version(db, todo_id, include_archived=True)
+            if version is None:
+                raise HTTPException(status_code=404, detail="Todo not found")
+        etag = etags.todo_etag(version)
+        if not etags.none_match(if_none_match, etag):
+            return Response(status_code=304, headers={"ETag": etag})
+
+    payload = await _read_cached(request, db, key, lambda: crud.get_todo(db, todo_id=todo_id))
+    if payload is None:
         raise HTTPException(status_code=404, detail="Todo not found")
-    return db_todo
+    return ORJSONResponse(payload, headers={"ETag": etags.todo_etag(payload["version"])})
 
 
-@app.patch("/todos/{todo_id}", response_model=schemas.Todo)
+@app.patch(
+    "/todos/{todo_id}",
+    response_model=schemas.Todo,
+    dependencies=[Depends(admission.admit_write)],
+)
 async def update_todo(
-    todo_id: int, todo: schemas.TodoUpdate, db: AsyncSession = Depends(get_db)
+    todo_id: int,
+    todo: schemas.TodoUpdate,
+    response: Response,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_todo_db),
 ):
-    db_todo = await crud.update_todo(db, todo_id=todo_id, todo=todo)
+    try:
+        db_todo = await crud.update_todo(
+            db, todo_id=todo_id, todo=todo, versions=etags.match_versions(if_match)
+        )
+    except crud.VersionMismatch:
+        raise HTTPException(status_code=412, detail="Todo has changed since it was read")
+    except crud.TodoArchived:
+        raise HTTPException(status_code=409, detail="Todo is archived and read-only")
     if db_todo is None:
         raise HTTPException(status_code=404, detail="Todo not found")
+    response.headers["ETag"] = etags.todo_etag(db_todo["version"])
     return db_todo
 
 
-@app.delete("/todos/{todo_id}")
-async def delete_todo(todo_id: int, db: AsyncSession = Depends(get_db)):
-    success = await crud.delete_todo(db, todo_id=todo_id)
+@app.delete("/todos/{todo_id}", dependencies=[Depends(admission.admit_write)])
+async def delete_todo(
+    todo_id: int,
+    if_match: Optional[str] = Header(None),
+    db: AsyncSession = Depends(get_todo_db),
+):
+    try:
+        success = await crud.delete_todo(
+            db, todo_id=todo_id, versions=etags.match_versions(if_match)
+        )
+    except crud.VersionMismatch:
+        raise HTTPException(status_code=412, detail="Todo has changed since it was read")
     if not success:
         raise HTTPException(status_code=404, detail="Todo not found")
     return {"detail": "Todo deleted successfully"}
+
+
+# The lookups a /batch sub-request may make, answered through the request's loaders.
+BATCH_ROUTES = (
+    (re.compile(r"/todos/(\d+)"), "todos", "Todo not found"),
+    (re.compile(r"/users/(\d+)"), "users", "User not found"),
+)
+
+
+async def _batch_get(loaders: Loaders, path: str) -> dict:
+    for pattern, name, not_found in BATCH_ROUTES:
+        match = pattern.fullmatch(path)
+        if match is None:
+            continue
+        payload = await getattr(loaders, name).load(int(match.group(1)))
+        if payload is None:
+            return {"status": 404, "body": {"detail": not_found}}
+        return {"status": 200, "body": payload}
+    detail = "Only GET /todos/{id} and /users/{id} can be batched"
+    return {"status": 400, "body": {"detail": detail}}
+
+
+@app.post(
+    "/batch",
+    response_model=List[schemas.BatchResult],
+    dependencies=[Depends(admission.admit_bulk)],
+)
+async def batch(body: schemas.BatchRequest, loaders: Loaders = Depends(get_loaders)):
+    # Sub-requests run concurrently, so their lookups meet in the loaders and cost one
+    # query per table. Returned directly: a read-only POST must not pin reads to the primary.
+    results = await asyncio.gather(*(_batch_get(loaders, op.path) for op in body.requests))
+    return ORJSONResponse(results)
+
+
+@app.get(
+    "/jobs/{job_id}", response_model=schemas.Job, dependencies=[Depends(admission.admit_read)]
+)
+async def read_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await jobs.get_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.post(
+    "/jobs/{job_id}/cancel",
+    response_model=schemas.Job,
+    dependencies=[Depends(admission.admit_write)],
+)
+async def cancel_job(job_id: int, db: AsyncSession = Depends(get_db)):
+    job = await jobs.cancel_job(db, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@app.get("/metrics", include_in_schema=False)
+async def read_metrics():
+    return Response(metrics.render(), media_type=metrics.CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats")
+async def read_cache_stats():
+    return cache.backend.stats()
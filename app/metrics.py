@@ -0,0 +1,219 @@
+import logging
+import os
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+from prometheus_client import CONTENT_TYPE_LATEST, CollectorRegistry, Counter, Histogram
+from prometheus_client import generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.default import CACHE_HIT, CACHE_MISS
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from . import cache, events
+
+logger = logging.getLogger(__name__)
+
+# A request issuing more queries than this is reported as a likely N+1.
+N_PLUS_ONE_THRESHOLD = int(os.getenv("METRICS_N_PLUS_ONE_THRESHOLD", "10"))
+
+registry = CollectorRegistry()
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, including streaming the body.",
+    ["method", "route", "status"],
+    registry=registry,
+)
+REQUEST_QUERIES = Histogram(
+    "http_request_db_queries",
+    "Database queries issued per request.",
+    ["route"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100),
+    registry=registry,
+)
+REQUEST_DB_TIME = Histogram(
+    "http_request_db_duration_seconds",
+    "Time spent executing database queries per request.",
+    ["route"],
+    registry=registry,
+)
+N_PLUS_ONE = Counter(
+    "http_request_n_plus_one",
+    f"Requests that issued more than {N_PLUS_ONE_THRESHOLD} database queries.",
+    ["route"],
+    registry=registry,
+)
+STATEMENT_CACHE = Counter(
+    "db_statement_cache",
+    "Statements executed, by whether their compiled form came from the engine's cache.",
+    ["result"],
+    registry=registry,
+)
+_CACHE_RESULTS = {CACHE_HIT: "hit", CACHE_MISS: "miss"}
+POOL_WAIT = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool.",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30),
+    registry=registry,
+)
+
+
+class RequestStats:
+    __slots__ = ("queries", "db_time")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+
+
+_current: ContextVar[Optional[RequestStats]] = ContextVar("request_stats", default=None)
+
+
+def current_stats() -> Optional[RequestStats]:
+    return _current.get()
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is None:
+        return
+    STATEMENT_CACHE.labels(_CACHE_RESULTS.get(context.cache_hit, "uncached")).inc()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += time.perf_counter() - context._metrics_started
+
+
+class TimedAsyncQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+
+class _EngineCollector:
+    def __init__(self):
+        # Engines, or callables returning the engine once it has been created.
+        self.engines: Dict[str, object] = {}
+
+    def collect(self):
+        gauges = {
+            name: GaugeMetricFamily(f"db_pool_{name}", help, labels=["engine"])
+            for name, help in (
+                ("size", "Connections the pool keeps open."),
+                ("checked_out", "Connections currently checked out of the pool."),
+                ("checked_in", "Idle connections in the pool."),
+                ("overflow", "Connections open beyond the pool size."),
+            )
+        }
+        cached = GaugeMetricFamily(
+            "db_statement_cache_entries", "Compiled statements cached.", labels=["engine"]
+        )
+        for label, engine in self.engines.items():
+            if callable(engine):
+                engine = engine()
+            if engine is None:
+                continue
+            if engine.sync_engine._compiled_cache is not None:
+                cached.add_metric([label], len(engine.sync_engine._compiled_cache))
+            # NullPool (SQLite) keeps nothing to report.
+            if not hasattr(engine.sync_engine.pool, "checkedout"):
+                continue
+            pool = engine.sync_engine.pool
+            gauges["size"].add_metric([label], pool.size())
+            gauges["checked_out"].add_metric([label], pool.checkedout())
+            gauges["checked_in"].add_metric([label], pool.checkedin())
+            gauges["overflow"].add_metric([label], max(pool.overflow(), 0))
+        return list(gauges.values()) + [cached]
+
+
+class _CacheCollector:
+    def collect(self):
+        stats = cache.backend.stats()
+        for name in ("hits", "misses", "evictions", "expirations"):
+            if name in stats:
+                counter = CounterMetricFamily(f"cache_{name}", f"Cache {name}.")
+                counter.add_metric([], stats[name])
+                yield counter
+        if "size" in stats:
+            gauge = GaugeMetricFamily("cache_entries", "Entries held by the cache.")
+            gauge.add_metric([], stats["size"])
+            yield gauge
+
+
+class _EventsCollector:
+    def collect(self):
+        stats = events.backend.stats()
+        if "subscribers" in stats:
+            gauge = GaugeMetricFamily("events_subscribers", "Open change feed subscriptions.")
+            gauge.add_metric([], stats["subscribers"])
+            yield gauge
+        if "evictions" in stats:
+            counter = CounterMetricFamily(
+                "events_evictions", "Subscribers dropped for falling behind."
+            )
+            counter.add_metric([], stats["evictions"])
+            yield counter
+
+
+_engines = _EngineCollector()
+registry.register(_engines)
+registry.register(_CacheCollector())
+registry.register(_EventsCollector())
+
+
+def register_engine(name: str, engine) -> None:
+    _engines.engines[name] = engine
+
+
+def render() -> bytes:
+    return generate_latest(registry)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        status = 500
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            elapsed = time.perf_counter() - started
+            _current.reset(token)
+            # The router stores the matched route on the scope; label by its template so
+            # /todos/1 and /todos/2 share a series.
+            route = getattr(scope.get("route"), "path", "<unmatched>")
+            REQUEST_LATENCY.labels(scope["method"], route, str(status)).observe(elapsed)
+            REQUEST_QUERIES.labels(route).observe(stats.queries)
+            REQUEST_DB_TIME.labels(route).observe(stats.db_time)
+            if stats.queries > N_PLUS_ONE_THRESHOLD:
+                N_PLUS_ONE.labels(route).inc()
+                logger.warning(
+                    "%s %s issued %d queries", scope["method"], route, stats.queries
+                )
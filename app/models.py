@@ -1,4 +1,5 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String
+from sqlalchemy import DDL, JSON, Boolean, Column, DateTime, ForeignKey, Index, Integer, String
+from sqlalchemy import event
 from sqlalchemy.orm import relationship
 
 from .database import Base
@@ -6,22 +7,148 @@ from .database import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Lets a conditional GET read the version without touching the row.
+        Index("ix_users_id_version", "id", "version"),
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
+    id = Column(Integer, primary_key=True)
     email = Column(String, unique=True, index=True)
     hashed_password = Column(String)
     is_active = Column(Boolean, default=True)
+    # Bumped on every write; Core UPDATEs in crud bump it themselves.
+    version = Column(Integer, nullable=False, default=1, server_default="1")
 
-    todos = relationship("Todo", back_populates="owner", lazy="selectin")
+    # Kept by crud alongside every todo write (python -m app.counters repairs drift);
+    # todo_count also enforces TODO_MAX_PER_USER.
+    todo_count = Column(Integer, nullable=False, default=0, server_default="0")
+    done_count = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __mapper_args__ = {"version_id_col": version}
+
+    # Todos are only loaded on request (selectinload); touching them otherwise raises.
+    todos = relationship("Todo", back_populates="owner", lazy="raise")
 
 
 class Todo(Base):
     __tablename__ = "todos"
+    __table_args__ = (
+        # Serves every per-user query: the owner filter, is_done filter and id ordering.
+        Index("ix_todos_owner_id_is_done_id", "owner_id", "is_done", "id"),
+        Index("ix_todos_id_version", "id", "version"),
+        # Finds the todos due for the archive; open todos have no completed_at.
+        Index("ix_todos_completed_at", "completed_at"),
+        # Ids moved to todos_archive must never be handed out again, which SQLite only
+        # guarantees for AUTOINCREMENT tables.
+        {"sqlite_autoincrement": True},
+    )
 
-    id = Column(Integer, primary_key=True, index=True)
-    title = Column(String, index=True)
-    description = Column(String, index=True)
+    id = Column(Integer, primary_key=True)
+    title = Column(String)
+    description = Column(String)
     is_done = Column(Boolean, default=False)
     owner_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Set by crud when is_done becomes true and cleared when it goes back.
+    completed_at = Column(DateTime(timezone=True))
+
+    __mapper_args__ = {"version_id_col": version}
 
     owner = relationship("User", back_populates="todos")
+
+
+# Completed todos moved out of the hot table by app.archive. Same ids and columns, so
+# reads that miss in todos can return the archived row unchanged; it sits on the same
+# database (or shard) as its owner.
+class ArchivedTodo(Base):
+    __tablename__ = "todos_archive"
+    __table_args__ = (Index("ix_todos_archive_owner_id_id", "owner_id", "id"),)
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    title = Column(String)
+    description = Column(String)
+    is_done = Column(Boolean)
+    owner_id = Column(Integer, ForeignKey("users.id"))
+    version = Column(Integer, nullable=False)
+    completed_at = Column(DateTime(timezone=True))
+    archived_at = Column(DateTime(timezone=True), nullable=False)
+
+
+# Directory tables, only used when the data is sharded (database.ShardRouter). They live on
+# DATABASE_URL, which every shard's ids and emails are made unique against.
+class IdBlock(Base):
+    __tablename__ = "id_blocks"
+
+    name = Column(String, primary_key=True)
+    # The first id not yet reserved by any process.
+    next_id = Column(Integer, nullable=False)
+
+
+class UserEmail(Base):
+    __tablename__ = "user_emails"
+
+    email = Column(String, primary_key=True)
+    user_id = Column(Integer, nullable=False, unique=True)
+
+
+# Maintenance jobs (app.jobs). Like the directory tables they live on DATABASE_URL; the
+# rows a job works on may be on any shard.
+class Job(Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Workers look for queued jobs and for running ones whose lease ran out.
+        Index("ix_jobs_status_heartbeat_at", "status", "heartbeat_at"),
+    )
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)
+    # Not a foreign key: the user may live on a shard, and deleting it is one of the jobs.
+    user_id = Column(Integer)
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(String, nullable=False)
+    progress = Column(Integer, nullable=False, default=0)
+    total = Column(Integer)
+    error = Column(String)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    # Renewed after every chunk; a running job whose heartbeat is older than the lease
+    # was abandoned by its worker.
+    heartbeat_at = Column(DateTime(timezone=True))
+    finished_at = Column(DateTime(timezone=True))
+
+
+# Full-text search over title and description. These objects live outside the ORM
+# mapping and are created alongside the todos table (see also alembic revision 0003).
+TODO_SEARCH_DDL = {
+    "postgresql": [
+        "ALTER TABLE todos ADD COLUMN search_vector tsvector GENERATED ALWAYS AS "
+        "(to_tsvector('english', coalesce(title, '') || ' ' || coalesce(description, ''))) "
+        "STORED",
+        "CREATE INDEX ix_todos_search_vector ON todos USING gin (search_vector)",
+    ],
+    "sqlite": [
+        "CREATE VIRTUAL TABLE todos_fts USING fts5("
+        "title, description, content='todos', content_rowid='id')",
+        "CREATE TRIGGER todos_fts_insert AFTER INSERT ON todos BEGIN "
+        "INSERT INTO todos_fts(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END",
+        "CREATE TRIGGER todos_fts_delete AFTER DELETE ON todos BEGIN "
+        "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); END",
+        "CREATE TRIGGER todos_fts_update AFTER UPDATE OF title, description ON todos BEGIN "
+        "INSERT INTO todos_fts(todos_fts, rowid, title, description) "
+        "VALUES ('delete', old.id, old.title, old.description); "
+        "INSERT INTO todos_fts(rowid, title, description) "
+        "VALUES (new.id, new.title, new.description); END",
+    ],
+}
+
+for _dialect, _statements in TODO_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Todo.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
+# The triggers go with the table; the external-content FTS table has to be dropped explicitly.
+event.listen(
+    Todo.__table__,
+    "after_drop",
+    DDL("DROP TABLE IF EXISTS todos_fts").execute_if(dialect="sqlite"),
+)
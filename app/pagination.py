@@ -0,0 +1,72 @@
+import base64
+import heapq
+import json
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+
+def encode_cursor(payload: dict) -> str:
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode()
+
+
+def decode_cursor(cursor: str) -> dict:
+    # An empty cursor asks for the first page.
+    if not cursor:
+        return {}
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+    if not isinstance(payload, dict):
+        raise ValueError("Invalid cursor")
+    return payload
+
+
+def decode_scoped(cursor: str, scope: Optional[dict] = None) -> dict:
+    payload = decode_cursor(cursor)
+    # A cursor is only valid for the listing it was issued for.
+    for key, value in (scope or {}).items():
+        if payload and payload.get(key) != value:
+            raise ValueError("Invalid cursor")
+    return payload
+
+
+def after_id(cursor: str, scope: Optional[dict] = None) -> Optional[int]:
+    payload = decode_scoped(cursor, scope)
+    if not payload:
+        return None
+    last_id = payload.get("id")
+    if not isinstance(last_id, int):
+        raise ValueError("Invalid cursor")
+    return last_id
+
+
+def page(
+    rows: Sequence[Any], limit: int, cursor_for: Callable[[Any], dict]
+) -> Tuple[List[Any], Optional[str]]:
+    # Callers fetch ``limit + 1`` rows; the extra row only signals another page.
+    rows = list(rows)
+    if len(rows) > limit:
+        rows = rows[:limit]
+        return rows, encode_cursor(cursor_for(rows[-1]))
+    return rows, None
+
+
+def merge(
+    pages: Sequence[Sequence[Any]],
+    key: Callable[[Any], Any],
+    limit: Optional[int] = None,
+    reverse: bool = False,
+) -> List[Any]:
+    # Scatter-gather: each shard's page is already sorted by ``key``, so the merged page
+    # is too. A row on two shards at once (its user mid-move) is kept once.
+    merged = []
+    seen = set()
+    for row in heapq.merge(*pages, key=key, reverse=reverse):
+        if row["id"] in seen:
+            continue
+        seen.add(row["id"])
+        merged.append(row)
+        if len(merged) == limit:
+            break
+    return merged
@@ -0,0 +1,170 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from fastapi.responses import ORJSONResponse
+from prometheus_client import Counter
+from starlette.routing import Match
+
+from . import admission, metrics, security
+
+# Opt-in: token buckets per user (bearer token) or, for anonymous requests, per client IP.
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "0") == "1"
+# Buckets kept per process; the least recently used are dropped first.
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+RATE_LIMIT_SHARDS = int(os.getenv("RATE_LIMIT_SHARDS", "16"))
+
+
+def _budget(name: str, rate: str, burst: str) -> Tuple[str, float, float]:
+    prefix = f"RATE_LIMIT_{name.upper()}"
+    return (
+        name,
+        float(os.getenv(f"{prefix}_PER_SECOND", rate)),
+        float(os.getenv(f"{prefix}_BURST", burst)),
+    )
+
+
+# A route spends from the budget of the admission class it declares; routes without one
+# (metrics, change feeds) are not limited.
+BUDGETS = {
+    admission.READ: _budget("read", "50", "100"),
+    admission.WRITE: _budget("write", "10", "20"),
+    admission.BULK: _budget("bulk", "2", "10"),
+}
+
+RATE_LIMITED = Counter(
+    "http_rate_limited",
+    "Requests turned away by rate limiting.",
+    ["budget"],
+    registry=metrics.registry,
+)
+
+
+class BucketStore:
+    """Interface for token buckets; a store shared by workers (e.g. Redis) implements it."""
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        """Spends ``cost`` tokens. Returns 0 if they were there, else seconds to wait."""
+        raise NotImplementedError
+
+    def stats(self) -> dict:
+        raise NotImplementedError
+
+
+class MemoryBucketStore(BucketStore):
+    """Buckets for this process only.
+
+    A take never awaits, so it needs no lock on the event loop. Keys are spread over
+    shards, each with its own LRU order, so evicting idle buckets stays cheap.
+    """
+
+    def __init__(self, max_keys: int = 100000, shards: int = 16, clock=time.monotonic):
+        self.clock = clock
+        self.limited = 0
+        self._shards: List["OrderedDict[str, Tuple[float, float]]"] = [
+            OrderedDict() for _ in range(shards)
+        ]
+        self._shard_size = max(1, max_keys // shards)
+
+    async def take(self, key: str, rate: float, burst: float, cost: float = 1) -> float:
+        shard = self._shards[hash(key) % len(self._shards)]
+        now = self.clock()
+        bucket = shard.get(key)
+        if bucket is None:
+            tokens = burst
+            if len(shard) >= self._shard_size:
+                # Evicting an idle bucket only refills it early.
+                shard.popitem(last=False)
+        else:
+            tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            shard.move_to_end(key)
+        if tokens >= cost:
+            shard[key] = (tokens - cost, now)
+            return 0.0
+        shard[key] = (tokens, now)
+        self.limited += 1
+        return (cost - tokens) / rate
+
+    def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "buckets": sum(len(shard) for shard in self._shards),
+            "limited": self.limited,
+        }
+
+
+backend: BucketStore = MemoryBucketStore(RATE_LIMIT_MAX_KEYS, RATE_LIMIT_SHARDS)
+
+
+def configure(new_backend: BucketStore) -> None:
+    global backend
+    backend = new_backend
+
+
+_ADMISSION_CLASSES = {
+    admission.admit_read: admission.READ,
+    admission.admit_write: admission.WRITE,
+    admission.admit_bulk: admission.BULK,
+}
+
+
+def _route_classes(routes) -> Dict[str, List[tuple]]:
+    # Indexed by first path segment so a request only tries the routes that could match.
+    table: Dict[str, List[tuple]] = {}
+    for route in routes:
+        for dependency in getattr(route, "dependencies", ()):
+            priority = _ADMISSION_CLASSES.get(dependency.dependency)
+            if priority is not None:
+                segment = route.path.split("/")[1]
+                table.setdefault(segment, []).append((route, priority))
+                break
+    return table
+
+
+async def _client_key(scope) -> Optional[str]:
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer":
+                claims = await security.decode_access_token(token)
+                if claims is not None:
+                    return f"user:{claims['sub']}"
+            break
+    client = scope.get("client")
+    return f"ip:{client[0]}" if client else None
+
+
+class RateLimitMiddleware:
+    def __init__(self, app):
+        self.app = app
+        self._routes: Optional[Dict[str, List[tuple]]] = None
+
+    def _classify(self, scope) -> Optional[int]:
+        if self._routes is None:
+            self._routes = _route_classes(scope["app"].routes)
+        segment = scope["path"].split("/", 2)[1] if scope["path"] != "/" else ""
+        for route, priority in self._routes.get(segment, ()):
+            # A partial match is the right path with another method, which is not ours.
+            if route.matches(scope)[0] == Match.FULL:
+                return priority
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not RATE_LIMIT_ENABLED:
+            return await self.app(scope, receive, send)
+        priority = self._classify(scope)
+        key = await _client_key(scope) if priority is not None else None
+        if key is not None:
+            name, rate, burst = BUDGETS[priority]
+            wait = await backend.take(f"{name}:{key}", rate, burst)
+            if wait:
+                RATE_LIMITED.labels(name).inc()
+                response = ORJSONResponse(
+                    {"detail": "Too many requests"},
+                    status_code=429,
+                    headers={"Retry-After": str(max(math.ceil(wait), 1))},
+                )
+                return await response(scope, receive, send)
+        await self.app(scope, receive, send)
@@ -0,0 +1,201 @@
+"""Move users, with their todos, onto the shard the current hash ring assigns them.
+
+After changing DATABASE_SHARD_URLS, run the app and this tool with the old list in
+DATABASE_PREVIOUS_SHARD_URLS; the app keeps finding users that have not moved yet.
+Once it finishes, drop DATABASE_PREVIOUS_SHARD_URLS from the app's settings.
+
+    DATABASE_SHARD_URLS=a,b,c DATABASE_PREVIOUS_SHARD_URLS=a,b python -m app.rebalance
+
+It also backfills the email directory and moves the id blocks past every existing id,
+so it is the way to turn sharding on for a database that was not sharded before.
+"""
+import argparse
+import asyncio
+import logging
+from typing import List, Optional, Tuple
+
+from sqlalchemy import delete, func, select, tuple_
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import crud, database, models, sequences
+
+logger = logging.getLogger(__name__)
+
+USERS = models.User.__table__
+TODOS = models.Todo.__table__
+ARCHIVE = models.ArchivedTodo.__table__
+
+
+async def _snapshot(db: AsyncSession, user_id: int) -> Tuple[Optional[dict], List[dict]]:
+    user = (await db.execute(select(USERS).where(USERS.c.id == user_id))).mappings().first()
+    todos = await db.execute(select(TODOS).where(TODOS.c.owner_id == user_id))
+    return (dict(user) if user else None), [dict(todo) for todo in todos.mappings()]
+
+
+async def _archived(db: AsyncSession, user_id: int) -> List[dict]:
+    result = await db.execute(select(ARCHIVE).where(ARCHIVE.c.owner_id == user_id))
+    return [dict(todo) for todo in result.mappings()]
+
+
+def _upsert(db: AsyncSession, table, rows: List[dict]):
+    statement = crud._insert(db, table).values(rows)
+    columns = [column.key for column in table.c if column.key != "id"]
+    return statement.on_conflict_do_update(
+        index_elements=[table.c.id], set_={key: statement.excluded[key] for key in columns}
+    )
+
+
+async def _copy(db: AsyncSession, user: dict, todos: List[dict], archived: List[dict] = ()):
+    # Idempotent, so a pass that was interrupted or retried just copies again. The counts
+    # match the todos copied; a create since the snapshot fails the remove and retries.
+    copied = [*todos, *archived]
+    done = sum(1 for todo in copied if todo["is_done"])
+    await db.execute(
+        _upsert(db, USERS, [dict(user, todo_count=len(copied), done_count=done)])
+    )
+    for table, rows in ((TODOS, todos), (ARCHIVE, archived)):
+        for batch in crud._batches(rows):
+            await db.execute(_upsert(db, table, batch))
+        await db.execute(
+            delete(table).where(
+                table.c.owner_id == user["id"], table.c.id.notin_([row["id"] for row in rows])
+            )
+        )
+    await db.commit()
+
+
+async def _remove(
+    db: AsyncSession, user: dict, todos: List[dict], archived: List[dict] = ()
+) -> bool:
+    # Deletes exactly the versions that were copied. Anything written in the meantime
+    # leaves rows behind, and the whole delete is rolled back for another pass. Archived
+    # todos never change; one archived since the snapshot keeps the user in place.
+    for batch in crud._batches(archived):
+        await db.execute(delete(ARCHIVE).where(ARCHIVE.c.id.in_([row["id"] for row in batch])))
+    for batch in crud._batches(todos):
+        await db.execute(
+            delete(TODOS).where(
+                tuple_(TODOS.c.id, TODOS.c.version).in_(
+                    [(todo["id"], todo["version"]) for todo in batch]
+                )
+            )
+        )
+    remaining = await db.execute(
+        select(func.count()).select_from(TODOS).where(TODOS.c.owner_id == user["id"])
+    )
+    if not remaining.scalar():
+        try:
+            deleted = await db.execute(
+                delete(USERS).where(USERS.c.id == user["id"], USERS.c.version == user["version"])
+            )
+            if deleted.rowcount == 1:
+                await db.commit()
+                return True
+        except IntegrityError:
+            # A todo created for the user since the count.
+            pass
+    await db.rollback()
+    return False
+
+
+async def move_user(
+    source: database.Shard, target: database.Shard, user_id: int, attempts: int = 5
+) -> bool:
+    for _ in range(attempts):
+        async with source.sessionmaker() as db:
+            user, todos = await _snapshot(db, user_id)
+            archived = await _archived(db, user_id)
+        if user is None:
+            return False
+        async with target.sessionmaker() as db:
+            await _copy(db, user, todos, archived)
+        async with source.sessionmaker() as db:
+            if await _remove(db, user, todos, archived):
+                return True
+    logger.warning("User %s kept changing while being moved; left for the next run", user_id)
+    return False
+
+
+async def _backfill(directory: async_sessionmaker, users: List[tuple]):
+    async with directory() as db:
+        await db.execute(
+            crud._insert(db, models.UserEmail)
+            .values([{"email": email, "user_id": user_id} for user_id, email in users])
+            .on_conflict_do_nothing()
+        )
+        await db.commit()
+
+
+async def _max_id(shard: database.Shard, *tables) -> int:
+    async with shard.sessionmaker() as db:
+        ids = [(await db.execute(select(func.max(table.c.id)))).scalar() for table in tables]
+    return max(id or 0 for id in ids)
+
+
+async def rebalance(
+    router: database.ShardRouter,
+    directory: async_sessionmaker,
+    batch_size: int = 500,
+    dry_run: bool = False,
+) -> dict:
+    stats = {"scanned": 0, "moved": 0, "skipped": 0}
+    if not dry_run:
+        # Ids handed out from here on must not collide with rows created before sharding.
+        # Archived todos keep their ids, so those are taken too.
+        for name, tables in (("users", [USERS]), ("todos", [TODOS, ARCHIVE])):
+            floor = max([await _max_id(shard, *tables) for shard in router.shards.values()]) + 1
+            async with directory() as db:
+                await sequences.reserve(db, name, 0, floor=floor)
+    for shard in router.shards.values():
+        after_id = 0
+        while True:
+            async with shard.sessionmaker() as db:
+                result = await db.execute(
+                    select(USERS.c.id, USERS.c.email)
+                    .where(USERS.c.id > after_id)
+                    .order_by(USERS.c.id)
+                    .limit(batch_size)
+                )
+                users = result.all()
+            if not users:
+                break
+            after_id = users[-1][0]
+            stats["scanned"] += len(users)
+            if not dry_run:
+                await _backfill(directory, users)
+            for user_id, _ in users:
+                target = router.shard_for(user_id)
+                if target is shard:
+                    continue
+                if dry_run or await move_user(shard, target, user_id):
+                    stats["moved"] += 1
+                else:
+                    stats["skipped"] += 1
+    return stats
+
+
+async def main(args):
+    router = database.shard_router
+    if not router.enabled:
+        raise SystemExit("DATABASE_SHARD_URLS is not set")
+    try:
+        stats = await rebalance(
+            router, database.session_factory(), batch_size=args.batch_size, dry_run=args.dry_run
+        )
+    finally:
+        await router.dispose()
+        await database.get_engine().dispose()
+    verb = "would move" if args.dry_run else "moved"
+    print(
+        f"scanned {stats['scanned']} users on {len(router.shards)} shards; {verb} {stats['moved']},"
+        f" {stats['skipped']} left for the next run"
+    )
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true")
+    asyncio.run(main(parser.parse_args()))
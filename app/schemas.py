@@ -1,5 +1,7 @@
+from datetime import datetime
+
 from pydantic import BaseModel, ConfigDict, Field, EmailStr
-from typing import List, Optional
+from typing import Any, List, Literal, Optional
 
 
 class TodoBase(BaseModel):
@@ -16,6 +18,7 @@ class Todo(TodoBase):
     id: int
     is_done: bool
     owner_id: int
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -26,6 +29,40 @@ class TodoUpdate(BaseModel):
     is_done: Optional[bool] = None
 
 
+class TodoBulkCreate(BaseModel):
+    todos: List[TodoCreate] = Field(..., min_length=1, max_length=1000)
+
+
+class TodoBulkUpdateItem(TodoUpdate):
+    id: int
+
+
+class TodoBulkUpdate(BaseModel):
+    todos: List[TodoBulkUpdateItem] = Field(..., min_length=1, max_length=1000)
+
+
+class TodoImport(BaseModel):
+    todos: List[TodoCreate] = Field(..., max_length=100000)
+    # Delete the user's existing todos first.
+    replace: bool = False
+
+
+class TodoBulkDelete(BaseModel):
+    ids: List[int] = Field(..., min_length=1, max_length=1000)
+
+
+class TodoBulkResult(BaseModel):
+    id: int
+    status: str
+    todo: Optional[Todo] = None
+
+
+class TodoPage(BaseModel):
+    items: List[Todo]
+    next_cursor: Optional[str] = None
+    estimated_total: Optional[int] = None
+
+
 class UserBase(BaseModel):
     email: EmailStr
 
@@ -38,9 +75,47 @@ class UserCreate(UserBase):
 class User(UserBase):
     id: int
     is_active: bool
+    version: int
 
     model_config = ConfigDict(from_attributes=True)
 
 
 class UserWithTodos(User):
     todos: List[Todo]
+
+
+class UserStats(BaseModel):
+    total: int
+    done: int
+    open: int
+
+
+class BatchOperation(BaseModel):
+    method: Literal["GET"] = "GET"
+    path: str
+
+
+class BatchRequest(BaseModel):
+    requests: List[BatchOperation] = Field(..., min_length=1, max_length=100)
+
+
+class BatchResult(BaseModel):
+    status: int
+    body: Any = None
+
+
+class Token(BaseModel):
+    access_token: str
+    token_type: str
+
+
+class Job(BaseModel):
+    id: int
+    kind: str
+    user_id: Optional[int] = None
+    status: str
+    progress: int
+    total: Optional[int] = None
+    error: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
@@ -0,0 +1,100 @@
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Optional
+
+from jose import JWTError, jwt
+from passlib.context import CryptContext
+
+from .cache import LRUCache
+
+SECRET_KEY = os.getenv("SECRET_KEY", "insecure-development-key")
+ALGORITHM = "HS256"
+ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
+
+# bcrypt releases the GIL while hashing, so a small thread pool keeps the event
+# loop free without the pickling overhead of a process pool.
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", "4"))
+# Hash requests allowed to wait for a worker before new ones are turned away.
+PASSWORD_HASH_MAX_PENDING = int(os.getenv("PASSWORD_HASH_MAX_PENDING", "64"))
+
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=int(os.getenv("BCRYPT_ROUNDS", "12")),
+)
+
+_executor = ThreadPoolExecutor(
+    max_workers=PASSWORD_HASH_WORKERS, thread_name_prefix="password-hash"
+)
+_pending = 0
+
+# Decoded claims keyed by the raw token, so repeat requests skip the signature check.
+_claims = LRUCache(
+    maxsize=int(os.getenv("TOKEN_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("TOKEN_CACHE_TTL_SECONDS", "300")),
+)
+
+
+class HasherBusy(Exception):
+    pass
+
+
+async def _offload(fn, *args):
+    global _pending
+    if _pending >= PASSWORD_HASH_MAX_PENDING:
+        raise HasherBusy()
+    _pending += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_executor, fn, *args)
+    finally:
+        _pending -= 1
+
+
+@lru_cache(maxsize=1)
+def _dummy_hash() -> str:
+    return pwd_context.hash("dummy-password-for-timing")
+
+
+def _verify(password: str, hashed_password: Optional[str]) -> bool:
+    if hashed_password is None:
+        # Unknown email: burn the same bcrypt time so failures are indistinguishable.
+        pwd_context.verify(password, _dummy_hash())
+        return False
+    try:
+        return pwd_context.verify(password, hashed_password)
+    except ValueError:
+        # Rows written before real hashing store a value passlib cannot identify.
+        return False
+
+
+async def hash_password(password: str) -> str:
+    return await _offload(pwd_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: Optional[str]) -> bool:
+    return await _offload(_verify, password, hashed_password)
+
+
+def create_access_token(subject: str, expires_delta: Optional[timedelta] = None) -> str:
+    expire = datetime.now(timezone.utc) + (
+        expires_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return jwt.encode({"sub": subject, "exp": expire}, SECRET_KEY, algorithm=ALGORITHM)
+
+
+async def decode_access_token(token: str) -> Optional[dict]:
+    claims = await _claims.get(token)
+    if claims is None:
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            return None
+        await _claims.set(token, claims)
+    # Cached claims may outlive the token itself.
+    if claims.get("exp", 0) <= time.time():
+        return None
+    return claims
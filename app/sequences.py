@@ -0,0 +1,86 @@
+import asyncio
+import os
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import case, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from . import database, models
+
+# Ids a process reserves per round trip to the directory; a restart skips what it had left.
+ID_BLOCK_SIZE = int(os.getenv("ID_BLOCK_SIZE", "1000"))
+
+
+class BlockAllocator:
+    """Globally unique ids for sharded tables, reserved in blocks from the id_blocks table."""
+
+    def __init__(
+        self, session_factory: Callable[[], async_sessionmaker], block_size: int = ID_BLOCK_SIZE
+    ):
+        self.session_factory = session_factory
+        self.block_size = block_size
+        self._blocks: Dict[str, Tuple[int, int]] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._pid: Optional[int] = None
+
+    async def allocate(self, name: str, count: int) -> List[int]:
+        # A forked worker must not hand out the rest of its parent's block.
+        if self._pid != os.getpid():
+            self._blocks, self._locks, self._pid = {}, {}, os.getpid()
+        async with self._locks.setdefault(name, asyncio.Lock()):
+            ids: List[int] = []
+            while len(ids) < count:
+                next_id, end = self._blocks.get(name, (0, 0))
+                if next_id >= end:
+                    size = max(self.block_size, count - len(ids))
+                    async with self.session_factory()() as db:
+                        end = await reserve(db, name, size)
+                    next_id = end - size
+                taken = min(end - next_id, count - len(ids))
+                ids.extend(range(next_id, next_id + taken))
+                self._blocks[name] = (next_id + taken, end)
+            return ids
+
+
+async def reserve(db: AsyncSession, name: str, size: int, floor: int = 1) -> int:
+    # Returns the end of a fresh block of ``size`` ids, none of them below ``floor``.
+    while True:
+        result = await db.execute(
+            update(models.IdBlock)
+            .where(models.IdBlock.name == name)
+            .values(
+                next_id=case(
+                    (models.IdBlock.next_id < floor, floor), else_=models.IdBlock.next_id
+                ) + size
+            )
+            .returning(models.IdBlock.next_id)
+        )
+        end = result.scalar()
+        if end is not None:
+            await db.commit()
+            return end
+        try:
+            await db.execute(insert(models.IdBlock).values(name=name, next_id=floor + size))
+            await db.commit()
+            return floor + size
+        except IntegrityError:
+            # Another process created the row first; reserve from it instead.
+            await db.rollback()
+
+
+allocator: Optional[BlockAllocator] = None
+if database.shard_router.enabled:
+    allocator = BlockAllocator(database.session_factory)
+
+
+def configure(new_allocator: Optional[BlockAllocator]) -> None:
+    global allocator
+    allocator = new_allocator
+
+
+async def allocate(name: str, count: int) -> Optional[List[int]]:
+    # None leaves the ids to the database's own autoincrement.
+    if allocator is None or count == 0:
+        return None
+    return await allocator.allocate(name, count)
@@ -0,0 +1,24 @@
+import os
+
+import uvicorn
+
+HOST = os.getenv("HOST", "0.0.0.0")
+PORT = int(os.getenv("PORT", "8000"))
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(os.cpu_count() or 1)))
+
+
+def main():
+    # Workers run the lifespan concurrently, so they verify the schema rather than race
+    # each other issuing DDL; run `alembic upgrade head` before starting them.
+    os.environ.setdefault("DB_SCHEMA_MODE", "check")
+    uvicorn.run(
+        "app.main:app",
+        host=HOST,
+        port=PORT,
+        workers=WEB_CONCURRENCY,
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+import asyncio
+import logging
+import os
+from typing import Optional
+
+from alembic.runtime.migration import MigrationContext
+from alembic.script import ScriptDirectory
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, AsyncSession
+
+from . import crud
+from .database import Base, DB_POOL_SIZE
+
+logger = logging.getLogger(__name__)
+
+# "create" issues create_all (development), "check" refuses to start unless the database
+# is at the newest Alembic revision, "skip" trusts whoever deployed the schema.
+DB_SCHEMA_MODE = os.getenv("DB_SCHEMA_MODE", "create")
+# Connections opened and primed before the worker starts accepting requests.
+DB_POOL_PREWARM = int(os.getenv("DB_POOL_PREWARM", str(DB_POOL_SIZE)))
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "alembic")
+
+
+class SchemaOutOfDate(RuntimeError):
+    pass
+
+
+def head_revision() -> Optional[str]:
+    return ScriptDirectory(MIGRATIONS_DIR).get_current_head()
+
+
+def _current_revision(connection) -> Optional[str]:
+    return MigrationContext.configure(connection).get_current_revision()
+
+
+async def check_schema(engine: AsyncEngine):
+    async with engine.connect() as conn:
+        current = await conn.run_sync(_current_revision)
+    head = head_revision()
+    if current != head:
+        raise SchemaOutOfDate(
+            f"Database schema is at revision {current}, expected {head}; "
+            "run `alembic upgrade head`"
+        )
+
+
+async def prepare_schema(engine: AsyncEngine, mode: str = DB_SCHEMA_MODE):
+    if mode == "create":
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    elif mode == "check":
+        await check_schema(engine)
+    elif mode != "skip":
+        raise ValueError(f"Unknown DB_SCHEMA_MODE {mode!r}")
+
+
+async def _warm(conn: AsyncConnection):
+    # Run the hot queries once so their SQL is compiled into the engine's cache and, on
+    # asyncpg, prepared on this connection. Id 0 never matches, so nothing is read.
+    async with AsyncSession(bind=conn) as db:
+        await crud.get_user(db, 0)
+        await crud.get_user(db, 0, include_todos=True)
+        await crud.get_user_credentials(db, "")
+        await crud.get_todo(db, 0)
+        await crud.get_user_todos(db, 0, limit=1)
+        await crud.get_todos(db, limit=1)
+        await crud.get_users(db, limit=1)
+        await crud.get_todo_version(db, 0)
+        await crud.get_user_stats(db, 0)
+        await crud.user_exists(db, 0)
+
+
+async def prewarm(engine: AsyncEngine, connections: int = DB_POOL_PREWARM) -> int:
+    pool = engine.sync_engine.pool
+    # NullPool (SQLite) keeps nothing open between checkouts; one pass still fills the
+    # compiled statement cache.
+    connections = min(connections, pool.size() if hasattr(pool, "size") else 1)
+    if connections <= 0:
+        return 0
+    # Check the connections out together so the pool opens distinct ones.
+    results = await asyncio.gather(
+        *(engine.connect().start() for _ in range(connections)), return_exceptions=True
+    )
+    opened = [conn for conn in results if isinstance(conn, AsyncConnection)]
+    try:
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        await asyncio.gather(*(_warm(conn) for conn in opened))
+    finally:
+        for conn in opened:
+            await conn.close()
+    logger.info("Pre-warmed %d database connections", connections)
+    return connections
@@ -0,0 +1,128 @@
+"""Latency and shedding under overload, with and without admission control.
+
+Every request holds a pooled connection for --hold-ms to stand in for a slow query,
+so arrivals faster than the pool can serve queue exactly as they would on Postgres.
+
+    python -m benchmarks.bench_admission --pool-size 4 --rate 400 --requests 800
+"""
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from collections import defaultdict
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import admission, cache
+from app.database import Base, get_db, get_read_db
+from app.main import app
+
+
+def _percentile(values, fraction):
+    return values[min(len(values) - 1, int(len(values) * fraction))] if values else 0.0
+
+
+async def run(client: AsyncClient, user_id: int, todo_id: int, args) -> dict:
+    results = defaultdict(lambda: {"ok": [], "503": 0, "error": 0})
+    rng = random.Random(0)
+
+    async def request(kind: str):
+        path = f"/todos/{todo_id}" if kind == "read" else f"/users/{user_id}/todos/"
+        start = time.perf_counter()
+        response = await client.get(path)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code == 200:
+            results[kind]["ok"].append(elapsed)
+        elif response.status_code == 503:
+            results[kind]["503"] += 1
+        else:
+            results[kind]["error"] += 1
+
+    # Open-loop arrivals: requests keep coming at --rate whether or not earlier ones finished.
+    start = time.perf_counter()
+    tasks = []
+    for index in range(args.requests):
+        delay = start + index / args.rate - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        kind = "bulk" if rng.random() < args.bulk_share else "read"
+        tasks.append(asyncio.create_task(request(kind)))
+    await asyncio.gather(*tasks)
+    results["elapsed_s"] = time.perf_counter() - start
+    return results
+
+
+async def main(args):
+    cache.configure(cache.NullCache())
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=args.pool_size,
+            max_overflow=0,
+            pool_timeout=args.pool_timeout,
+        )
+        session_factory = async_sessionmaker(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async def override_get_db():
+            async with session_factory() as session:
+                await session.connection()
+                await asyncio.sleep(args.hold_ms / 1000)
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        transport = ASGITransport(app=app, raise_app_exceptions=False)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post(
+                "/users/", json={"email": "bench@example.com", "password": "benchpassword"}
+            )
+            user_id = response.json()["id"]
+            response = await client.post(f"/users/{user_id}/todos/", json={"title": "Bench"})
+            todo_id = response.json()["id"]
+
+            print(
+                f"{args.requests} requests at {args.rate:g}/s ({args.bulk_share:.0%} listings)"
+                f" on a pool of {args.pool_size}, {args.hold_ms} ms per request,"
+                f" pool timeout {args.pool_timeout} s"
+            )
+            controller = admission.controller
+            for name in ("unbounded", "admission"):
+                if name == "unbounded":
+                    admission.controller = admission.AdmissionController(
+                        args.requests, args.requests, args.pool_timeout
+                    )
+                else:
+                    admission.controller = admission.AdmissionController(
+                        args.pool_size, args.pool_size * 4, args.queue_timeout
+                    )
+                result = await run(client, user_id, todo_id, args)
+                print(f"  {name} (wall {result.pop('elapsed_s'):.2f} s)")
+                for kind in ("read", "bulk"):
+                    latencies = sorted(result[kind]["ok"])
+                    print(
+                        f"    {kind:<4} ok {len(latencies):>4}  503 {result[kind]['503']:>4}"
+                        f"  errors {result[kind]['error']:>4}"
+                        f"  p50 {_percentile(latencies, 0.5):8.1f} ms"
+                        f"  p99 {_percentile(latencies, 0.99):8.1f} ms"
+                    )
+            admission.controller = controller
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pool-size", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=800)
+    parser.add_argument("--rate", type=float, default=400)
+    parser.add_argument("--bulk-share", type=float, default=0.3)
+    parser.add_argument("--hold-ms", type=float, default=20)
+    parser.add_argument("--pool-timeout", type=float, default=1)
+    parser.add_argument("--queue-timeout", type=float, default=0.25)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,156 @@
+"""Hot-table size and read latency before and after archiving completed todos.
+
+Seeds users whose todos are mostly done long ago, times the hot reads, moves the old
+completed todos to todos_archive with app.archive and times the same reads again,
+plus a read by id that now falls back to the archive. Sizes are the pages SQLite's
+dbstat reports for todos and its indexes, after a VACUUM.
+
+    python -m benchmarks.bench_archive --users 1000 --todos-per-user 100
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import timedelta
+
+from sqlalchemy import insert, text
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import counters, crud, models
+from app.archive import archive
+from app.database import Base
+
+_HOT_BYTES = text(
+    "SELECT count(*), sum(pgsize) FROM dbstat "
+    "WHERE name IN (SELECT name FROM sqlite_master WHERE tbl_name = 'todos')"
+)
+
+
+async def seed(session_factory, users: int, todos_per_user: int, done: float):
+    now = crud._now()
+    rng = random.Random(0)
+    async with session_factory() as db:
+        await db.execute(
+            insert(models.User),
+            [{"email": f"user{i}@example.com", "hashed_password": "x"} for i in range(users)],
+        )
+        for owner in range(1, users + 1):
+            rows = []
+            for j in range(todos_per_user):
+                is_done = rng.random() < done
+                rows.append({
+                    "title": f"Todo {j}",
+                    "description": "Benchmark todo",
+                    "owner_id": owner,
+                    "is_done": is_done,
+                    "completed_at": now - timedelta(days=rng.randint(31, 365)) if is_done else None,
+                })
+            await db.execute(insert(models.Todo), rows)
+        await db.commit()
+    await counters.repair(session_factory)
+
+
+async def hot_size(engine) -> dict:
+    async with engine.connect() as conn:
+        await conn.execute(text("VACUUM"))
+        rows = (await conn.execute(text("SELECT count(*) FROM todos"))).scalar()
+        pages, size = (await conn.execute(_HOT_BYTES)).one()
+    return {"rows": rows, "pages": pages, "mib": size / 2**20}
+
+
+async def measure(session_factory, call, calls: int) -> dict:
+    async with session_factory() as db:
+        for _ in range(20):
+            await call(db)
+        samples = []
+        for _ in range(calls):
+            start = time.perf_counter()
+            await call(db)
+            samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return {"mean": statistics.mean(samples), "p99": samples[int(len(samples) * 0.99)]}
+
+
+def cases(args, rng: random.Random, live_ids, archived_ids):
+    def user_id():
+        return rng.randint(1, args.users)
+
+    return [
+        (
+            "get_user include_todos",
+            lambda db: crud.get_user(db, user_id(), include_todos=True),
+        ),
+        ("get_todos owner_id", lambda db: crud.get_todos(db, limit=50, owner_id=user_id())),
+        ("get_user_todos", lambda db: crud.get_user_todos(db, user_id(), limit=50)),
+        ("get_todo (live)", lambda db: crud.get_todo(db, rng.choice(live_ids))),
+        (
+            "get_todo (archived)",
+            (lambda db: crud.get_todo(db, rng.choice(archived_ids))) if archived_ids else None,
+        ),
+        (
+            "get_user include_archived",
+            lambda db: crud.get_user(db, user_id(), include_todos=True, include_archived=True),
+        ),
+    ]
+
+
+async def ids(engine, table: str):
+    async with engine.connect() as conn:
+        return list((await conn.execute(text(f"SELECT id FROM {table}"))).scalars())
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine)
+        await seed(session_factory, args.users, args.todos_per_user, args.done)
+
+        before = await hot_size(engine)
+        live_ids = await ids(engine, "todos")
+        timings = {}
+        for name, call in cases(args, random.Random(1), live_ids, []):
+            if call is not None:
+                timings[name] = [await measure(session_factory, call, args.calls)]
+
+        start = time.perf_counter()
+        stats = await archive(
+            session_factory, crud._now() - timedelta(days=30), batch_size=args.batch_size
+        )
+        elapsed = time.perf_counter() - start
+
+        after = await hot_size(engine)
+        live_ids, archived_ids = await ids(engine, "todos"), await ids(engine, "todos_archive")
+        for name, call in cases(args, random.Random(1), live_ids, archived_ids):
+            timings.setdefault(name, [None]).append(
+                await measure(session_factory, call, args.calls)
+            )
+        await engine.dispose()
+
+    print(
+        f"archived {stats['archived']} todos in {stats['batches']} batches of"
+        f" {args.batch_size}: {elapsed:.2f} s ({stats['archived'] / elapsed:,.0f} rows/s)"
+    )
+    print(
+        f"hot table: {before['rows']:,} -> {after['rows']:,} rows,"
+        f" {before['mib']:.1f} -> {after['mib']:.1f} MiB with indexes"
+        f" ({before['pages']:,} -> {after['pages']:,} pages)"
+    )
+    print(f"{args.calls} calls each, ms (mean / p99), before -> after archiving:")
+    for name, (old, new) in timings.items():
+        old_text = "-" if old is None else f"{old['mean']:6.2f} / {old['p99']:6.2f}"
+        print(f"  {name:<28} {old_text:>15} -> {new['mean']:6.2f} / {new['p99']:6.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--todos-per-user", type=int, default=100)
+    parser.add_argument("--done", type=float, default=0.8, help="share of todos done")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--calls", type=int, default=2000)
+    asyncio.run(main(parser.parse_args()))
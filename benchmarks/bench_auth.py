@@ -0,0 +1,123 @@
+"""p99 of CRUD reads while a burst of logins runs, with bcrypt offloaded vs inline.
+
+The engine has a small bounded pool (``--pool-size``, no overflow, ``--pool-timeout``),
+so a request that holds its connection across bcrypt shows up as pool timeouts: 500s
+for the logins and for the reads queued behind them.
+
+    python -m benchmarks.bench_auth --logins 32 --readers 16 --pool-size 2
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import cache, security
+from app.database import Base, get_db, get_read_db
+from app.main import app
+
+
+async def _inline(fn, *args):
+    # What hashing on the event loop looks like: the coroutine blocks every other request.
+    return fn(*args)
+
+
+async def run(client: AsyncClient, user_id: int, todo_id: int, args) -> dict:
+    stop = asyncio.Event()
+    latencies = []
+    errors = {"reads": 0, "logins": 0}
+
+    async def reader():
+        while not stop.is_set():
+            for path in (f"/users/{user_id}", f"/todos/{todo_id}"):
+                start = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - start) * 1000)
+                errors["reads"] += response.status_code >= 500
+
+    async def login():
+        response = await client.post(
+            "/token", data={"username": "bench@example.com", "password": "benchpassword"}
+        )
+        # 503 is the hasher shedding load, which is fine; a pool timeout is a 500.
+        errors["logins"] += response.status_code not in (200, 503)
+
+    readers = [asyncio.create_task(reader()) for _ in range(args.readers)]
+    await asyncio.sleep(0.2)
+    latencies.clear()
+    start = time.perf_counter()
+    await asyncio.gather(*(login() for _ in range(args.logins)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*readers)
+
+    latencies.sort()
+    return {
+        "logins_s": elapsed,
+        "reads": len(latencies),
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "errors": errors,
+    }
+
+
+async def main(args):
+    cache.configure(cache.NullCache())
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            poolclass=AsyncAdaptedQueuePool,
+            pool_size=args.pool_size,
+            max_overflow=0,
+            pool_timeout=args.pool_timeout,
+        )
+        session_factory = async_sessionmaker(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async def override_get_db():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        transport = ASGITransport(app=app, raise_app_exceptions=False)
+        async with AsyncClient(transport=transport, base_url="http://bench") as client:
+            response = await client.post(
+                "/users/", json={"email": "bench@example.com", "password": "benchpassword"}
+            )
+            user_id = response.json()["id"]
+            response = await client.post(f"/users/{user_id}/todos/", json={"title": "Bench"})
+            todo_id = response.json()["id"]
+
+            print(
+                f"{args.readers} readers on GET /users/{{id}} and GET /todos/{{id}}"
+                f" during {args.logins} concurrent logins (bcrypt rounds"
+                f" {security.pwd_context.to_dict()['bcrypt__rounds']},"
+                f" pool {args.pool_size}, timeout {args.pool_timeout:g} s)"
+            )
+            offload = security._offload
+            for name in ("inline", "offloaded"):
+                security._offload = _inline if name == "inline" else offload
+                result = await run(client, user_id, todo_id, args)
+                print(
+                    f"  {name:<9} reads {result['reads']:>5}  p50 {result['p50_ms']:7.2f} ms"
+                    f"  p99 {result['p99_ms']:7.2f} ms  burst {result['logins_s']:.2f} s"
+                    f"  errors {result['errors']['reads']} reads"
+                    f" / {result['errors']['logins']} logins"
+                )
+            security._offload = offload
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--logins", type=int, default=32)
+    parser.add_argument("--readers", type=int, default=16)
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--pool-timeout", type=float, default=1)
+    asyncio.run(main(parser.parse_args()))
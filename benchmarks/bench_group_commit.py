@@ -0,0 +1,95 @@
+"""Throughput of POST /users/{id}/todos/ with and without group commit, by concurrency.
+
+    python -m benchmarks.bench_group_commit --requests 1000 --concurrency 1 8 32 128
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import admission, batching, cache, database
+from app.database import Base, get_db, get_read_db
+from app.main import app
+
+
+async def run(client: AsyncClient, user_id: int, concurrency: int, requests: int) -> dict:
+    remaining = iter(range(requests))
+    latencies = []
+    failures = 0
+
+    async def worker():
+        nonlocal failures
+        for index in remaining:
+            start = time.perf_counter()
+            response = await client.post(f"/users/{user_id}/todos/", json={"title": f"#{index}"})
+            latencies.append((time.perf_counter() - start) * 1000)
+            failures += response.status_code != 200
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "rps": requests / elapsed,
+        "p50_ms": latencies[len(latencies) // 2],
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))],
+        "failures": failures,
+    }
+
+
+async def main(args):
+    cache.configure(cache.NullCache())
+    # Measure the write path, not the shedding in front of it.
+    admission.controller = admission.AdmissionController(10**6, 10**6, 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(
+            f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+            connect_args={"timeout": 60},
+        )
+        session_factory = async_sessionmaker(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+
+        async def override_get_db():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        database.session_factory = lambda: session_factory
+        batching.todo_writer = batching.GroupCommitter(
+            batching.create_todos, args.window_ms / 1000, args.max_items
+        )
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            response = await client.post(
+                "/users/", json={"email": "bench@example.com", "password": "benchpassword"}
+            )
+            user_id = response.json()["id"]
+
+            print(
+                f"{args.requests} creates per run, window {args.window_ms} ms,"
+                f" batches of up to {args.max_items}"
+            )
+            for concurrency in args.concurrency:
+                for batched in (False, True):
+                    batching.TODO_BATCHING = batched
+                    result = await run(client, user_id, concurrency, args.requests)
+                    print(
+                        f"  concurrency {concurrency:>4}  {'batched' if batched else 'direct':<7}"
+                        f"  {result['rps']:8.0f} req/s  p50 {result['p50_ms']:7.2f} ms"
+                        f"  p99 {result['p99_ms']:7.2f} ms  failures {result['failures']}"
+                    )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32, 128])
+    parser.add_argument("--window-ms", type=float, default=batching.TODO_BATCH_WINDOW_MS)
+    parser.add_argument("--max-items", type=int, default=batching.TODO_BATCH_MAX_ITEMS)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,100 @@
+"""Per-request CPU of the old ORM + pydantic serialization path vs the row + orjson path.
+
+    python -m benchmarks.bench_serialization --users 100 --todos-per-user 20
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse, ORJSONResponse
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import selectinload
+
+from app import crud, models, schemas
+from app.database import Base
+
+
+async def seed(session_factory, users: int, todos_per_user: int):
+    async with session_factory() as db:
+        await db.execute(
+            insert(models.User),
+            [{"email": f"user{i}@example.com", "hashed_password": "x"} for i in range(users)],
+        )
+        await db.execute(
+            insert(models.Todo),
+            [
+                {"title": f"Todo {j}", "description": "Benchmark todo", "owner_id": i + 1}
+                for i in range(users)
+                for j in range(todos_per_user)
+            ],
+        )
+        await db.commit()
+
+
+async def legacy_read_users(db, limit: int) -> bytes:
+    # What read_users did before: ORM entities, model_validate().model_dump(),
+    # then FastAPI's jsonable_encoder and Starlette's json.dumps.
+    result = await db.execute(
+        select(models.User).options(selectinload(models.User.todos)).limit(limit)
+    )
+    payload = [schemas.UserWithTodos.model_validate(user).model_dump() for user in result.scalars()]
+    return JSONResponse(jsonable_encoder(payload)).body
+
+
+async def fast_read_users(db, limit: int) -> bytes:
+    users = await crud.get_users(db, limit=limit, include_todos=True)
+    return ORJSONResponse(users).body
+
+
+async def measure(session_factory, read, limit: int, iterations: int):
+    samples = []
+    for _ in range(iterations):
+        async with session_factory() as db:
+            start = time.process_time()
+            await read(db, limit)
+            samples.append((time.process_time() - start) * 1000)
+    samples.sort()
+    return {
+        "mean_ms": statistics.mean(samples),
+        "p50_ms": samples[len(samples) // 2],
+        "p99_ms": samples[min(len(samples) - 1, int(len(samples) * 0.99))],
+    }
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        session_factory = async_sessionmaker(bind=engine)
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        await seed(session_factory, args.users, args.todos_per_user)
+
+        async with session_factory() as db:
+            legacy = await legacy_read_users(db, args.users)
+        async with session_factory() as db:
+            fast = await fast_read_users(db, args.users)
+        assert legacy == fast, "fast path output differs from the response schemas"
+
+        print(f"GET /users/?include_todos=true, {args.users} users x {args.todos_per_user} todos")
+        results = {}
+        for name, read in (("legacy", legacy_read_users), ("fast", fast_read_users)):
+            results[name] = await measure(session_factory, read, args.users, args.iterations)
+            print(
+                f"  {name:<7} cpu/request mean {results[name]['mean_ms']:.2f} ms"
+                f"  p50 {results[name]['p50_ms']:.2f} ms  p99 {results[name]['p99_ms']:.2f} ms"
+            )
+        print(f"  speedup {results['legacy']['mean_ms'] / results['fast']['mean_ms']:.1f}x")
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos-per-user", type=int, default=20)
+    parser.add_argument("--iterations", type=int, default=100)
+    asyncio.run(main(parser.parse_args()))
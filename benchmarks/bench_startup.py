@@ -0,0 +1,80 @@
+"""Cold-start time to first request, per schema mode and with or without pre-warming.
+
+Each run is a fresh interpreter that imports the app, runs its lifespan and serves
+GET /users/{id}, so import, startup and first-request costs are all paid for real.
+
+    python -m benchmarks.bench_startup --runs 5
+    python -m benchmarks.bench_startup --database-url postgresql+asyncpg://...
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON line of phase timings in ms.
+CHILD = """
+import asyncio, json, time
+started = time.perf_counter()
+from httpx import ASGITransport, AsyncClient
+from app.main import app
+imported = time.perf_counter()
+
+async def main():
+    async with app.router.lifespan_context(app):
+        ready = time.perf_counter()
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as c:
+            await c.get("/users/1")
+            first = time.perf_counter()
+            await c.get("/users/1")
+            second = time.perf_counter()
+    print(json.dumps({
+        "import": (imported - started) * 1000,
+        "startup": (ready - imported) * 1000,
+        "first": (first - ready) * 1000,
+        "second": (second - first) * 1000,
+        "to_first": (first - started) * 1000,
+    }))
+
+asyncio.run(main())
+"""
+
+
+def _child(env: dict) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, cwd=ROOT, check=True, capture_output=True
+    ).stdout
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+
+def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}"
+        env = {**os.environ, "DATABASE_URL": url, "CACHE_BACKEND": "none"}
+        subprocess.run(
+            ["alembic", "upgrade", "head"], env=env, cwd=ROOT, check=True, capture_output=True
+        )
+        print(f"{args.runs} cold starts each against {url.split('://')[0]}")
+        for mode, prewarm in (("create", "0"), ("check", "0"), ("check", str(args.prewarm))):
+            runs = [
+                _child({**env, "DB_SCHEMA_MODE": mode, "DB_POOL_PREWARM": prewarm})
+                for _ in range(args.runs)
+            ]
+            median = {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+            print(
+                f"  {mode:<6} prewarm {prewarm:>2}  import {median['import']:7.1f} ms"
+                f"  startup {median['startup']:7.1f} ms  first request {median['first']:6.1f} ms"
+                f"  second {median['second']:5.1f} ms  to first {median['to_first']:7.1f} ms"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--prewarm", type=int, default=10)
+    parser.add_argument("--database-url")
+    main(parser.parse_args())
@@ -0,0 +1,97 @@
+"""Per-call CPU of crud's predefined statements vs building them on every call.
+
+The "built" variants are what get_user, get_todo and get_users did before: an ORM
+select() constructed per call, which SQLAlchemy then has to key for its compiled cache.
+
+    python -m benchmarks.bench_statements --calls 5000
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import crud, models
+from app.database import Base
+
+
+async def seed(session_factory, users: int, todos_per_user: int):
+    async with session_factory() as db:
+        await db.execute(
+            insert(models.User),
+            [{"email": f"user{i}@example.com", "hashed_password": "x"} for i in range(users)],
+        )
+        await db.execute(
+            insert(models.Todo),
+            [
+                {"title": f"Todo {j}", "description": "Benchmark todo", "owner_id": i + 1}
+                for i in range(users)
+                for j in range(todos_per_user)
+            ],
+        )
+        await db.commit()
+
+
+async def built_get_user(db, user_id: int):
+    result = await db.execute(select(*crud.USER_COLUMNS).filter(models.User.id == user_id))
+    users = crud._rows(result)
+    return users[0] if users else None
+
+
+async def built_get_todo(db, todo_id: int):
+    result = await db.execute(select(*crud.TODO_COLUMNS).filter(models.Todo.id == todo_id))
+    todos = crud._rows(result)
+    return todos[0] if todos else None
+
+
+async def built_get_users(db, skip: int):
+    result = await db.execute(select(*crud.USER_COLUMNS).offset(skip).limit(20))
+    return crud._rows(result)
+
+
+async def measure(session_factory, call, ids: int, calls: int) -> float:
+    async with session_factory() as db:
+        for index in range(100):
+            await call(db, index % ids + 1)
+        samples = []
+        for index in range(calls):
+            start = time.process_time()
+            await call(db, index % ids + 1)
+            samples.append((time.process_time() - start) * 1e6)
+    return statistics.mean(samples)
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_async_engine(f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        session_factory = async_sessionmaker(bind=engine)
+        await seed(session_factory, args.users, args.todos_per_user)
+
+        cases = [
+            ("get_user", built_get_user, crud.get_user, args.users),
+            ("get_todo", built_get_todo, crud.get_todo, args.users * args.todos_per_user),
+            ("get_users", built_get_users, lambda db, skip: crud.get_users(db, skip, 20), 50),
+        ]
+        print(f"{args.calls} calls each, CPU per call (process time, includes the driver):")
+        for name, built, predefined, ids in cases:
+            before = await measure(session_factory, built, ids, args.calls)
+            after = await measure(session_factory, predefined, ids, args.calls)
+            print(
+                f"  {name:<10} built {before:7.1f} us  predefined {after:7.1f} us"
+                f"  saved {before - after:6.1f} us ({1 - after / before:.0%})"
+            )
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--todos-per-user", type=int, default=20)
+    parser.add_argument("--calls", type=int, default=5000)
+    asyncio.run(main(parser.parse_args()))
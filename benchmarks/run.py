@@ -0,0 +1,694 @@
+"""In-process benchmarks for every route in app/main.py and every function in app/crud.py.
+
+Routes are driven through httpx's ASGITransport, as in tests/conftest.py, and crud
+functions are called directly, each on its own session, against a seeded SQLite file.
+Every case reports throughput, p50/p99 latency, queries per call and the peak memory
+allocated during a call. Results are saved as JSON and can be checked against a baseline.
+
+    python -m benchmarks.run --todos 100k --output bench.json
+    python -m benchmarks.run --todos 100k --baseline bench.json --threshold 0.2
+    python -m benchmarks.run --todos 1m --db /tmp/bench-1m.db --only "GET /todos"
+
+Throughput is concurrency / mean latency, so the untimed setup of the mutating cases
+(e.g. creating the todo a DELETE removes) does not count against them.
+"""
+import argparse
+import asyncio
+import inspect
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextvars import ContextVar
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, List, Optional
+
+import sqlalchemy
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, func, insert, select, text, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from app import admission, cache, counters, crud, jobs, models, schemas, security
+from app.database import Base, get_db, get_read_db
+from app.main import app
+
+PASSWORD = "benchpassword"
+WORDS = ["groceries", "report", "garden", "invoice", "travel", "meeting", "review", "taxes"]
+SEED_CHUNK = 10000
+# Older than any todo the cases complete, so crud.archive_todos leaves those alone.
+ARCHIVE_CUTOFF = datetime(2000, 1, 1, tzinfo=timezone.utc)
+
+# Cases that cannot be timed in-process: open-ended streams and sharding-only helpers.
+SKIPPED = {
+    "GET /users/{user_id}/events": "stream never ends",
+    "WS /users/{user_id}/events/ws": "stream never ends",
+    "crud.claim_email": "only used when sharded",
+    "crud.release_email": "only used when sharded",
+}
+DOCS_ROUTES = {"/openapi.json", "/docs", "/docs/oauth2-redirect", "/redoc"}
+
+# Changes below these are noise whatever the relative change.
+NOISE = {"p50_ms": 0.05, "p99_ms": 0.25, "alloc_kib": 1.0}
+
+_queries: ContextVar[Optional[List[int]]] = ContextVar("bench_queries", default=None)
+
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    counter = _queries.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+def size(value: str) -> int:
+    units = {"k": 1000, "m": 1000000}
+    value = value.strip().lower()
+    if value[-1:] in units:
+        return int(float(value[:-1]) * units[value[-1]])
+    return int(value)
+
+
+class Dataset:
+    def __init__(self, users: int, todos: int, session_factory: async_sessionmaker):
+        self.users = users
+        self.todos = todos
+        self.session_factory = session_factory
+        self.token = security.create_access_token("1")
+        self.random = random.Random(0)
+        self._serial = 0
+
+    def user_id(self) -> int:
+        return self.random.randint(1, self.users)
+
+    def todo_id(self) -> int:
+        return self.random.randint(1, self.todos)
+
+    def todo_ids(self, count: int) -> List[int]:
+        return [self.todo_id() for _ in range(count)]
+
+    def user_ids(self, count: int) -> List[int]:
+        return [self.user_id() for _ in range(count)]
+
+    def serial(self) -> int:
+        self._serial += 1
+        return self._serial
+
+    async def new_todos(self, count: int) -> List[int]:
+        # Fresh rows for the cases that delete, so the seeded data stays put.
+        async with self.session_factory() as db:
+            todos = [schemas.TodoCreate(title="Doomed") for _ in range(count)]
+            created = await crud.create_user_todos(db, todos=todos, user_id=self.user_id())
+        return [todo["id"] for todo in created]
+
+    async def old_done_todos(self, count: int) -> List[int]:
+        # Completed long before anything else, so archiving takes exactly these.
+        ids = await self.new_todos(count)
+        async with self.session_factory() as db:
+            await db.execute(
+                update(models.Todo)
+                .where(models.Todo.id.in_(ids))
+                .values(is_done=True, completed_at=ARCHIVE_CUTOFF - timedelta(days=1))
+            )
+            await db.commit()
+        return ids
+
+    async def new_user(self) -> int:
+        async with self.session_factory() as db:
+            user = schemas.UserCreate(email=f"doomed{self.serial()}@example.com", password=PASSWORD)
+            return (await crud.create_user(db, user, hashed_password="x"))["id"]
+
+    async def new_job(self) -> int:
+        async with self.session_factory() as db:
+            return (await jobs.submit(db, "clear_completed", user_id=self.user_id()))["id"]
+
+
+class Case:
+    def __init__(
+        self,
+        name: str,
+        run: Callable[[Any], Awaitable[Any]],
+        prepare: Optional[Callable[[], Any]] = None,
+        label: str = "",
+        requests: Optional[int] = None,
+    ):
+        # ``name`` is the route or crud function covered; ``label`` tells variants apart.
+        self.name = name
+        self.key = f"{name} [{label}]" if label else name
+        self.run = run
+        self.prepare = prepare
+        self.requests = requests
+
+    async def prepared(self):
+        if self.prepare is None:
+            return None
+        value = self.prepare()
+        return await value if inspect.isawaitable(value) else value
+
+
+def http_cases(client: AsyncClient, ds: Dataset) -> List[Case]:
+    def route(method: str, path: str, request: Callable[[], Any], **options) -> Case:
+        async def run(kwargs):
+            response = await client.request(method, **kwargs)
+            if response.status_code >= 400:
+                raise RuntimeError(f"{method} {kwargs['url']}: {response.status_code}")
+
+        return Case(f"{method} {path}", run, request, **options)
+
+    async def delete_one():
+        return {"url": f"/todos/{(await ds.new_todos(1))[0]}"}
+
+    async def read_job():
+        return {"url": f"/jobs/{await ds.new_job()}"}
+
+    async def cancel_job():
+        return {"url": f"/jobs/{await ds.new_job()}/cancel"}
+
+    async def delete_many():
+        return {"url": "/todos/bulk/delete", "json": {"ids": await ds.new_todos(100)}}
+
+    def ids(values: List[int]) -> str:
+        return ",".join(map(str, values))
+
+    auth = {"Authorization": f"Bearer {ds.token}"}
+    return [
+        route(
+            "POST",
+            "/token",
+            lambda: {
+                "url": "/token",
+                "data": {"username": f"user{ds.user_id()}@example.com", "password": PASSWORD},
+            },
+            requests=20,
+        ),
+        route(
+            "POST",
+            "/users/",
+            lambda: {
+                "url": "/users/",
+                "json": {"email": f"new{ds.serial()}@example.com", "password": PASSWORD},
+            },
+            requests=20,
+        ),
+        route("GET", "/users/", lambda: {"url": "/users/", "params": {"limit": 50}}),
+        route(
+            "GET",
+            "/users/",
+            lambda: {
+                "url": "/users/",
+                "params": {"limit": 50, "cursor": "", "include_todos": "true"},
+            },
+            label="cursor, include_todos",
+        ),
+        route(
+            "GET",
+            "/users/",
+            lambda: {"url": "/users/", "params": {"ids": ids(ds.user_ids(50))}},
+            label="ids",
+        ),
+        route("GET", "/users/me", lambda: {"url": "/users/me", "headers": auth}),
+        route("GET", "/users/{user_id}", lambda: {"url": f"/users/{ds.user_id()}"}),
+        route(
+            "GET",
+            "/users/{user_id}",
+            lambda: {"url": f"/users/{ds.user_id()}", "params": {"include_todos": "true"}},
+            label="include_todos",
+        ),
+        route(
+            "GET",
+            "/users/",
+            lambda: {"url": "/users/", "params": {"limit": 50, "include_stats": "true"}},
+            label="include_stats",
+        ),
+        route("GET", "/users/{user_id}/stats", lambda: {"url": f"/users/{ds.user_id()}/stats"}),
+        route(
+            "GET",
+            "/users/{user_id}/todos/",
+            lambda: {"url": f"/users/{ds.user_id()}/todos/", "params": {"limit": 20}},
+        ),
+        route(
+            "GET",
+            "/users/{user_id}/todos/",
+            lambda: {
+                "url": f"/users/{ds.user_id()}/todos/",
+                "params": {"limit": 20, "include_archived": "true"},
+            },
+            label="include_archived",
+        ),
+        route(
+            "POST",
+            "/users/{user_id}/todos/",
+            lambda: {"url": f"/users/{ds.user_id()}/todos/", "json": {"title": "Bench"}},
+        ),
+        route(
+            "POST",
+            "/users/{user_id}/todos/bulk",
+            lambda: {
+                "url": f"/users/{ds.user_id()}/todos/bulk",
+                "json": {"todos": [{"title": f"Bulk {index}"} for index in range(100)]},
+            },
+        ),
+        route(
+            "PATCH",
+            "/todos/bulk",
+            lambda: {
+                "url": "/todos/bulk",
+                "json": {"todos": [{"id": id, "is_done": True} for id in ds.todo_ids(100)]},
+            },
+        ),
+        route("POST", "/todos/bulk/delete", delete_many),
+        route("GET", "/todos/", lambda: {"url": "/todos/", "params": {"limit": 50}}),
+        route(
+            "GET",
+            "/todos/",
+            lambda: {
+                "url": "/todos/",
+                "params": {"limit": 50, "cursor": "", "owner_id": ds.user_id()},
+            },
+            label="cursor, owner_id",
+        ),
+        route(
+            "GET",
+            "/todos/",
+            lambda: {"url": "/todos/", "params": {"ids": ids(ds.todo_ids(50))}},
+            label="ids",
+        ),
+        route(
+            "GET",
+            "/todos/search",
+            lambda: {"url": "/todos/search", "params": {"q": "report", "limit": 20}},
+        ),
+        route(
+            "GET",
+            "/todos/export",
+            lambda: {"url": "/todos/export", "params": {"owner_id": ds.user_id()}},
+        ),
+        route("GET", "/todos/{todo_id}", lambda: {"url": f"/todos/{ds.todo_id()}"}),
+        route(
+            "PATCH",
+            "/todos/{todo_id}",
+            lambda: {"url": f"/todos/{ds.todo_id()}", "json": {"is_done": True}},
+        ),
+        route("DELETE", "/todos/{todo_id}", delete_one),
+        route(
+            "POST",
+            "/batch",
+            lambda: {
+                "url": "/batch",
+                "json": {"requests": [{"path": f"/todos/{id}"} for id in ds.todo_ids(50)]},
+            },
+        ),
+        # No job queue runs here, so the job routes measure submitting and reading jobs.
+        route(
+            "POST",
+            "/users/{user_id}/todos/clear-completed",
+            lambda: {"url": f"/users/{ds.user_id()}/todos/clear-completed"},
+        ),
+        route(
+            "POST",
+            "/users/{user_id}/todos/import",
+            lambda: {
+                "url": f"/users/{ds.user_id()}/todos/import",
+                "json": {"todos": [{"title": f"Import {index}"} for index in range(100)]},
+            },
+        ),
+        route("DELETE", "/users/{user_id}", lambda: {"url": f"/users/{ds.user_id()}"}),
+        route("GET", "/jobs/{job_id}", read_job),
+        route("POST", "/jobs/{job_id}/cancel", cancel_job),
+        route("GET", "/metrics", lambda: {"url": "/metrics"}),
+        route("GET", "/cache/stats", lambda: {"url": "/cache/stats"}),
+    ]
+
+
+def crud_cases(ds: Dataset) -> List[Case]:
+    def call(name: str, fn: Callable[..., Awaitable[Any]], prepare=None, **options) -> Case:
+        async def run(prepared):
+            async with ds.session_factory() as db:
+                return await fn(db, prepared)
+
+        return Case(f"crud.{name}", run, prepare, **options)
+
+    async def stream(db, owner_id):
+        async for _ in crud.stream_todos(db, owner_ids=[owner_id]):
+            pass
+
+    def todo(title: str = "Bench") -> schemas.TodoCreate:
+        return schemas.TodoCreate(title=title)
+
+    async def one_todo():
+        return (await ds.new_todos(1))[0]
+
+    async def many_todos():
+        return await ds.new_todos(100)
+
+    async def due_todos():
+        return await ds.old_done_todos(100)
+
+    return [
+        call(
+            "archive_todos",
+            lambda db, _: crud.archive_todos(db, ARCHIVE_CUTOFF, limit=100),
+            due_todos,
+        ),
+        call(
+            "attach_todos",
+            crud.attach_todos,
+            lambda: [{"id": id} for id in ds.user_ids(50)],
+        ),
+        call(
+            "create_todos",
+            crud.create_todos,
+            lambda: [(ds.user_id(), todo()) for _ in range(100)],
+        ),
+        call(
+            "create_user",
+            lambda db, email: crud.create_user(
+                db, schemas.UserCreate(email=email, password=PASSWORD), hashed_password="x"
+            ),
+            lambda: f"crud{ds.serial()}@example.com",
+        ),
+        call(
+            "create_user_todo",
+            lambda db, user_id: crud.create_user_todo(db, todo(), user_id=user_id),
+            ds.user_id,
+        ),
+        call(
+            "create_user_todos",
+            lambda db, user_id: crud.create_user_todos(
+                db, [todo(f"Bulk {index}") for index in range(100)], user_id=user_id
+            ),
+            ds.user_id,
+        ),
+        call(
+            "delete_archived_todos",
+            lambda db, user_id: crud.delete_archived_todos(db, user_id, limit=100),
+            ds.user_id,
+        ),
+        call("delete_todo", lambda db, id: crud.delete_todo(db, id), one_todo),
+        call("delete_todos", lambda db, ids: crud.delete_todos(db, ids), many_todos),
+        call("delete_user", lambda db, id: crud.delete_user(db, id), ds.new_user),
+        call("estimate_count", lambda db, _: crud.estimate_count(db, models.Todo)),
+        call(
+            "estimate_count",
+            lambda db, owner_id: crud.estimate_count(
+                db, models.Todo, models.Todo.owner_id == owner_id
+            ),
+            ds.user_id,
+            label="owner_id",
+        ),
+        call("get_todo", lambda db, id: crud.get_todo(db, id), ds.todo_id),
+        call("get_todo_version", lambda db, id: crud.get_todo_version(db, id), ds.todo_id),
+        call("get_todos", lambda db, _: crud.get_todos(db, limit=50)),
+        call(
+            "get_todos_after",
+            lambda db, after_id: crud.get_todos_after(db, after_id=after_id, limit=50),
+            ds.todo_id,
+        ),
+        call(
+            "get_todos_by_ids",
+            lambda db, ids: crud.get_todos_by_ids(db, ids),
+            lambda: ds.todo_ids(50),
+        ),
+        call("get_user", lambda db, id: crud.get_user(db, id), ds.user_id),
+        call(
+            "get_user",
+            lambda db, id: crud.get_user(db, id, include_todos=True),
+            ds.user_id,
+            label="include_todos",
+        ),
+        call(
+            "get_user_credentials",
+            lambda db, email: crud.get_user_credentials(db, email),
+            lambda: f"user{ds.user_id()}@example.com",
+        ),
+        call("get_user_stats", lambda db, id: crud.get_user_stats(db, id), ds.user_id),
+        call(
+            "get_user_todos",
+            lambda db, id: crud.get_user_todos(db, id, limit=20),
+            ds.user_id,
+        ),
+        call(
+            "get_user_version",
+            lambda db, id: crud.get_user_version(db, id, include_todos=True),
+            ds.user_id,
+        ),
+        call("get_users", lambda db, _: crud.get_users(db, limit=50)),
+        call(
+            "get_users_after",
+            lambda db, after_id: crud.get_users_after(db, after_id=after_id, limit=50),
+            ds.user_id,
+        ),
+        call(
+            "get_users_by_ids",
+            lambda db, ids: crud.get_users_by_ids(db, ids),
+            lambda: ds.user_ids(50),
+        ),
+        call("search_todos", lambda db, _: crud.search_todos(db, "report", limit=20)),
+        call("stream_todos", stream, ds.user_id),
+        call(
+            "update_todo",
+            lambda db, id: crud.update_todo(db, id, schemas.TodoUpdate(is_done=True)),
+            ds.todo_id,
+        ),
+        call(
+            "update_todos",
+            lambda db, ids: crud.update_todos(
+                db, [schemas.TodoBulkUpdateItem(id=id, is_done=True) for id in ids]
+            ),
+            lambda: ds.todo_ids(100),
+        ),
+        call("user_exists", lambda db, id: crud.user_exists(db, id), ds.user_id),
+    ]
+
+
+def uncovered(cases: List[Case]) -> List[str]:
+    # Anything added to app/main.py or app/crud.py without a case shows up here.
+    names = set()
+    for route in app.routes:
+        if route.path in DOCS_ROUTES:
+            continue
+        for method in getattr(route, "methods", None) or ["WS"]:
+            names.add(f"{method} {route.path}")
+    for name, fn in inspect.getmembers(crud):
+        is_async = inspect.iscoroutinefunction(fn) or inspect.isasyncgenfunction(fn)
+        if is_async and not name.startswith("_") and fn.__module__ == crud.__name__:
+            names.add(f"crud.{name}")
+    return sorted(names - {case.name for case in cases} - set(SKIPPED))
+
+
+async def seed(engine, session_factory: async_sessionmaker, users: int, todos: int):
+    async with engine.begin() as conn:
+        await conn.execute(text("PRAGMA journal_mode=WAL"))
+        await conn.run_sync(Base.metadata.create_all)
+    hashed_password = await security.hash_password(PASSWORD)
+    async with session_factory() as db:
+        for start in range(1, users + 1, SEED_CHUNK):
+            await db.execute(
+                insert(models.User),
+                [
+                    {"email": f"user{id}@example.com", "hashed_password": hashed_password}
+                    for id in range(start, min(start + SEED_CHUNK, users + 1))
+                ],
+            )
+        for start in range(1, todos + 1, SEED_CHUNK):
+            await db.execute(
+                insert(models.Todo),
+                [
+                    {
+                        "title": f"Todo {id}",
+                        "description": f"About the {WORDS[id % len(WORDS)]}",
+                        "is_done": id % 3 == 0,
+                        "owner_id": (id - 1) % users + 1,
+                    }
+                    for id in range(start, min(start + SEED_CHUNK, todos + 1))
+                ],
+            )
+        await db.commit()
+    await counters.repair(session_factory)
+
+
+async def measure(case: Case, requests: int, concurrency: int, warmup: int, samples: int):
+    for _ in range(warmup):
+        await case.run(await case.prepared())
+
+    latencies: List[float] = []
+    queries: List[int] = []
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            prepared = await case.prepared()
+            counter = [0]
+            token = _queries.set(counter)
+            start = time.perf_counter()
+            try:
+                await case.run(prepared)
+            finally:
+                latencies.append(time.perf_counter() - start)
+                _queries.reset(token)
+            queries.append(counter[0])
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+    # Allocation is traced on its own, one call at a time: tracing slows everything down.
+    peaks = []
+    tracemalloc.start()
+    try:
+        for _ in range(samples):
+            prepared = await case.prepared()
+            tracemalloc.reset_peak()
+            before = tracemalloc.get_traced_memory()[0]
+            await case.run(prepared)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "rps": concurrency / statistics.mean(latencies),
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000,
+        "queries": statistics.mean(queries),
+        "alloc_kib": statistics.median(peaks) / 1024,
+    }
+
+
+def compare(baseline: dict, results: dict, threshold: float) -> List[str]:
+    regressions = []
+    for key, current in results["results"].items():
+        previous = baseline["results"].get(key)
+        if previous is None:
+            continue
+        if current["queries"] > previous["queries"]:
+            regressions.append(
+                f"{key}: queries {previous['queries']:.1f} -> {current['queries']:.1f}"
+            )
+        for metric, floor in NOISE.items():
+            before, after = previous[metric], current[metric]
+            if after > before * (1 + threshold) and after - before > floor:
+                regressions.append(f"{key}: {metric} {before:.2f} -> {after:.2f}")
+        if current["rps"] < previous["rps"] * (1 - threshold):
+            regressions.append(f"{key}: rps {previous['rps']:.0f} -> {current['rps']:.0f}")
+    return regressions
+
+
+async def main(args) -> int:
+    cache.configure(cache.LRUCache() if args.cache else cache.NullCache())
+    # Measure the handlers, not the shedding in front of them.
+    admission.controller = admission.AdmissionController(10**6, 10**6, 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.db")
+        saved = args.db or path
+        users = max(1, args.todos // args.todos_per_user)
+        reused = os.path.exists(saved)
+        if not reused:
+            print(f"seeding {users} users and {args.todos} todos ...", file=sys.stderr)
+            engine = create_async_engine(f"sqlite+aiosqlite:///{saved}")
+            await seed(engine, async_sessionmaker(bind=engine), users, args.todos)
+            await engine.dispose()
+        if saved != path:
+            # The mutating cases run on a copy, so a reused --db holds the same data on
+            # every run and baselines compare like with like.
+            shutil.copyfile(saved, path)
+
+        engine = create_async_engine(f"sqlite+aiosqlite:///{path}", connect_args={"timeout": 60})
+        event.listen(engine.sync_engine, "before_cursor_execute", _count_query)
+        session_factory = async_sessionmaker(bind=engine)
+        async with session_factory() as db:
+            users = (await db.execute(select(func.max(models.User.id)))).scalar()
+            todos = (await db.execute(select(func.max(models.Todo.id)))).scalar()
+
+        async def override_get_db():
+            async with session_factory() as session:
+                yield session
+
+        app.dependency_overrides[get_db] = override_get_db
+        app.dependency_overrides[get_read_db] = override_get_db
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://bench") as client:
+            ds = Dataset(users, todos, session_factory)
+            cases = http_cases(client, ds) + crud_cases(ds)
+            missing = uncovered(cases)
+            if args.only:
+                cases = [case for case in cases if any(only in case.key for only in args.only)]
+
+            print(
+                f"{'reused' if reused else 'seeded'} {saved}: {users} users, {todos} todos;"
+                f" {args.requests} calls per case at concurrency {args.concurrency},"
+                f" cache {'on' if args.cache else 'off'}"
+            )
+            results = {}
+            for case in cases:
+                requests = min(args.requests, case.requests or args.requests)
+                result = await measure(
+                    case,
+                    requests,
+                    args.concurrency,
+                    args.warmup,
+                    min(args.alloc_samples, requests),
+                )
+                results[case.key] = result
+                print(
+                    f"  {case.key:<48} {result['rps']:8.0f} req/s"
+                    f"  p50 {result['p50_ms']:7.2f} ms  p99 {result['p99_ms']:7.2f} ms"
+                    f"  queries {result['queries']:5.1f}  alloc {result['alloc_kib']:8.1f} KiB"
+                )
+            for name in missing:
+                print(f"  {name:<48} no benchmark case", file=sys.stderr)
+        app.dependency_overrides.clear()
+        await engine.dispose()
+
+    report = {
+        "meta": {
+            "users": users,
+            "todos": todos,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "cache": args.cache,
+            "python": platform.python_version(),
+            "sqlalchemy": sqlalchemy.__version__,
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        },
+        "results": results,
+        "skipped": SKIPPED,
+        "uncovered": missing,
+    }
+    if args.output:
+        with open(args.output, "w") as output:
+            json.dump(report, output, indent=2)
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+        if (baseline["meta"]["users"], baseline["meta"]["todos"]) != (users, todos):
+            print("warning: the baseline was run on a different dataset", file=sys.stderr)
+        regressions = compare(baseline, report, args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        print(f"{len(regressions)} regressions against {args.baseline} at {args.threshold:.0%}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument("--todos", type=size, default=size("1k"), help="e.g. 1k, 100k, 1m")
+    parser.add_argument("--todos-per-user", type=int, default=20)
+    parser.add_argument("--requests", type=int, default=200, help="timed calls per case")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--alloc-samples", type=int, default=20)
+    parser.add_argument("--cache", action="store_true", help="keep the read cache on")
+    parser.add_argument("--only", action="append", help="run cases whose name contains this")
+    parser.add_argument(
+        "--db", help="seeded SQLite file to reuse (created if missing); runs use a copy"
+    )
+    parser.add_argument("--output", help="write results as JSON")
+    parser.add_argument("--baseline", help="JSON results to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -1,10 +1,16 @@
+import os
+
+# Full-strength bcrypt would dominate the suite's runtime.
+os.environ.setdefault("BCRYPT_ROUNDS", "4")
+
 import pytest
 import pytest_asyncio
 from httpx import AsyncClient
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 
+from app import cache
 from app.main import app
-from app.database import Base, get_db
+from app.database import Base, get_db, get_read_db
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
@@ -17,6 +23,7 @@ async def db_session():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
 
+    await cache.backend.clear()
     db = TestingSessionLocal()
     try:
         yield db
@@ -35,6 +42,7 @@ async def client(db_session):
             await db_session.close()
 
     app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_read_db] = override_get_db
     from httpx import ASGITransport
 
     async with AsyncClient(
@@ -42,3 +50,4 @@ async def client(db_session):
     ) as ac:
         yield ac
     del app.dependency_overrides[get_db]
+    del app.dependency_overrides[get_read_db]
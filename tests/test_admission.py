@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+from httpx import AsyncClient
+
+from app import admission
+from app.admission import BULK, READ, WRITE, AdmissionController, AdmissionRejected
+
+
+async def test_admission_admits_up_to_capacity():
+    controller = AdmissionController(capacity=2, max_queue=0, queue_timeout=1)
+    await controller.acquire()
+    await controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+    controller.release()
+    await controller.acquire()
+    assert controller.stats() == {"capacity": 2, "in_flight": 2, "queued": 0, "rejected": 1}
+
+
+async def test_admission_serves_waiters_by_priority():
+    controller = AdmissionController(capacity=1, max_queue=10, queue_timeout=1)
+    await controller.acquire()
+    order = []
+
+    async def wait(priority, name):
+        await controller.acquire(priority)
+        order.append(name)
+        controller.release()
+
+    waiters = [
+        asyncio.create_task(wait(BULK, "bulk")),
+        asyncio.create_task(wait(WRITE, "write")),
+        asyncio.create_task(wait(READ, "read")),
+    ]
+    await asyncio.sleep(0)
+    controller.release()
+    await asyncio.gather(*waiters)
+    assert order == ["read", "write", "bulk"]
+    assert controller.stats()["in_flight"] == 0
+
+
+async def test_admission_sheds_lower_priority_waiters_when_full():
+    controller = AdmissionController(capacity=1, max_queue=1, queue_timeout=1)
+    await controller.acquire()
+    bulk = asyncio.create_task(controller.acquire(BULK))
+    await asyncio.sleep(0)
+    read = asyncio.create_task(controller.acquire(READ))
+    with pytest.raises(AdmissionRejected):
+        await bulk
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire(WRITE)
+    controller.release()
+    await read
+    assert controller.stats() == {"capacity": 1, "in_flight": 1, "queued": 0, "rejected": 2}
+
+
+async def test_admission_times_out_queued_requests():
+    controller = AdmissionController(capacity=1, max_queue=1, queue_timeout=0.01)
+    await controller.acquire()
+    with pytest.raises(AdmissionRejected):
+        await controller.acquire()
+    assert controller.stats()["queued"] == 0
+    controller.release()
+    assert controller.stats()["in_flight"] == 0
+
+
+async def test_overloaded_endpoint_fails_fast(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(admission, "controller", AdmissionController(0, 0, 1))
+    response = await client.get("/todos/1")
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "1"
+    assert response.json() == {"detail": "Server busy, retry later"}
@@ -0,0 +1,176 @@
+from datetime import timedelta
+
+from httpx import AsyncClient
+from sqlalchemy import select, update
+
+from app import counters, crud, models
+from app.archive import archive
+
+from .conftest import TestingSessionLocal
+
+
+async def _completed_at(todo_id: int):
+    async with TestingSessionLocal() as db:
+        result = await db.execute(
+            select(models.Todo.completed_at).where(models.Todo.id == todo_id)
+        )
+        return result.scalar()
+
+
+async def _age(days: int):
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.Todo)
+            .where(models.Todo.completed_at.is_not(None))
+            .values(completed_at=crud._now() - timedelta(days=days))
+        )
+        await db.commit()
+
+
+async def test_completed_at_follows_is_done(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk",
+        json={"todos": [{"title": "A", "is_done": True}, {"title": "B"}]},
+    )
+    done, open_ = [todo["id"] for todo in response.json()]
+    assert await _completed_at(done) is not None
+    assert await _completed_at(open_) is None
+
+    # Marking a done todo done again keeps the time it was first completed.
+    await _age(3)
+    first = await _completed_at(done)
+    await client.patch(f"/todos/{done}", json={"is_done": True})
+    assert await _completed_at(done) == first
+    await client.patch(
+        "/todos/bulk",
+        json={"todos": [{"id": done, "is_done": False}, {"id": open_, "is_done": True}]},
+    )
+    assert await _completed_at(done) is None
+    assert await _completed_at(open_) > first
+
+
+async def test_archived_todos_leave_the_hot_reads(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    todos = [{"title": f"Todo {index}", "is_done": index < 3} for index in range(5)]
+    response = await client.post(f"/users/{user_id}/todos/bulk", json={"todos": todos})
+    ids = [todo["id"] for todo in response.json()]
+    await _age(40)
+    # Done, but only just: stays in the hot table.
+    await client.patch(f"/todos/{ids[3]}", json={"is_done": True})
+
+    cutoff = crud._now() - timedelta(days=30)
+    assert await archive(TestingSessionLocal, cutoff, batch_size=2) == {
+        "archived": 3, "batches": 2
+    }
+    # Archiving leaves the counts alone.
+    assert (await client.get(f"/users/{user_id}/stats")).json() == {
+        "total": 5, "done": 4, "open": 1
+    }
+    assert (await counters.repair(TestingSessionLocal))["fixed"] == 0
+    response = await client.get(f"/users/{user_id}", params={"include_todos": True})
+    assert [todo["id"] for todo in response.json()["todos"]] == ids[3:]
+    assert [todo["id"] for todo in (await client.get("/todos/")).json()] == ids[3:]
+
+    # Reads by id fall back to the archive; listings include it on request.
+    response = await client.get(f"/todos/{ids[0]}")
+    assert response.status_code == 200
+    assert response.json()["title"] == "Todo 0"
+    assert "ETag" in response.headers
+    response = await client.get(
+        f"/todos/{ids[0]}", headers={"If-None-Match": response.headers["ETag"]}
+    )
+    assert response.status_code == 304
+    response = await client.get("/todos/", params={"ids": f"{ids[1]},{ids[4]}"})
+    assert [todo["id"] for todo in response.json()] == [ids[1], ids[4]]
+    response = await client.get(
+        f"/users/{user_id}", params={"include_todos": True, "include_archived": True}
+    )
+    assert [todo["id"] for todo in response.json()["todos"]] == ids
+    response = await client.get("/todos/", params={"include_archived": True, "skip": 1})
+    assert [todo["id"] for todo in response.json()] == ids[1:]
+    response = await client.get(
+        "/todos/", params={"include_archived": True, "cursor": "", "limit": 4}
+    )
+    assert [todo["id"] for todo in response.json()["items"]] == ids[:4]
+    response = await client.get(
+        f"/users/{user_id}/todos/",
+        params={"include_archived": True, "is_done": True, "order": "desc", "limit": 3},
+    )
+    assert [todo["id"] for todo in response.json()["items"]] == [ids[3], ids[2], ids[1]]
+
+    # Archived todos are read-only, and their ids are never handed out again.
+    assert (await client.patch(f"/todos/{ids[0]}", json={"title": "X"})).status_code == 409
+    await client.delete(f"/todos/{ids[4]}")
+    assert (await archive(TestingSessionLocal, crud._now()))["archived"] == 1
+    response = await client.post(f"/users/{user_id}/todos/", json={"title": "New"})
+    assert response.json()["id"] > ids[-1]
+
+
+async def test_archived_todos_can_be_deleted_but_not_changed(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    todos = [{"title": f"Todo {index}", "is_done": True} for index in range(2)]
+    response = await client.post(f"/users/{user_id}/todos/bulk", json={"todos": todos})
+    ids = [todo["id"] for todo in response.json()]
+    await archive(TestingSessionLocal, crud._now())
+    etag = (await client.get(f"/todos/{ids[0]}")).headers["ETag"]
+
+    for body in ({"title": "X"}, {"is_done": False}, {}):
+        response = await client.patch(f"/todos/{ids[0]}", json=body)
+        assert response.status_code == 409
+        assert response.json()["detail"] == "Todo is archived and read-only"
+    response = await client.patch(
+        f"/todos/{ids[0]}", json={"title": "X"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 409
+    assert (await client.get(f"/todos/{ids[0]}")).json()["title"] == "Todo 0"
+
+    response = await client.delete(f"/todos/{ids[0]}", headers={"If-Match": '"999"'})
+    assert response.status_code == 412
+    response = await client.delete(f"/todos/{ids[0]}", headers={"If-Match": etag})
+    assert response.status_code == 200
+    assert (await client.delete(f"/todos/{ids[1]}")).status_code == 200
+    assert (await client.get(f"/users/{user_id}/stats")).json() == {
+        "total": 0, "done": 0, "open": 0
+    }
+    for todo_id in ids:
+        assert (await client.get(f"/todos/{todo_id}")).status_code == 404
+        assert (await client.delete(f"/todos/{todo_id}")).status_code == 404
+        assert (await client.patch(f"/todos/{todo_id}", json={"title": "X"})).status_code == 404
+
+
+async def test_bulk_writes_cover_archived_todos(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    todos = [{"title": f"Todo {index}", "is_done": index < 2} for index in range(3)]
+    response = await client.post(f"/users/{user_id}/todos/bulk", json={"todos": todos})
+    ids = [todo["id"] for todo in response.json()]
+    await archive(TestingSessionLocal, crud._now())
+
+    response = await client.patch(
+        "/todos/bulk",
+        json={"todos": [{"id": todo_id, "title": "X"} for todo_id in [*ids, 999]]},
+    )
+    assert [item["status"] for item in response.json()] == [
+        "archived", "archived", "updated", "not_found"
+    ]
+    assert (await client.get(f"/todos/{ids[0]}")).json()["title"] == "Todo 0"
+
+    response = await client.post("/todos/bulk/delete", json={"ids": [ids[0], ids[2], 999]})
+    assert [item["status"] for item in response.json()] == ["deleted", "deleted", "not_found"]
+    assert (await client.get(f"/todos/{ids[0]}")).status_code == 404
+    assert (await client.get(f"/users/{user_id}/stats")).json() == {
+        "total": 1, "done": 1, "open": 0
+    }
+    assert (await counters.repair(TestingSessionLocal))["fixed"] == 0
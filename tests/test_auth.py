@@ -0,0 +1,82 @@
+import threading
+
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app import models, security
+
+
+async def register_and_login(client: AsyncClient, email: str = "test@example.com"):
+    await client.post("/users/", json={"email": email, "password": "testpassword"})
+    response = await client.post("/token", data={"username": email, "password": "testpassword"})
+    assert response.status_code == 200, response.text
+    return response.json()["access_token"]
+
+
+async def test_password_is_hashed(client: AsyncClient, db_session):
+    await client.post("/users/", json={"email": "test@example.com", "password": "testpassword"})
+    result = await db_session.execute(select(models.User.hashed_password))
+    hashed_password = result.scalar_one()
+    assert hashed_password.startswith("$2b$")
+    assert security.pwd_context.verify("testpassword", hashed_password)
+
+
+async def test_login_and_read_current_user(client: AsyncClient):
+    token = await register_and_login(client)
+    response = await client.get("/users/me", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert response.json()["email"] == "test@example.com"
+
+
+async def test_login_with_wrong_password(client: AsyncClient):
+    await client.post("/users/", json={"email": "test@example.com", "password": "testpassword"})
+    response = await client.post(
+        "/token", data={"username": "test@example.com", "password": "wrongpassword"}
+    )
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Incorrect email or password"}
+
+    response = await client.post(
+        "/token", data={"username": "nobody@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 401
+
+
+async def test_read_current_user_with_invalid_token(client: AsyncClient):
+    response = await client.get("/users/me", headers={"Authorization": "Bearer not-a-token"})
+    assert response.status_code == 401
+    assert response.json() == {"detail": "Could not validate credentials"}
+
+    response = await client.get("/users/me")
+    assert response.status_code == 401
+
+
+async def test_password_hashing_runs_off_the_event_loop(monkeypatch):
+    threads = []
+
+    def record(password):
+        threads.append(threading.current_thread())
+        return "hashed"
+
+    monkeypatch.setattr(security.pwd_context, "hash", record)
+    assert await security.hash_password("testpassword") == "hashed"
+    assert threads[0] is not threading.main_thread()
+
+
+async def test_login_releases_the_connection_before_hashing(
+    client: AsyncClient, db_session, monkeypatch
+):
+    await client.post("/users/", json={"email": "test@example.com", "password": "testpassword"})
+    in_transaction = []
+    verify = security.verify_password
+
+    async def spy(password, hashed_password):
+        in_transaction.append(db_session.in_transaction())
+        return await verify(password, hashed_password)
+
+    monkeypatch.setattr(security, "verify_password", spy)
+    response = await client.post(
+        "/token", data={"username": "test@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 200
+    assert in_transaction == [False]
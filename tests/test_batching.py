@@ -0,0 +1,92 @@
+import asyncio
+
+from httpx import AsyncClient
+
+from app import batching, crud, database
+from app.batching import GroupCommitter
+
+from .conftest import TestingSessionLocal
+
+
+async def test_group_committer_coalesces_within_window():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return [item * 2 for item in items]
+
+    committer = GroupCommitter(flush, window=0.01, max_items=100)
+    results = await asyncio.gather(*(committer.submit(item) for item in range(5)))
+    assert results == [0, 2, 4, 6, 8]
+    assert batches == [[0, 1, 2, 3, 4]]
+
+
+async def test_group_committer_flushes_full_batches_immediately():
+    batches = []
+
+    async def flush(items):
+        batches.append(items)
+        return items
+
+    # The window is far longer than the test; only the size limit can flush.
+    committer = GroupCommitter(flush, window=60, max_items=2)
+    assert await asyncio.gather(*(committer.submit(item) for item in range(4))) == [0, 1, 2, 3]
+    assert batches == [[0, 1], [2, 3]]
+
+    pending = asyncio.create_task(committer.submit(4))
+    await asyncio.sleep(0)
+    await committer.drain()
+    assert await pending == 4
+
+
+async def test_group_committer_isolates_item_errors():
+    async def flush(items):
+        return [ValueError(item) if item % 2 else item for item in items]
+
+    committer = GroupCommitter(flush, window=0.001, max_items=100)
+    results = await asyncio.gather(
+        *(committer.submit(item) for item in range(4)), return_exceptions=True
+    )
+    assert results[0] == 0 and results[2] == 2
+    assert isinstance(results[1], ValueError) and isinstance(results[3], ValueError)
+
+
+async def test_batched_todo_creation(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(database, "session_factory", lambda: TestingSessionLocal)
+    monkeypatch.setattr(batching, "TODO_BATCHING", True)
+    monkeypatch.setattr(batching, "todo_writer", GroupCommitter(batching.create_todos, 0.05, 500))
+    groups = []
+    create_todos = crud.create_todos
+
+    async def spy(db, items):
+        groups.append(len(items))
+        return await create_todos(db, items)
+
+    monkeypatch.setattr(crud, "create_todos", spy)
+
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+
+    responses = await asyncio.gather(*(
+        client.post(f"/users/{user_id}/todos/", json={"title": f"Todo {index}"})
+        for index in range(10)
+    ))
+    assert [response.status_code for response in responses] == [200] * 10
+    assert sorted(response.json()["title"] for response in responses) == sorted(
+        f"Todo {index}" for index in range(10)
+    )
+    assert groups == [10]
+
+    # A missing user fails only its own request, not the rest of the batch.
+    responses = await asyncio.gather(
+        client.post(f"/users/{user_id}/todos/", json={"title": "Kept"}),
+        client.post("/users/999/todos/", json={"title": "Orphan"}),
+    )
+    assert responses[0].status_code == 200
+    assert responses[0].json()["title"] == "Kept"
+    assert responses[1].status_code == 404
+
+    response = await client.get(f"/users/{user_id}/todos/")
+    assert len(response.json()["items"]) == 11
@@ -0,0 +1,92 @@
+import asyncio
+
+from httpx import AsyncClient
+
+from app import cache
+
+
+async def test_lru_cache_evicts_least_recently_used():
+    lru = cache.LRUCache(maxsize=2, ttl=60)
+    await lru.set("a", 1)
+    await lru.set("b", 2)
+    assert await lru.get("a") == 1
+    await lru.set("c", 3)
+
+    assert await lru.get("b") is None
+    assert await lru.get("a") == 1
+    assert await lru.get("c") == 3
+    stats = lru.stats()
+    assert stats["evictions"] == 1
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+
+
+async def test_lru_cache_expires_entries():
+    lru = cache.LRUCache(maxsize=10, ttl=0.01)
+    await lru.set("a", 1)
+    await asyncio.sleep(0.02)
+    assert await lru.get("a") is None
+    assert lru.stats()["expirations"] == 1
+
+
+async def test_read_user_is_served_from_cache(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+
+    before = (await client.get("/cache/stats")).json()
+    first = await client.get(f"/users/{user_id}")
+    second = await client.get(f"/users/{user_id}")
+    after = (await client.get("/cache/stats")).json()
+
+    assert first.json() == second.json()
+    assert after["misses"] - before["misses"] == 1
+    assert after["hits"] - before["hits"] == 1
+
+
+async def test_todo_writes_invalidate_cached_views(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    assert (await client.get(f"/users/{user_id}?include_todos=true")).json()["todos"] == []
+
+    response = await client.post(f"/users/{user_id}/todos/", json={"title": "Test Todo"})
+    todo_id = response.json()["id"]
+    data = (await client.get(f"/users/{user_id}?include_todos=true")).json()
+    assert [todo["title"] for todo in data["todos"]] == ["Test Todo"]
+    assert (await client.get(f"/todos/{todo_id}")).json()["is_done"] is False
+
+    await client.patch(f"/todos/{todo_id}", json={"is_done": True})
+    assert (await client.get(f"/todos/{todo_id}")).json()["is_done"] is True
+    data = (await client.get(f"/users/{user_id}?include_todos=true")).json()
+    assert data["todos"][0]["is_done"] is True
+
+    await client.delete(f"/todos/{todo_id}")
+    assert (await client.get(f"/todos/{todo_id}")).status_code == 404
+    assert (await client.get(f"/users/{user_id}?include_todos=true")).json()["todos"] == []
+
+
+async def test_only_invalidating_the_key_being_loaded_skips_the_fill(monkeypatch):
+    monkeypatch.setattr(cache, "backend", cache.LRUCache(maxsize=10, ttl=60))
+
+    async def load(invalidated: str, value):
+        await cache.invalidate(invalidated)
+        return value
+
+    # A write to another key while user:1 loads leaves the fill alone.
+    await cache.read_through("user:1", lambda: load("todo:999", {"id": 1}))
+    assert await cache.backend.get("user:1") == {"id": 1}
+    # One to the key itself means the loaded payload may be stale.
+    await cache.read_through("user:2", lambda: load("user:2", {"id": 2}))
+    assert await cache.backend.get("user:2") is None
+
+    async def load_many(ids):
+        await cache.invalidate("todo:2")
+        return {id: {"id": id} for id in ids}
+
+    await cache.read_many({1: "todo:1", 2: "todo:2"}, load_many)
+    assert await cache.backend.get("todo:1") == {"id": 1}
+    assert await cache.backend.get("todo:2") is None
+    assert cache._loads == {} and cache._generations == {}
@@ -0,0 +1,80 @@
+from httpx import AsyncClient
+from sqlalchemy import update
+
+from app import models
+from app.counters import repair
+
+from .conftest import TestingSessionLocal
+
+
+async def _stats(client: AsyncClient, user_id: int) -> dict:
+    response = await client.get(f"/users/{user_id}/stats")
+    assert response.status_code == 200
+    return response.json()
+
+
+async def test_counters_follow_every_todo_write(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    assert await _stats(client, user_id) == {"total": 0, "done": 0, "open": 0}
+
+    response = await client.post(f"/users/{user_id}/todos/", json={"title": "A"})
+    first = response.json()["id"]
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk",
+        json={"todos": [{"title": "B", "is_done": True}, {"title": "C"}, {"title": "D"}]},
+    )
+    ids = [todo["id"] for todo in response.json()]
+    assert await _stats(client, user_id) == {"total": 4, "done": 1, "open": 3}
+
+    # Only real flips count, however often is_done is sent.
+    await client.patch(f"/todos/{first}", json={"is_done": True})
+    await client.patch(f"/todos/{first}", json={"is_done": True})
+    await client.patch(f"/todos/{first}", json={"title": "A2"})
+    assert await _stats(client, user_id) == {"total": 4, "done": 2, "open": 2}
+    await client.patch(
+        "/todos/bulk",
+        json={"todos": [{"id": ids[0], "is_done": False}, {"id": ids[1], "is_done": True}]},
+    )
+    assert await _stats(client, user_id) == {"total": 4, "done": 2, "open": 2}
+
+    await client.delete(f"/todos/{first}")
+    await client.post("/todos/bulk/delete", json={"ids": [ids[1], ids[2]]})
+    assert await _stats(client, user_id) == {"total": 1, "done": 0, "open": 1}
+
+    response = await client.get("/users/", params={"include_stats": True})
+    assert response.json()[0]["stats"] == {"total": 1, "done": 0, "open": 1}
+    response = await client.get("/users/", params={"cursor": "", "include_stats": True})
+    assert response.json()["items"][0]["stats"]["total"] == 1
+    response = await client.get("/users/", params={"ids": str(user_id), "include_stats": True})
+    assert response.json()[0]["stats"]["open"] == 1
+    assert "stats" not in (await client.get("/users/")).json()[0]
+
+    assert (await client.get("/users/999/stats")).status_code == 404
+
+
+async def test_repair_recomputes_drifted_counters(client: AsyncClient):
+    user_ids = []
+    for index in range(3):
+        response = await client.post(
+            "/users/", json={"email": f"user{index}@example.com", "password": "testpassword"}
+        )
+        user_ids.append(response.json()["id"])
+        await client.post(
+            f"/users/{user_ids[-1]}/todos/bulk",
+            json={"todos": [{"title": "Open"}, {"title": "Done", "is_done": True}]},
+        )
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(models.User)
+            .where(models.User.id != user_ids[1])
+            .values(todo_count=7, done_count=5)
+        )
+        await db.commit()
+
+    assert await repair(TestingSessionLocal, batch_size=2) == {"scanned": 3, "fixed": 2}
+    for user_id in user_ids:
+        assert await _stats(client, user_id) == {"total": 2, "done": 1, "open": 1}
+    assert (await repair(TestingSessionLocal))["fixed"] == 0
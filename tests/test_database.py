@@ -0,0 +1,104 @@
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+
+from app import cache, database, models
+from app.database import Base, Replica, ReplicaRouter, get_read_db
+from app.main import app
+
+from .conftest import TestingSessionLocal
+
+
+def sqlite_url(path) -> str:
+    return f"sqlite+aiosqlite:///{path}"
+
+
+async def test_replica_router_round_robin_skips_unhealthy(tmp_path):
+    replicas = [
+        Replica(sqlite_url(tmp_path / "replica1.db")),
+        Replica(sqlite_url(tmp_path / "missing" / "replica2.db")),
+        Replica(sqlite_url(tmp_path / "replica3.db")),
+    ]
+    router = ReplicaRouter(replicas)
+    await router.check_health()
+    assert [replica.healthy for replica in replicas] == [True, False, True]
+
+    chosen = [router.choose() for _ in range(4)]
+    assert chosen == [replicas[0], replicas[2], replicas[0], replicas[2]]
+    await router.dispose()
+
+
+async def test_replica_router_least_busy(tmp_path):
+    replicas = [Replica(sqlite_url(tmp_path / f"replica{i}.db")) for i in range(2)]
+    router = ReplicaRouter(replicas, strategy="least_busy")
+    replicas[0].in_use = 3
+    assert router.choose() is replicas[1]
+
+    for replica in replicas:
+        replica.healthy = False
+    assert router.choose() is None
+    await router.dispose()
+
+
+async def test_reads_go_to_replica_except_after_writes(client: AsyncClient, tmp_path, monkeypatch):
+    replica = Replica(sqlite_url(tmp_path / "replica.db"))
+    async with replica.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(
+            insert(models.User).values(email="replica@example.com", hashed_password="x")
+        )
+    monkeypatch.setattr(database, "read_router", ReplicaRouter([replica]))
+    monkeypatch.setattr(database, "session_factory", lambda: TestingSessionLocal)
+    del app.dependency_overrides[get_read_db]
+
+    try:
+        response = await client.post(
+            "/users/", json={"email": "primary@example.com", "password": "testpassword"}
+        )
+        user_id = response.json()["id"]
+        assert database.READ_PRIMARY_COOKIE in response.cookies
+
+        # Right after a write the client's reads are pinned to the primary.
+        response = await client.get(f"/users/{user_id}", params={"fields": "email"})
+        assert response.json()["email"] == "primary@example.com"
+
+        client.cookies.clear()
+        response = await client.get(f"/users/{user_id}", params={"fields": "email"})
+        assert response.json()["email"] == "replica@example.com"
+    finally:
+        app.dependency_overrides[get_read_db] = app.dependency_overrides[database.get_db]
+        await replica.engine.dispose()
+
+
+async def test_stale_replica_reads_never_reach_a_pinned_client(
+    client: AsyncClient, tmp_path, monkeypatch
+):
+    replica = Replica(sqlite_url(tmp_path / "replica.db"))
+    async with replica.engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(models.User).values(email="a@example.com", hashed_password="x"))
+        await conn.execute(insert(models.Todo).values(title="Old", owner_id=1))
+    monkeypatch.setattr(database, "read_router", ReplicaRouter([replica]))
+    monkeypatch.setattr(database, "session_factory", lambda: TestingSessionLocal)
+    del app.dependency_overrides[get_read_db]
+
+    try:
+        await client.post("/users/", json={"email": "a@example.com", "password": "testpassword"})
+        await client.post("/users/1/todos/bulk", json={"todos": [{"title": "Old"}]})
+        # Client A writes; the replica never sees it.
+        response = await client.patch("/todos/1", json={"title": "New"})
+        assert database.READ_PRIMARY_COOKIE in response.cookies
+
+        # Client B reads the old row from the replica, which must not fill the cache.
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as b:
+            assert (await b.get("/todos/1")).json()["title"] == "Old"
+            response = await b.post("/batch", json={"requests": [{"path": "/todos/1"}]})
+            assert response.json()[0]["body"]["title"] == "Old"
+        assert await cache.backend.get(cache.todo_key(1)) is None
+
+        response = await client.get("/todos/1")
+        assert response.json()["title"] == "New"
+        response = await client.post("/batch", json={"requests": [{"path": "/todos/1"}]})
+        assert response.json()[0]["body"]["title"] == "New"
+    finally:
+        app.dependency_overrides[get_read_db] = app.dependency_overrides[database.get_db]
+        await replica.engine.dispose()
@@ -0,0 +1,226 @@
+import asyncio
+import json
+
+import pytest
+from httpx import AsyncClient
+
+from app import events
+from app.events import EVICTED, RESET, MemoryBroker
+from app.main import app
+
+
+@pytest.fixture(autouse=True)
+def broker():
+    previous = events.backend
+    events.configure(MemoryBroker(buffer_size=10, history_size=5, history_users=2))
+    yield events.backend
+    events.configure(previous)
+
+
+async def _drain(subscription):
+    received = []
+    while True:
+        event = await subscription.get(timeout=0)
+        if event is None:
+            return received
+        received.append(event)
+
+
+async def test_broker_fans_out_per_user(broker):
+    first = await broker.subscribe(1)
+    second = await broker.subscribe(1)
+    other = await broker.subscribe(2)
+    await broker.publish(1, "todo.created", {"id": 1})
+    assert [event.data for event in await _drain(first)] == [{"id": 1}]
+    assert [event.data for event in await _drain(second)] == [{"id": 1}]
+    assert await _drain(other) == []
+
+    await broker.unsubscribe(first)
+    await broker.publish(1, "todo.deleted", {"id": 1})
+    assert await _drain(first) == []
+    assert broker.stats()["subscribers"] == 2
+
+
+async def test_broker_resumes_from_last_event_id(broker):
+    for todo_id in range(1, 4):
+        await broker.publish(1, "todo.created", {"id": todo_id})
+    subscription = await broker.subscribe(1, last_event_id=1)
+    assert [event.id for event in await _drain(subscription)] == [2, 3]
+
+    # Older than the retained history, or from before a restart: the client must reload.
+    for todo_id in range(4, 10):
+        await broker.publish(1, "todo.created", {"id": todo_id})
+    assert [event.type for event in await _drain(await broker.subscribe(1, 2))] == [RESET]
+    assert [event.type for event in await _drain(await broker.subscribe(1, 99))] == [RESET]
+    assert [event.id for event in await _drain(await broker.subscribe(1, 8))] == [9]
+
+    # Users beyond history_users lose their history whole.
+    await broker.publish(2, "todo.created", {})
+    await broker.publish(3, "todo.created", {})
+    assert [event.type for event in await _drain(await broker.subscribe(1, 8))] == [RESET]
+
+
+async def test_broker_evicts_slow_subscribers(broker):
+    slow = await broker.subscribe(1)
+    for todo_id in range(11):
+        await broker.publish(1, "todo.created", {"id": todo_id})
+    assert [event.type for event in await _drain(slow)] == [EVICTED]
+    assert broker.stats() == {"backend": "memory", "subscribers": 0, "evictions": 1}
+
+
+async def _sse_events(path: str, headers: dict, count: int, act):
+    # httpx buffers whole responses, so the stream is read straight off the ASGI app.
+    received = []
+    done = asyncio.Event()
+    status = {}
+
+    async def receive():
+        await done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            status["code"] = message["status"]
+        elif status["code"] != 200:
+            done.set()
+        elif message["type"] == "http.response.body":
+            for block in message.get("body", b"").decode().split("\n\n"):
+                if block.strip():
+                    received.append(dict(line.split(": ", 1) for line in block.split("\n")))
+            if len(received) >= count:
+                done.set()
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "root_path": "",
+        "headers": [(key.lower().encode(), value.encode()) for key, value in headers.items()],
+        "client": ("test", 1),
+        "server": ("test", 80),
+    }
+    stream = asyncio.create_task(app(scope, receive, send))
+    await asyncio.sleep(0.05)
+    await act()
+    await asyncio.wait_for(done.wait(), 5)
+    await stream
+    return status["code"], received
+
+
+async def test_user_event_stream(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    todo_ids = []
+
+    async def act():
+        response = await client.post(f"/users/{user_id}/todos/", json={"title": "Stream"})
+        todo_ids.append(response.json()["id"])
+        await client.patch(f"/todos/{todo_ids[0]}", json={"is_done": True})
+        await client.delete(f"/todos/{todo_ids[0]}")
+
+    status, received = await _sse_events(f"/users/{user_id}/events", {}, 3, act)
+    assert status == 200
+    assert [event["event"] for event in received] == [
+        "todo.created", "todo.updated", "todo.deleted"
+    ]
+    assert json.loads(received[1]["data"])["is_done"] is True
+    assert json.loads(received[2]["data"]) == {"id": todo_ids[0]}
+
+    # Reconnecting with Last-Event-ID replays what was missed.
+    async def nothing():
+        pass
+
+    status, replayed = await _sse_events(
+        f"/users/{user_id}/events", {"Last-Event-ID": received[0]["id"]}, 2, nothing
+    )
+    assert [event["id"] for event in replayed] == [received[1]["id"], received[2]["id"]]
+
+    status, _ = await _sse_events("/users/999/events", {}, 1, nothing)
+    assert status == 404
+
+
+async def test_user_event_socket(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    messages = []
+    closed = asyncio.Event()
+    connected = False
+
+    async def receive():
+        nonlocal connected
+        if not connected:
+            connected = True
+            return {"type": "websocket.connect"}
+        await closed.wait()
+        return {"type": "websocket.disconnect", "code": 1000}
+
+    async def send(message):
+        if message["type"] == "websocket.send":
+            messages.append(json.loads(message["text"]))
+            closed.set()
+        elif message["type"] == "websocket.close":
+            messages.append(message)
+            closed.set()
+
+    def scope(path):
+        return {
+            "type": "websocket",
+            "asgi": {"version": "3.0"},
+            "scheme": "ws",
+            "path": path,
+            "raw_path": path.encode(),
+            "query_string": b"",
+            "root_path": "",
+            "headers": [],
+            "client": ("test", 1),
+            "server": ("test", 80),
+            "subprotocols": [],
+        }
+
+    socket = asyncio.create_task(app(scope(f"/users/{user_id}/events/ws"), receive, send))
+    await asyncio.sleep(0.05)
+    await client.post(f"/users/{user_id}/todos/", json={"title": "Socket"})
+    await asyncio.wait_for(socket, 5)
+    assert messages[0]["type"] == "todo.created"
+    assert messages[0]["data"]["title"] == "Socket"
+
+    messages.clear()
+    closed.clear()
+    connected = False
+    await asyncio.wait_for(app(scope("/users/999/events/ws"), receive, send), 5)
+    assert messages == [{"type": "websocket.close", "code": 4404, "reason": ""}]
+
+
+async def test_bulk_writes_do_not_evict_subscribers(client: AsyncClient, broker):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    subscription = await broker.subscribe(user_id)
+
+    # Three times the buffer, as one write each: one event per operation, not per row.
+    todos = [{"title": f"Todo {index}"} for index in range(30)]
+    response = await client.post(f"/users/{user_id}/todos/bulk", json={"todos": todos})
+    ids = [todo["id"] for todo in response.json()]
+    await client.patch(
+        "/todos/bulk", json={"todos": [{"id": todo_id, "is_done": True} for todo_id in ids]}
+    )
+    await client.post("/todos/bulk/delete", json={"ids": ids})
+
+    received = await _drain(subscription)
+    assert [event.type for event in received] == [
+        "todos.created", "todos.updated", "todos.deleted"
+    ]
+    assert [todo["id"] for todo in received[0].data["todos"]] == ids
+    assert all(todo["is_done"] for todo in received[1].data["todos"])
+    assert received[2].data == {"ids": ids}
+    assert broker.stats()["evictions"] == 0
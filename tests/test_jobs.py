@@ -0,0 +1,159 @@
+import asyncio
+from datetime import timedelta
+
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import update
+
+from app import crud, database, jobs
+from app.archive import archive
+from app.jobs import JobQueue
+
+from .conftest import TestingSessionLocal
+
+
+@pytest_asyncio.fixture
+async def queue(monkeypatch):
+    monkeypatch.setattr(database, "session_factory", lambda: TestingSessionLocal)
+    monkeypatch.setattr(jobs, "JOB_BATCH_SIZE", 2)
+    queue = JobQueue(workers=2, lease=60, poll_interval=0.05)
+    monkeypatch.setattr(jobs, "queue", queue)
+    yield queue
+    await queue.stop()
+
+
+async def _user(client: AsyncClient, todos: list) -> int:
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    await client.post(f"/users/{user_id}/todos/bulk", json={"todos": todos})
+    return user_id
+
+
+async def _wait(client: AsyncClient, job_id: int) -> dict:
+    for _ in range(200):
+        job = (await client.get(f"/jobs/{job_id}")).json()
+        if job["status"] not in (jobs.QUEUED, jobs.RUNNING):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"job {job_id} did not finish: {job}")
+
+
+async def test_clear_completed_deletes_in_batches(client: AsyncClient, queue):
+    queue.start()
+    todos = [{"title": f"Todo {index}", "is_done": index % 3 != 0} for index in range(9)]
+    user_id = await _user(client, todos)
+
+    response = await client.post(f"/users/{user_id}/todos/clear-completed")
+    assert response.status_code == 202
+    assert response.json()["status"] == jobs.QUEUED
+    job = await _wait(client, response.json()["id"])
+    assert (job["status"], job["progress"], job["total"]) == (jobs.SUCCEEDED, 6, 6)
+    assert job["finished_at"] is not None
+
+    response = await client.get(f"/users/{user_id}/stats")
+    assert response.json() == {"total": 3, "done": 0, "open": 3}
+    response = await client.post("/users/999/todos/clear-completed")
+    assert response.status_code == 404
+    assert (await client.get("/jobs/999")).status_code == 404
+
+
+async def test_delete_user_and_import(client: AsyncClient, queue):
+    queue.start()
+    user_id = await _user(client, [{"title": f"Todo {index}"} for index in range(5)])
+
+    response = await client.post(
+        f"/users/{user_id}/todos/import",
+        json={"todos": [{"title": f"Imported {index}"} for index in range(3)], "replace": True},
+    )
+    job = await _wait(client, response.json()["id"])
+    assert (job["status"], job["progress"], job["total"]) == (jobs.SUCCEEDED, 8, 8)
+    response = await client.get(f"/users/{user_id}/todos/")
+    assert [todo["title"] for todo in response.json()["items"]] == [
+        "Imported 0", "Imported 1", "Imported 2"
+    ]
+
+    response = await client.delete(f"/users/{user_id}")
+    assert response.status_code == 202
+    job = await _wait(client, response.json()["id"])
+    assert (job["status"], job["progress"], job["total"]) == (jobs.SUCCEEDED, 4, 4)
+    assert (await client.get(f"/users/{user_id}")).status_code == 404
+    assert (await client.delete(f"/users/{user_id}")).status_code == 404
+
+
+async def test_cancelled_jobs_stop(client: AsyncClient, queue, monkeypatch):
+    user_id = await _user(
+        client, [{"title": f"Todo {index}", "is_done": True} for index in range(6)]
+    )
+
+    response = await client.delete(f"/users/{user_id}")
+    job_id = response.json()["id"]
+    response = await client.post(f"/jobs/{job_id}/cancel")
+    assert response.json()["status"] == jobs.CANCELLED
+    queue.start()
+    await asyncio.sleep(0.2)
+    assert (await client.get(f"/jobs/{job_id}")).json()["status"] == jobs.CANCELLED
+    assert (await client.get(f"/users/{user_id}/stats")).json()["total"] == 6
+
+    # A running job notices at its next chunk.
+    advanced = asyncio.Event()
+    advance = jobs.Job.advance
+
+    async def slow_advance(self, done, total=None):
+        await advance(self, done, total)
+        if done:
+            advanced.set()
+            await asyncio.sleep(0.2)
+
+    monkeypatch.setattr(jobs.Job, "advance", slow_advance)
+    response = await client.post(f"/users/{user_id}/todos/clear-completed")
+    job_id = response.json()["id"]
+    await asyncio.wait_for(advanced.wait(), 2)
+    await client.post(f"/jobs/{job_id}/cancel")
+    job = await _wait(client, job_id)
+    assert (job["status"], job["progress"], job["total"]) == (jobs.CANCELLED, 2, 6)
+    assert (await client.get(f"/users/{user_id}/stats")).json()["total"] == 4
+
+
+async def test_abandoned_jobs_are_resumed_or_failed(client: AsyncClient, queue):
+    user_id = await _user(client, [{"title": "A", "is_done": True}])
+    cleared = (await client.post(f"/users/{user_id}/todos/clear-completed")).json()["id"]
+    imported = (await client.post(
+        f"/users/{user_id}/todos/import", json={"todos": [{"title": "B"}]}
+    )).json()["id"]
+    # As if the worker running them had died an hour ago.
+    async with TestingSessionLocal() as db:
+        await db.execute(
+            update(jobs.JOBS)
+            .values(status=jobs.RUNNING, heartbeat_at=jobs._now() - timedelta(hours=1))
+        )
+        await db.commit()
+
+    queue.start()
+    assert (await _wait(client, cleared))["status"] == jobs.SUCCEEDED
+    job = await _wait(client, imported)
+    assert job["status"] == jobs.FAILED
+    assert job["error"].startswith("Interrupted")
+    assert (await client.get(f"/users/{user_id}/stats")).json()["total"] == 0
+
+
+async def test_jobs_cover_archived_todos(client: AsyncClient, queue):
+    queue.start()
+    todos = [{"title": f"Todo {index}", "is_done": index < 3} for index in range(4)]
+    user_id = await _user(client, todos)
+    await archive(TestingSessionLocal, crud._now(), batch_size=2)
+
+    response = await client.post(f"/users/{user_id}/todos/clear-completed")
+    job = await _wait(client, response.json()["id"])
+    assert (job["status"], job["progress"], job["total"]) == (jobs.SUCCEEDED, 3, 3)
+    response = await client.get(
+        f"/users/{user_id}/todos/", params={"include_archived": True}
+    )
+    assert [todo["title"] for todo in response.json()["items"]] == ["Todo 3"]
+
+    await client.patch(f"/todos/{response.json()['items'][0]['id']}", json={"is_done": True})
+    await archive(TestingSessionLocal, crud._now())
+    job = await _wait(client, (await client.delete(f"/users/{user_id}")).json()["id"])
+    assert (job["status"], job["progress"], job["total"]) == (jobs.SUCCEEDED, 2, 2)
+    assert (await client.get(f"/users/{user_id}")).status_code == 404
@@ -0,0 +1,113 @@
+import asyncio
+
+from httpx import AsyncClient
+
+from app import cache, crud
+from app.loaders import DataLoader
+
+
+async def test_data_loader_coalesces_and_dedupes():
+    fetches = []
+
+    async def fetch(keys):
+        fetches.append(keys)
+        return {key: key * 10 for key in keys if key != 3}
+
+    loader = DataLoader(fetch)
+    results = await asyncio.gather(loader.load(2), loader.load(1), loader.load(2), loader.load(3))
+    assert results == [20, 10, 20, None]
+    assert await loader.load_many([1, 4, 2]) == [10, 40, 20]
+    assert fetches == [[2, 1, 3], [4]]
+
+
+async def test_data_loader_retries_after_a_failed_fetch():
+    calls = 0
+
+    async def fetch(keys):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            raise RuntimeError("down")
+        return {key: key for key in keys}
+
+    loader = DataLoader(fetch)
+    try:
+        await loader.load(1)
+    except RuntimeError:
+        pass
+    assert await loader.load(1) == 1
+
+
+async def _setup(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk",
+        json={"todos": [{"title": f"Todo {index}"} for index in range(3)]},
+    )
+    return user_id, [todo["id"] for todo in response.json()]
+
+
+async def test_multi_get(client: AsyncClient, monkeypatch):
+    user_id, todo_ids = await _setup(client)
+    queries = []
+    get_todos_by_ids = crud.get_todos_by_ids
+
+    async def counting(db, ids, fields=None):
+        queries.append(ids)
+        return await get_todos_by_ids(db, ids, fields=fields)
+
+    monkeypatch.setattr(crud, "get_todos_by_ids", counting)
+    await cache.backend.clear()
+
+    # Requested order, duplicates once, missing ids left out.
+    ids = [todo_ids[2], todo_ids[0], 999, todo_ids[2]]
+    response = await client.get("/todos/", params={"ids": ",".join(map(str, ids))})
+    assert response.status_code == 200
+    assert [todo["id"] for todo in response.json()] == [todo_ids[2], todo_ids[0]]
+    assert queries == [[todo_ids[2], todo_ids[0], 999]]
+
+    # Now cached; only the id never found is asked for again.
+    await client.get("/todos/", params={"ids": ",".join(map(str, ids))})
+    assert queries[1:] == [[999]]
+
+    response = await client.get("/todos/", params={"ids": f"{todo_ids[1]}", "fields": "title"})
+    assert response.json() == [{"title": "Todo 1", "id": todo_ids[1]}]
+
+    response = await client.get(
+        "/users/", params={"ids": f"{user_id},999", "include_todos": True}
+    )
+    assert [user["id"] for user in response.json()] == [user_id]
+    assert len(response.json()[0]["todos"]) == 3
+
+    assert (await client.get("/todos/", params={"ids": "1,x"})).status_code == 400
+    assert (await client.get("/todos/", params={"ids": ""})).status_code == 400
+
+
+async def test_batch(client: AsyncClient, monkeypatch):
+    user_id, todo_ids = await _setup(client)
+    queries = []
+    get_todos_by_ids = crud.get_todos_by_ids
+
+    async def counting(db, ids, fields=None):
+        queries.append(ids)
+        return await get_todos_by_ids(db, ids, fields=fields)
+
+    monkeypatch.setattr(crud, "get_todos_by_ids", counting)
+    await cache.backend.clear()
+
+    paths = [f"/todos/{todo_id}" for todo_id in todo_ids]
+    paths += [f"/todos/{todo_ids[0]}", f"/users/{user_id}", "/todos/999", "/todos/"]
+    response = await client.post("/batch", json={"requests": [{"path": path} for path in paths]})
+    assert response.status_code == 200
+    results = response.json()
+    assert [result["status"] for result in results] == [200, 200, 200, 200, 200, 404, 400]
+    assert [result["body"]["id"] for result in results[:4]] == todo_ids + [todo_ids[0]]
+    assert results[4]["body"]["email"] == "test@example.com"
+    assert results[5]["body"] == {"detail": "Todo not found"}
+    assert queries == [todo_ids + [999]]
+
+    response = await client.post("/batch", json={"requests": [{"method": "DELETE", "path": "/"}]})
+    assert response.status_code == 422
@@ -1,4 +1,13 @@
+import csv
+import io
+import json
+
+from fastapi.responses import JSONResponse
 from httpx import AsyncClient
+from sqlalchemy import select
+from sqlalchemy.orm import selectinload
+
+from app import cache, models, schemas
 
 
 async def test_create_user(client: AsyncClient):
@@ -276,3 +285,436 @@ async def test_update_todo_with_partial_data(client: AsyncClient):
     data = response.json()
     assert data["title"] == "Updated Title"  # Should be unchanged
     assert data["is_done"] is True
+
+
+async def test_read_todos_with_cursor(client: AsyncClient):
+    user_response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = user_response.json()["id"]
+    for i in range(5):
+        await client.post(f"/users/{user_id}/todos/", json={"title": f"Todo {i}"})
+
+    titles = []
+    cursor = ""
+    while cursor is not None:
+        response = await client.get("/todos/", params={"cursor": cursor, "limit": 2})
+        assert response.status_code == 200
+        data = response.json()
+        assert len(data["items"]) <= 2
+        titles.extend(todo["title"] for todo in data["items"])
+        cursor = data["next_cursor"]
+    assert titles == [f"Todo {i}" for i in range(5)]
+
+
+async def test_read_todos_with_cursor_for_owner(client: AsyncClient):
+    user_ids = []
+    for email in ("test1@example.com", "test2@example.com"):
+        response = await client.post("/users/", json={"email": email, "password": "testpassword"})
+        user_ids.append(response.json()["id"])
+    for user_id in user_ids:
+        for i in range(3):
+            await client.post(f"/users/{user_id}/todos/", json={"title": f"Todo {i}"})
+
+    response = await client.get(
+        "/todos/",
+        params={"cursor": "", "limit": 2, "owner_id": user_ids[1], "estimate_total": True},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert [todo["owner_id"] for todo in data["items"]] == [user_ids[1]] * 2
+    assert data["estimated_total"] == 3
+
+    # A cursor issued for one owner cannot be replayed against another.
+    response = await client.get(
+        "/todos/", params={"cursor": data["next_cursor"], "owner_id": user_ids[0]}
+    )
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+    response = await client.get(
+        "/todos/", params={"cursor": data["next_cursor"], "owner_id": user_ids[1]}
+    )
+    data = response.json()
+    assert len(data["items"]) == 1
+    assert data["next_cursor"] is None
+
+
+async def test_read_users_with_cursor(client: AsyncClient):
+    for i in range(3):
+        await client.post(
+            "/users/", json={"email": f"test{i}@example.com", "password": "testpassword"}
+        )
+
+    response = await client.get("/users/", params={"cursor": "", "limit": 2})
+    assert response.status_code == 200
+    data = response.json()
+    assert [user["email"] for user in data["items"]] == ["test0@example.com", "test1@example.com"]
+
+    response = await client.get("/users/", params={"cursor": data["next_cursor"], "limit": 2})
+    data = response.json()
+    assert [user["email"] for user in data["items"]] == ["test2@example.com"]
+    assert data["next_cursor"] is None
+
+
+async def test_read_todos_with_invalid_cursor(client: AsyncClient):
+    response = await client.get("/todos/", params={"cursor": "not-a-cursor"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Invalid cursor"}
+
+
+async def test_bulk_todo_lifecycle(client: AsyncClient):
+    user_response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = user_response.json()["id"]
+
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk",
+        json={"todos": [{"title": f"Todo {i}", "description": "Bulk"} for i in range(3)]},
+    )
+    assert response.status_code == 200, response.text
+    created = response.json()
+    assert [todo["title"] for todo in created] == ["Todo 0", "Todo 1", "Todo 2"]
+    assert all(todo["owner_id"] == user_id for todo in created)
+    ids = [todo["id"] for todo in created]
+
+    response = await client.patch(
+        "/todos/bulk",
+        json={
+            "todos": [
+                {"id": ids[0], "is_done": True},
+                {"id": ids[1], "title": "Renamed", "description": None},
+                {"id": 999, "title": "Missing"},
+            ]
+        },
+    )
+    assert response.status_code == 200, response.text
+    results = response.json()
+    assert [result["status"] for result in results] == ["updated", "updated", "not_found"]
+    assert results[0]["todo"]["is_done"] is True
+    assert results[0]["todo"]["title"] == "Todo 0"
+    assert results[1]["todo"]["title"] == "Renamed"
+    assert results[1]["todo"]["description"] is None
+    assert results[1]["todo"]["is_done"] is False
+
+    response = await client.post("/todos/bulk/delete", json={"ids": [ids[2], 999]})
+    assert response.status_code == 200
+    assert [result["status"] for result in response.json()] == ["deleted", "not_found"]
+    assert (await client.get(f"/todos/{ids[2]}")).status_code == 404
+    assert (await client.get(f"/todos/{ids[0]}")).json()["is_done"] is True
+
+
+async def test_bulk_create_todos_for_non_existent_user(client: AsyncClient):
+    response = await client.post("/users/999/todos/bulk", json={"todos": [{"title": "Test Todo"}]})
+    assert response.status_code == 404
+    assert response.json() == {"detail": "User not found"}
+
+
+async def test_export_todos(client: AsyncClient):
+    user_ids = []
+    for email in ("test1@example.com", "test2@example.com"):
+        response = await client.post("/users/", json={"email": email, "password": "testpassword"})
+        user_ids.append(response.json()["id"])
+        await client.post(
+            f"/users/{user_ids[-1]}/todos/bulk",
+            json={"todos": [{"title": f"Todo {i}"} for i in range(3)]},
+        )
+
+    response = await client.get("/todos/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert len(lines) == 6
+    assert lines[0] == {
+        "title": "Todo 0",
+        "description": None,
+        "is_done": False,
+        "id": lines[0]["id"],
+        "owner_id": user_ids[0],
+        "version": 1,
+    }
+
+    response = await client.get(
+        "/todos/export", params={"format": "csv", "owner_id": user_ids[1]}
+    )
+    assert response.status_code == 200
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == ["title", "description", "is_done", "id", "owner_id", "version"]
+    assert len(rows) == 4
+    assert {row[4] for row in rows[1:]} == {str(user_ids[1])}
+
+
+async def test_read_endpoints_match_response_schemas(client: AsyncClient, db_session):
+    user_response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = user_response.json()["id"]
+    await client.post(
+        f"/users/{user_id}/todos/bulk",
+        json={"todos": [{"title": "Todo", "description": "Ünïcode"}, {"title": "Other"}]},
+    )
+
+    result = await db_session.execute(
+        select(models.User).options(selectinload(models.User.todos))
+    )
+    users = result.scalars().all()
+    expected = [schemas.UserWithTodos.model_validate(user).model_dump() for user in users]
+    await db_session.close()
+
+    response = await client.get("/users/?include_todos=true")
+    assert response.content == JSONResponse(expected).body
+    response = await client.get(f"/users/{user_id}?include_todos=true")
+    assert response.content == JSONResponse(expected[0]).body
+    response = await client.get("/todos/")
+    assert response.content == JSONResponse(expected[0]["todos"]).body
+
+
+async def test_read_with_sparse_fieldsets(client: AsyncClient):
+    user_response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = user_response.json()["id"]
+    todo_response = await client.post(
+        f"/users/{user_id}/todos/", json={"title": "Test Todo", "description": "Test Description"}
+    )
+    todo_id = todo_response.json()["id"]
+
+    response = await client.get(f"/users/{user_id}", params={"fields": "email"})
+    assert response.json() == {"email": "test@example.com", "id": user_id}
+
+    response = await client.get("/users/", params={"fields": "is_active", "include_todos": True})
+    data = response.json()
+    assert data[0].keys() == {"id", "is_active", "todos"}
+    assert data[0]["todos"][0]["title"] == "Test Todo"
+
+    response = await client.get(f"/todos/{todo_id}", params={"fields": "title,is_done"})
+    assert response.json() == {"title": "Test Todo", "is_done": False, "id": todo_id}
+
+    response = await client.get("/todos/", params={"fields": "owner_id", "cursor": ""})
+    assert response.json()["items"] == [{"id": todo_id, "owner_id": user_id}]
+
+
+async def test_read_with_unknown_fields(client: AsyncClient):
+    response = await client.get("/todos/", params={"fields": "title,secret"})
+    assert response.status_code == 400
+    assert response.json() == {"detail": "Unknown fields: secret"}
+
+    response = await client.get("/users/1", params={"fields": "hashed_password"})
+    assert response.status_code == 400
+
+
+async def test_read_user_todos(client: AsyncClient):
+    user_response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = user_response.json()["id"]
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk",
+        json={"todos": [{"title": f"Todo {i}", "is_done": i % 2 == 1} for i in range(5)]},
+    )
+    ids = [todo["id"] for todo in response.json()]
+
+    response = await client.get(f"/users/{user_id}/todos/")
+    assert response.status_code == 200
+    assert [todo["id"] for todo in response.json()["items"]] == ids
+
+    response = await client.get(
+        f"/users/{user_id}/todos/", params={"is_done": False, "order": "desc", "limit": 2}
+    )
+    data = response.json()
+    assert [todo["id"] for todo in data["items"]] == [ids[4], ids[2]]
+
+    response = await client.get(
+        f"/users/{user_id}/todos/",
+        params={"is_done": False, "order": "desc", "limit": 2, "cursor": data["next_cursor"]},
+    )
+    data = response.json()
+    assert [todo["id"] for todo in data["items"]] == [ids[0]]
+    assert data["next_cursor"] is None
+
+    # The cursor is bound to the filter and ordering it was issued for.
+    cursor = response.request.url.params["cursor"]
+    response = await client.get(
+        f"/users/{user_id}/todos/", params={"is_done": True, "cursor": cursor}
+    )
+    assert response.status_code == 400
+
+
+async def test_read_todos_for_non_existent_user(client: AsyncClient):
+    response = await client.get("/users/999/todos/")
+    assert response.status_code == 404
+    assert response.json() == {"detail": "User not found"}
+
+    user_response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    response = await client.get(f"/users/{user_response.json()['id']}/todos/")
+    assert response.status_code == 200
+    assert response.json()["items"] == []
+
+
+async def test_search_todos(client: AsyncClient):
+    users = []
+    for email in ("alice@example.com", "bob@example.com"):
+        response = await client.post("/users/", json={"email": email, "password": "testpassword"})
+        users.append(response.json()["id"])
+    todos = [
+        (users[0], {"title": "Buy milk", "description": "milk and bread", "is_done": True}),
+        (users[0], {"title": "Call mom", "description": "about the milk"}),
+        (users[0], {"title": "Write report", "description": "quarterly numbers"}),
+        (users[1], {"title": "Milk the cow", "description": "before sunrise"}),
+    ]
+    ids = []
+    for user_id, todo in todos:
+        response = await client.post(f"/users/{user_id}/todos/", json=todo)
+        ids.append(response.json()["id"])
+
+    response = await client.get("/todos/search", params={"q": "milk"})
+    assert response.status_code == 200
+    data = response.json()
+    assert sorted(todo["id"] for todo in data["items"]) == sorted([ids[0], ids[1], ids[3]])
+    # The todo mentioning milk in both title and description ranks first.
+    assert data["items"][0]["id"] == ids[0]
+    assert set(data["items"][0]) == set(schemas.Todo.model_fields)
+    assert data["items"][0]["is_done"] is True
+    assert all(todo["is_done"] is False for todo in data["items"][1:])
+
+    response = await client.get("/todos/search", params={"q": "milk", "owner_id": users[1]})
+    assert [todo["id"] for todo in response.json()["items"]] == [ids[3]]
+
+    seen = []
+    cursor = ""
+    while True:
+        response = await client.get(
+            "/todos/search", params={"q": "milk", "limit": 1, "cursor": cursor}
+        )
+        data = response.json()
+        seen.extend(todo["id"] for todo in data["items"])
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    assert sorted(seen) == sorted([ids[0], ids[1], ids[3]])
+
+    # The cursor is bound to the query it was issued for.
+    first = await client.get("/todos/search", params={"q": "milk", "limit": 1})
+    response = await client.get(
+        "/todos/search", params={"q": "report", "cursor": first.json()["next_cursor"]}
+    )
+    assert response.status_code == 400
+
+    await client.patch(f"/todos/{ids[2]}", json={"title": "Pour milk"})
+    await client.delete(f"/todos/{ids[0]}")
+    response = await client.get("/todos/search", params={"q": "milk"})
+    assert sorted(todo["id"] for todo in response.json()["items"]) == sorted(
+        [ids[1], ids[2], ids[3]]
+    )
+    response = await client.get("/todos/search", params={"q": "report"})
+    assert response.json()["items"] == []
+
+
+async def test_search_todos_with_special_characters(client: AsyncClient):
+    response = await client.post("/users/", json={"email": "a@example.com", "password": "testpassword"})
+    user_id = response.json()["id"]
+    await client.post(f"/users/{user_id}/todos/", json={"title": "Fix C++ build"})
+
+    for q in ('"unbalanced', "milk AND OR", "title:fix", "NEAR(", "*", "c++ -build"):
+        response = await client.get("/todos/search", params={"q": q})
+        assert response.status_code == 200, q
+    for q in (" ", " \t\n "):
+        response = await client.get("/todos/search", params={"q": q})
+        assert response.status_code == 400, repr(q)
+        assert response.json()["detail"] == "Search query is blank"
+
+    response = await client.get("/todos/search", params={"q": "fix build"})
+    assert len(response.json()["items"]) == 1
+
+    response = await client.get("/todos/search", params={"q": ""})
+    assert response.status_code == 422
+
+
+async def test_conditional_get(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    response = await client.post(f"/users/{user_id}/todos/", json={"title": "Cached"})
+    todo_id = response.json()["id"]
+    assert response.json()["version"] == 1
+
+    response = await client.get(f"/todos/{todo_id}")
+    etag = response.headers["ETag"]
+    response = await client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["ETag"] == etag
+
+    # Answered from the version index when the todo is not cached.
+    await cache.backend.clear()
+    response = await client.get(f"/todos/{todo_id}", headers={"If-None-Match": f"W/{etag}"})
+    assert response.status_code == 304
+
+    await client.patch(f"/todos/{todo_id}", json={"is_done": True})
+    response = await client.get(f"/todos/{todo_id}", headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    assert response.headers["ETag"] != etag
+
+    response = await client.get("/todos/999", headers={"If-None-Match": etag})
+    assert response.status_code == 404
+
+    # A user with todos changes whenever one of its todos does.
+    response = await client.get(f"/users/{user_id}", params={"include_todos": True})
+    user_etag = response.headers["ETag"]
+    assert user_etag != (await client.get(f"/users/{user_id}")).headers["ETag"]
+    await cache.backend.clear()
+    response = await client.get(
+        f"/users/{user_id}", params={"include_todos": True}, headers={"If-None-Match": user_etag}
+    )
+    assert response.status_code == 304
+    await client.patch(f"/todos/{todo_id}", json={"title": "Changed"})
+    response = await client.get(
+        f"/users/{user_id}", params={"include_todos": True}, headers={"If-None-Match": user_etag}
+    )
+    assert response.status_code == 200
+
+
+async def test_if_match_guards_writes(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    response = await client.post(f"/users/{user_id}/todos/", json={"title": "Shared"})
+    todo_id = response.json()["id"]
+    etag = (await client.get(f"/todos/{todo_id}")).headers["ETag"]
+
+    response = await client.patch(
+        f"/todos/{todo_id}", json={"title": "First"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 200
+    assert response.json()["version"] == 2
+    new_etag = response.headers["ETag"]
+
+    # The second writer read the same version and loses.
+    response = await client.patch(
+        f"/todos/{todo_id}", json={"title": "Second"}, headers={"If-Match": etag}
+    )
+    assert response.status_code == 412
+    response = await client.delete(f"/todos/{todo_id}", headers={"If-Match": etag})
+    assert response.status_code == 412
+    response = await client.patch(f"/todos/{todo_id}", json={}, headers={"If-Match": etag})
+    assert response.status_code == 412
+    assert (await client.get(f"/todos/{todo_id}")).json()["title"] == "First"
+
+    response = await client.patch(
+        f"/todos/{todo_id}", json={"is_done": True}, headers={"If-Match": "*"}
+    )
+    assert response.status_code == 200
+    response = await client.delete(f"/todos/{todo_id}", headers={"If-Match": new_etag})
+    assert response.status_code == 412
+    response = await client.delete(f"/todos/{todo_id}", headers={"If-Match": '"3"'})
+    assert response.status_code == 200
+    response = await client.patch(
+        f"/todos/{todo_id}", json={"title": "Gone"}, headers={"If-Match": "*"}
+    )
+    assert response.status_code == 404
@@ -0,0 +1,85 @@
+from httpx import AsyncClient
+from prometheus_client.parser import text_string_to_metric_families
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app import metrics
+
+
+def _samples(body: str) -> dict:
+    return {
+        (sample.name, tuple(sorted(sample.labels.items()))): sample.value
+        for family in text_string_to_metric_families(body)
+        for sample in family.samples
+    }
+
+
+async def test_metrics_record_latency_and_queries(client: AsyncClient):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    await client.get(f"/users/{user_id}")
+    await client.get("/todos/999")
+
+    response = await client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    samples = _samples(response.text)
+
+    route = (("route", "/users/{user_id}"),)
+    latency = (("method", "GET"), ("route", "/users/{user_id}"), ("status", "200"))
+    assert samples[("http_request_duration_seconds_count", latency)] >= 1
+    assert samples[("http_request_db_queries_count", route)] >= 1
+    assert samples[("http_request_db_queries_sum", route)] >= 1
+    not_found = (("method", "GET"), ("route", "/todos/{todo_id}"), ("status", "404"))
+    assert samples[("http_request_duration_seconds_count", not_found)] >= 1
+    assert ("cache_misses_total", ()) in samples
+
+
+async def test_metrics_flag_n_plus_one(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(metrics, "N_PLUS_ONE_THRESHOLD", 0)
+    route = (("route", "/users/"),)
+    before = _samples((await client.get("/metrics")).text).get(
+        ("http_request_n_plus_one_total", route), 0
+    )
+    await client.get("/users/")
+    after = _samples((await client.get("/metrics")).text)
+    assert after[("http_request_n_plus_one_total", route)] == before + 1
+
+
+async def test_metrics_report_pool_gauges():
+    engine = create_async_engine("sqlite+aiosqlite://", poolclass=metrics.TimedAsyncQueuePool)
+    metrics.register_engine("test", engine)
+    try:
+        waits = metrics.POOL_WAIT._sum.get()
+        async with engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+            samples = _samples(metrics.render().decode())
+            assert samples[("db_pool_checked_out", (("engine", "test"),))] == 1
+        assert metrics.POOL_WAIT._sum.get() > waits
+        samples = _samples(metrics.render().decode())
+        assert samples[("db_pool_checked_out", (("engine", "test"),))] == 0
+        assert samples[("db_pool_checked_in", (("engine", "test"),))] == 1
+    finally:
+        del metrics._engines.engines["test"]
+        await engine.dispose()
+
+
+async def test_metrics_count_statement_cache_hits():
+    engine = create_async_engine("sqlite+aiosqlite://", query_cache_size=10)
+    metrics.register_engine("test", engine)
+    try:
+        hits = metrics.STATEMENT_CACHE.labels("hit")._value.get()
+        misses = metrics.STATEMENT_CACHE.labels("miss")._value.get()
+        query = text("SELECT :value")
+        async with engine.connect() as conn:
+            for value in range(3):
+                await conn.execute(query, {"value": value})
+        assert metrics.STATEMENT_CACHE.labels("miss")._value.get() == misses + 1
+        assert metrics.STATEMENT_CACHE.labels("hit")._value.get() == hits + 2
+        samples = _samples(metrics.render().decode())
+        assert samples[("db_statement_cache_entries", (("engine", "test"),))] == 1
+    finally:
+        del metrics._engines.engines["test"]
+        await engine.dispose()
@@ -0,0 +1,94 @@
+import pytest
+from httpx import AsyncClient
+from sqlalchemy import select
+
+from app import crud, models, ratelimit, security
+from app.admission import BULK, READ, WRITE
+from app.ratelimit import MemoryBucketStore
+
+from .conftest import TestingSessionLocal
+
+
+async def test_token_bucket_refills_over_time():
+    now = [0.0]
+    store = MemoryBucketStore(clock=lambda: now[0])
+    assert [await store.take("a", rate=2, burst=3) for _ in range(3)] == [0, 0, 0]
+    assert await store.take("a", rate=2, burst=3) == pytest.approx(0.5)
+    # Other keys have their own bucket.
+    assert await store.take("b", rate=2, burst=3) == 0
+    now[0] = 1.0
+    assert [await store.take("a", rate=2, burst=3) for _ in range(3)] == [0, 0, 0.5]
+    assert store.stats() == {"backend": "memory", "buckets": 2, "limited": 2}
+
+
+async def test_bucket_store_drops_least_recently_used():
+    store = MemoryBucketStore(max_keys=2, shards=1, clock=lambda: 0.0)
+    await store.take("a", rate=1, burst=1)
+    await store.take("b", rate=1, burst=1)
+    await store.take("c", rate=1, burst=1)
+    assert store.stats()["buckets"] == 2
+    assert await store.take("a", rate=1, burst=1) == 0
+    assert await store.take("c", rate=1, burst=1) > 0
+
+
+@pytest.fixture
+def limits(monkeypatch):
+    monkeypatch.setattr(ratelimit, "RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(
+        ratelimit,
+        "BUDGETS",
+        {READ: ("read", 0.001, 3), WRITE: ("write", 0.001, 2), BULK: ("bulk", 0.001, 1)},
+    )
+    ratelimit.configure(MemoryBucketStore())
+    yield
+    ratelimit.configure(MemoryBucketStore())
+
+
+async def test_requests_are_limited_per_budget_and_client(client: AsyncClient, limits):
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    assert (await client.get("/todos/")).status_code == 200
+    response = await client.get("/todos/")
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+
+    # Reads and writes have budgets of their own.
+    assert [(await client.get(f"/users/{user_id}")).status_code for _ in range(4)] == [
+        200, 200, 200, 429
+    ]
+    assert (await client.post(f"/users/{user_id}/todos/", json={"title": "A"})).status_code == 200
+    assert (await client.post(f"/users/{user_id}/todos/", json={"title": "B"})).status_code == 429
+
+    # A signed-in user spends from their own bucket, not the address's.
+    headers = {"Authorization": f"Bearer {security.create_access_token(str(user_id))}"}
+    assert (await client.get("/todos/", headers=headers)).status_code == 200
+    assert (await client.get("/metrics")).status_code == 200
+
+
+async def test_todo_limit_is_enforced_from_the_counter(client: AsyncClient, monkeypatch):
+    monkeypatch.setattr(crud, "TODO_MAX_PER_USER", 3)
+    response = await client.post(
+        "/users/", json={"email": "test@example.com", "password": "testpassword"}
+    )
+    user_id = response.json()["id"]
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk", json={"todos": [{"title": "A"}, {"title": "B"}]}
+    )
+    todo_id = response.json()[0]["id"]
+    response = await client.post(
+        f"/users/{user_id}/todos/bulk", json={"todos": [{"title": "C"}, {"title": "D"}]}
+    )
+    assert response.status_code == 403
+    assert (await client.post(f"/users/{user_id}/todos/", json={"title": "C"})).status_code == 200
+    response = await client.post(f"/users/{user_id}/todos/", json={"title": "D"})
+    assert response.status_code == 403
+    assert response.json() == {"detail": "Todo limit reached"}
+
+    # Deleting makes room again.
+    await client.delete(f"/todos/{todo_id}")
+    assert (await client.post(f"/users/{user_id}/todos/", json={"title": "D"})).status_code == 200
+    async with TestingSessionLocal() as db:
+        count = await db.execute(select(models.User.todo_count).where(models.User.id == user_id))
+        assert count.scalar() == 3
@@ -0,0 +1,184 @@
+import pytest_asyncio
+from httpx import AsyncClient
+from sqlalchemy import func, select, update
+
+from app import cache, models, sequences
+from app.database import Base, HashRing, shard_router
+from app.rebalance import _remove, _snapshot, rebalance
+
+from .conftest import TestingSessionLocal
+
+
+def sqlite_url(path) -> str:
+    return f"sqlite+aiosqlite:///{path}"
+
+
+def test_hash_ring_spreads_keys_and_moves_few():
+    before = HashRing(["a", "b", "c"])
+    after = HashRing(["a", "b", "c", "d"])
+    keys = range(1, 10001)
+    placed = [after.lookup(key) for key in keys]
+    for name in "abcd":
+        assert 0.15 < placed.count(name) / len(placed) < 0.35
+    moved = [key for key in keys if before.lookup(key) != after.lookup(key)]
+    # Only keys claimed by the new shard move, about a quarter of them.
+    assert all(after.lookup(key) == "d" for key in moved)
+    assert len(moved) / len(keys) < 0.35
+
+
+@pytest_asyncio.fixture
+async def shard_urls(tmp_path, client):
+    urls = [sqlite_url(tmp_path / f"shard{index}.db") for index in range(3)]
+    shard_router.reconfigure(urls)
+    for shard in shard_router.shards.values():
+        async with shard.engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+    sequences.configure(sequences.BlockAllocator(lambda: TestingSessionLocal, block_size=7))
+    yield urls
+    await shard_router.dispose()
+    shard_router.reconfigure([])
+    sequences.configure(None)
+
+
+async def _user_ids_by_shard() -> dict:
+    placement = {}
+    for url, shard in shard_router.shards.items():
+        async with shard.sessionmaker() as db:
+            placement[url] = set((await db.execute(select(models.User.id))).scalars())
+    return placement
+
+
+async def _create_users(client: AsyncClient, count: int) -> list:
+    user_ids = []
+    for index in range(count):
+        response = await client.post(
+            "/users/", json={"email": f"user{index}@example.com", "password": "testpassword"}
+        )
+        assert response.status_code == 200
+        user_id = response.json()["id"]
+        user_ids.append(user_id)
+        await client.post(f"/users/{user_id}/todos/", json={"title": f"Note {index}"})
+        await client.post(
+            f"/users/{user_id}/todos/bulk",
+            json={"todos": [{"title": f"Task {index}"}, {"title": f"Chore {index}"}]},
+        )
+    return user_ids
+
+
+async def _pages(client: AsyncClient, path: str, limit: int) -> list:
+    items, cursor = [], ""
+    while True:
+        page = (await client.get(path, params={"limit": limit, "cursor": cursor})).json()
+        items.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return items
+
+
+async def test_sharded_api(client: AsyncClient, shard_urls):
+    shard_router.reconfigure(shard_urls)
+    user_ids = await _create_users(client, 20)
+    assert len(set(user_ids)) == 20
+
+    # Each user lives only on the shard the ring gives it, and they are spread out.
+    placement = await _user_ids_by_shard()
+    assert sum(1 for ids in placement.values() if ids) > 1
+    for url, ids in placement.items():
+        assert all(shard_router.shard_for(id) is shard_router.shards[url] for id in ids)
+
+    response = await client.post(
+        "/users/", json={"email": "user0@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 400
+    response = await client.post(
+        "/token", data={"username": "user7@example.com", "password": "testpassword"}
+    )
+    assert response.status_code == 200
+
+    # Scatter-gather listings come back merged in id order.
+    users = await _pages(client, "/users/", 6)
+    assert [user["id"] for user in users] == sorted(user_ids)
+    response = await client.get("/users/", params={"skip": 3, "limit": 5})
+    assert [user["id"] for user in response.json()] == sorted(user_ids)[3:8]
+    todos = await _pages(client, "/todos/", 7)
+    todo_ids = [todo["id"] for todo in todos]
+    assert len(todo_ids) == 60 and todo_ids == sorted(set(todo_ids))
+    response = await client.get("/todos/", params={"owner_id": user_ids[5]})
+    assert [todo["title"] for todo in response.json()] == ["Note 5", "Task 5", "Chore 5"]
+    response = await client.get(
+        "/todos/", params={"limit": 1, "cursor": "", "estimate_total": True}
+    )
+    assert response.json()["estimated_total"] == 60
+    response = await client.get("/todos/search", params={"q": "chore", "limit": 50})
+    assert len(response.json()["items"]) == 20
+
+    # Single todos are found on whichever shard holds them.
+    todo_id = todos[40]["id"]
+    response = await client.get(f"/todos/{todo_id}")
+    assert response.json() == todos[40]
+    response = await client.patch(f"/todos/{todo_id}", json={"is_done": True})
+    assert response.json()["is_done"] is True
+    assert (await client.delete(f"/todos/{todo_id}")).status_code == 200
+    assert (await client.get(f"/todos/{todo_id}")).status_code == 404
+
+    response = await client.patch(
+        "/todos/bulk",
+        json={"todos": [{"id": todos[0]["id"], "is_done": True}, {"id": todo_id, "is_done": True}]},
+    )
+    assert [item["status"] for item in response.json()] == ["updated", "not_found"]
+
+    ids = [todos[59]["id"], todos[0]["id"]]
+    response = await client.get("/todos/", params={"ids": ",".join(map(str, ids))})
+    assert [todo["id"] for todo in response.json()] == ids
+    response = await client.post(
+        "/batch", json={"requests": [{"path": f"/users/{user_id}"} for user_id in user_ids]}
+    )
+    assert [result["body"]["id"] for result in response.json()] == user_ids
+
+
+async def test_rebalance_moves_users_online(client: AsyncClient, shard_urls):
+    shard_router.reconfigure(shard_urls[:2])
+    user_ids = await _create_users(client, 20)
+
+    async def snapshot():
+        await cache.backend.clear()
+        return {
+            user_id: (await client.get(f"/users/{user_id}?include_todos=true")).json()
+            for user_id in user_ids
+        }
+
+    before = await snapshot()
+
+    # A third shard: users the ring now puts there are still found where they were.
+    shard_router.reconfigure(shard_urls, previous_urls=shard_urls[:2])
+    assert await snapshot() == before
+    stats = await rebalance(shard_router, TestingSessionLocal)
+    assert stats["moved"] > 0 and stats["skipped"] == 0
+    assert await snapshot() == before
+
+    shard_router.reconfigure(shard_urls)
+    assert await snapshot() == before
+    placement = await _user_ids_by_shard()
+    assert sum(len(ids) for ids in placement.values()) == 20
+    for url, ids in placement.items():
+        assert all(shard_router.shard_for(id) is shard_router.shards[url] for id in ids)
+    assert (await rebalance(shard_router, TestingSessionLocal))["moved"] == 0
+
+    # New ids stay clear of every moved row.
+    response = await client.post(f"/users/{user_ids[0]}/todos/", json={"title": "After"})
+    assert response.status_code == 200
+
+
+async def test_move_backs_off_when_the_user_changes(shard_urls):
+    shard = shard_router.shards[shard_urls[0]]
+    async with shard.sessionmaker() as db:
+        db.add(models.User(id=1, email="moving@example.com", hashed_password="x"))
+        db.add(models.Todo(id=1, title="Copied", owner_id=1))
+        await db.commit()
+        user, todos = await _snapshot(db, 1)
+        # Written after the copy was taken: the delete must not lose it.
+        await db.execute(update(models.Todo).values(title="Changed", version=2))
+        await db.commit()
+        assert await _remove(db, user, todos) is False
+        count = await db.execute(select(func.count()).select_from(models.Todo))
+        assert count.scalar() == 1
@@ -0,0 +1,74 @@
+import pytest
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+
+from app import database, startup
+
+
+def sqlite_url(path) -> str:
+    return f"sqlite+aiosqlite:///{path}"
+
+
+async def test_check_schema_requires_head_revision(tmp_path):
+    engine = create_async_engine(sqlite_url(tmp_path / "app.db"))
+    try:
+        with pytest.raises(startup.SchemaOutOfDate):
+            await startup.prepare_schema(engine, "check")
+
+        await startup.prepare_schema(engine, "create")
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE alembic_version (version_num VARCHAR(32))"))
+            await conn.execute(
+                text("INSERT INTO alembic_version VALUES (:head)"),
+                {"head": startup.head_revision()},
+            )
+        await startup.prepare_schema(engine, "check")
+
+        with pytest.raises(ValueError):
+            await startup.prepare_schema(engine, "migrate")
+    finally:
+        await engine.dispose()
+
+
+async def test_check_mode_issues_no_ddl(tmp_path):
+    engine = create_async_engine(sqlite_url(tmp_path / "app.db"))
+    try:
+        with pytest.raises(startup.SchemaOutOfDate):
+            await startup.prepare_schema(engine, "check")
+        async with engine.connect() as conn:
+            tables = await conn.run_sync(lambda sync: inspect(sync).get_table_names())
+        assert tables == []
+    finally:
+        await engine.dispose()
+
+
+async def test_prewarm_opens_pooled_connections(tmp_path):
+    engine = create_async_engine(
+        sqlite_url(tmp_path / "app.db"), poolclass=AsyncAdaptedQueuePool, pool_size=3
+    )
+    try:
+        await startup.prepare_schema(engine, "create")
+        assert await startup.prewarm(engine, 5) == 3
+        assert engine.sync_engine.pool.checkedin() == 3
+    finally:
+        await engine.dispose()
+
+
+async def test_prewarm_unpooled_engine_once(tmp_path):
+    engine = create_async_engine(sqlite_url(tmp_path / "app.db"))
+    try:
+        await startup.prepare_schema(engine, "create")
+        assert await startup.prewarm(engine, 5) == 1
+        assert await startup.prewarm(engine, 0) == 0
+    finally:
+        await engine.dispose()
+
+
+def test_engine_is_created_lazily_per_process(monkeypatch):
+    monkeypatch.setattr(database, "_engine", None)
+    engine = database.get_engine()
+    assert database.get_engine() is engine
+    # A forked worker sees a different pid and must not reuse its parent's engine.
+    monkeypatch.setattr(database, "_engine_pid", -1)
+    assert database.get_engine() is not engine